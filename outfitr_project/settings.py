@@ -26,6 +26,7 @@ INSTALLED_APPS = [
 
 # Middleware configuration for request/response processing
 MIDDLEWARE = [
+    'store.instrumentation.RequestMetricsMiddleware',  # Outermost so metrics cover every other middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -33,6 +34,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store.routers.ReplicaReadsMiddleware',  # Marks requests whose catalogue reads may use a replica
 ]
 
 # Root URL configuration
@@ -41,7 +43,7 @@ ROOT_URLCONF = 'outfitr_project.urls'
 # Template engine configuration
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "store.instrumentation.InstrumentedDjangoTemplates",  # DjangoTemplates + render timing
         "DIRS": [BASE_DIR / "templates"],  # Custom templates directory
         "APP_DIRS": True,  # Enable template loading from installed apps
         "OPTIONS": {
@@ -50,7 +52,8 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
-                # Removed store.context_processors.cart_count reference
+                "store.content_processors.cart_count",  # Cached cart badge count
+                "store.content_processors.catalogue",  # Cached navbar category tree
             ],
         },
     },
@@ -59,13 +62,148 @@ TEMPLATES = [
 # WSGI application entry point
 WSGI_APPLICATION = 'outfitr_project.wsgi.application'
 
-# Database configuration (using SQLite by default)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database configuration: STORE_DB_ENGINE selects SQLite (default) or PostgreSQL
+STORE_DB_ENGINE = os.environ.get('STORE_DB_ENGINE', 'sqlite')
+if STORE_DB_ENGINE == 'postgres':
+    def postgres_database(host):
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('STORE_DB_NAME', 'outfitr'),
+            'USER': os.environ.get('STORE_DB_USER', 'outfitr'),
+            'PASSWORD': os.environ.get('STORE_DB_PASSWORD', ''),
+            'HOST': host,
+            'PORT': os.environ.get('STORE_DB_PORT', '5432'),
+            'OPTIONS': {},
+        }
+        if os.environ.get('STORE_DB_POOL') == '1':
+            # psycopg connection pool per process; Django requires CONN_MAX_AGE = 0 with it
+            database['OPTIONS']['pool'] = {
+                'min_size': int(os.environ.get('STORE_DB_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('STORE_DB_POOL_MAX', 10)),
+                'timeout': 10,
+            }
+        else:
+            # Persistent connections, checked before reuse
+            database['CONN_MAX_AGE'] = int(os.environ.get('STORE_DB_CONN_MAX_AGE', 60))
+            database['CONN_HEALTH_CHECKS'] = True
+        return database
+
+    DATABASES = {'default': postgres_database(os.environ.get('STORE_DB_HOST', 'localhost'))}
+    # Streaming replicas for catalogue reads (see store.routers)
+    for index, host in enumerate(filter(None, os.environ.get('STORE_DB_REPLICA_HOSTS', '').split(','))):
+        DATABASES[f'replica_{index}'] = {**postgres_database(host.strip()), 'TEST': {'MIRROR': 'default'}}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('STORE_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Wait up to 20s for a competing writer instead of failing with "database is locked"
+                'timeout': 20,
+                # Take the write lock when a transaction starts, so a transaction that
+                # reads then writes can't deadlock against another one upgrading its lock
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+            # A file rather than the default in-memory database, so the
+            # concurrency tests see real locking: shared-cache memory
+            # databases fail a waiting writer with "table is locked"
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
     }
-}
+    # STORE_SQLITE_WAL=1 lets readers run alongside the writer (NORMAL only
+    # syncs at checkpoints). It is persistent: the first connection rewrites
+    # the database header and leaves -wal/-shm files next to it, so it stays
+    # off for the checked-in development database
+    if os.environ.get('STORE_SQLITE_WAL') == '1':
+        DATABASES['default']['OPTIONS']['init_command'] = (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            + DATABASES['default']['OPTIONS']['init_command']
+        )
+
+# Catalogue reads of these views go to the replicas when any are configured
+STORE_REPLICA_VIEWS = [
+    'home', 'product_detail', 'category', 'subcategory',
+    'api_products', 'api_product', 'api_product_reviews', 'api_product_export', 'api_facets',
+]
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+
+# Cache configuration: STORE_CACHE_BACKEND selects a per-process local-memory
+# cache (dev default), a file cache shared by every process on the host, or
+# Redis (any Redis-compatible server, e.g. a local redis-server or valkey)
+STORE_CACHE_BACKEND = os.environ.get('STORE_CACHE_BACKEND', 'locmem')
+if STORE_CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('STORE_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+            'KEY_PREFIX': 'outfitr',
+        }
+    }
+elif STORE_CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('STORE_CACHE_LOCATION', BASE_DIR / 'cache'),
+            'KEY_PREFIX': 'outfitr',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'outfitr',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Session storage: STORE_SESSION_ENGINE selects database rows (default),
+# cached_db (reads served from the cache above, writes still go to the
+# database) or signed_cookies (no server-side storage at all; the session
+# travels in the cookie, so nothing ever needs purging)
+STORE_SESSION_ENGINE = os.environ.get('STORE_SESSION_ENGINE', 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[STORE_SESSION_ENGINE]
+
+# Carts without a user (made for anonymous visitors by earlier versions) untouched
+# for this many days are deleted by `manage.py purge_carts`
+STORE_CART_RETENTION_DAYS = 30
+
+# Catalogue caches (store.catalogue_cache); timeouts in seconds
+STORE_PAGE_CACHE = True  # Cache full catalogue pages for anonymous visitors
+STORE_PAGE_CACHE_TIMEOUT = 60 * 5
+STORE_NAVIGATION_CACHE_TIMEOUT = 60 * 60
+STORE_PRODUCT_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Recently viewed products kept per user (store.recently_viewed)
+STORE_RECENTLY_VIEWED_LIMIT = 20
+
+# Product popularity counters (store.counters): increments are buffered in
+# process memory, or in the shared cache with STORE_COUNTER_BUFFER=cache so a
+# restarted worker loses none, and written every interval or size events
+STORE_COUNTER_BUFFER = os.environ.get('STORE_COUNTER_BUFFER', 'memory')
+STORE_COUNTER_FLUSH_INTERVAL = 30  # seconds
+STORE_COUNTER_FLUSH_SIZE = 1000  # events
+STORE_POPULARITY_WEIGHTS = {'view': 1, 'cart_add': 5, 'wishlist_add': 3}
+
+# "Customers also viewed" products on a product page, precomputed by
+# `manage.py build_recommendations` (store.recommendations)
+STORE_RECOMMENDATION_LIMIT = 6
+
+# Admin changelists of large tables (store.admin): tables estimated at fewer
+# rows than STORE_EXACT_COUNT_BELOW are counted exactly, filtered results up to
+# STORE_COUNT_LIMIT rows; bulk deletes run STORE_ADMIN_DELETE_BATCH_SIZE rows per transaction
+STORE_EXACT_COUNT_BELOW = 10000
+STORE_COUNT_LIMIT = 10000
+STORE_ADMIN_DELETE_BATCH_SIZE = 500
 
 # Password validation (empty for now)
 AUTH_PASSWORD_VALIDATORS = []
@@ -82,6 +220,36 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Image derivatives (store.images) generated for product and profile images
+STORE_IMAGE_WIDTHS = (160, 320, 480, 800)  # srcset widths in px; never upscaled
+STORE_IMAGE_FORMATS = ('avif', 'webp')  # Offered ahead of the JPEG fallback when Pillow supports them
+
+# Request metrics collected by store.instrumentation.RequestMetricsMiddleware
+STORE_METRICS_LOG = os.environ.get('STORE_METRICS_LOG')  # JSON-lines file read by `manage.py request_metrics`
+STORE_METRICS_HEADER = DEBUG  # Add an X-Store-Metrics header to every response
+
+# Maximum SQL queries per view (by URL name), or per method as {method: n};
+# overruns are logged, or on GET raise QueryBudgetExceeded when
+# STORE_QUERY_BUDGET_STRICT is enabled (store.tests runs every
+# budgeted route in strict mode, with the cache on and off)
+STORE_QUERY_BUDGETS = {
+    'home': 16,
+    'category': 8,
+    'subcategory': 8,
+    'product_detail': 15,
+    'dashboard': 10,
+    'cart': 6,
+    'cart_count': 6,
+    # Placing an order: one statement per table written, plus one row lock per
+    # stock table on databases with SELECT ... FOR UPDATE (store.orders)
+    'checkout': {'GET': 6, 'POST': 14},
+    'api_products': 3,
+    'api_product': 2,
+    'api_product_reviews': 3,
+    'api_facets': 7,
+}
+STORE_QUERY_BUDGET_STRICT = os.environ.get('STORE_QUERY_BUDGET_STRICT') == '1'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
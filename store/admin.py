@@ -1,51 +1,194 @@
-from django.contrib import admin
-from .models import Category, Subcategory, Product, Review, Cart, CartItem, UserProfile, RecentlyViewed
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.db import transaction
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from .attributes import attribute_names
+from .models import Category, Subcategory, Brand, Color, Size, Product, ProductVariant, Review, Cart, CartItem, UserProfile, RecentlyViewed, Order, OrderLine
+from .pagination import EstimatedCountPaginator
+from .search import search_enabled, search_products
+
+# Rows deleted per transaction by the "delete in batches" action
+ADMIN_DELETE_BATCH_SIZE = getattr(settings, 'STORE_ADMIN_DELETE_BATCH_SIZE', 500)
+
+
+def delete_in_batches(queryset, batch_size=ADMIN_DELETE_BATCH_SIZE):
+    """
+    Delete the rows of queryset batch_size primary keys at a time, each batch
+    in its own transaction, so neither memory nor lock time grows with the
+    selection. Model signals still run for every deleted object. Returns the
+    number of queryset's own rows deleted.
+    """
+    label = queryset.model._meta.label
+    queryset = queryset.order_by('pk')
+    deleted = 0
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            _, per_model = queryset.model._default_manager.filter(pk__in=pks).delete()
+        deleted += per_model.get(label, 0)
+        last = pks[-1]
+
+
+# Base for changelists of tables that grow without bound
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator  # Estimated or capped counts instead of COUNT(*)
+    show_full_result_count = False  # Skip the second count of the unfiltered table
+    actions = ['delete_in_batches']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The stock action loads and lists every selected object before deleting
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(permissions=['delete'], description='Delete selected %(verbose_name_plural)s in batches')
+    def delete_in_batches(self, request, queryset):
+        opts = self.model._meta
+        if request.POST.get('post'):
+            deleted = delete_in_batches(queryset)
+            self.message_user(request, f'Deleted {deleted} {opts.verbose_name_plural}.', messages.SUCCESS)
+            return None
+        return TemplateResponse(request, 'admin/store/delete_in_batches.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Are you sure?',
+            'opts': opts,
+            'count': EstimatedCountPaginator(queryset, 1).count,
+            'batch_size': ADMIN_DELETE_BATCH_SIZE,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+# Subcategory choices joined to their category, which each name includes
+class SubcategoryListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        subcategories = Subcategory.objects.select_related('category').order_by('category__name', 'name')
+        return [(subcategory.pk, str(subcategory)) for subcategory in subcategories]
+
+# Brand, color and size choices from the cached lookup table names
+class AttributeListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        return sorted(attribute_names(field.name).items(), key=lambda choice: choice[1].casefold())
 
 # Admin configuration for Category model
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')  # Fields to display in admin list view
+    search_fields = ('name',)  # Enable search (and autocomplete) by name
     prepopulated_fields = {'slug': ('name',)}  # Auto-populate slug from name
 
 # Admin configuration for Subcategory model
 @admin.register(Subcategory)
 class SubcategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'category')  # Fields to display
+    search_fields = ('name', 'category__name')  # Enable search (and autocomplete) by name
     prepopulated_fields = {'slug': ('name',)}  # Auto-populate slug
     list_filter = ('category',)  # Filter by category in admin
 
+    def get_queryset(self, request):
+        # __str__ includes the category name (changelist and autocomplete results)
+        return super().get_queryset(request).select_related('category')
+
+# Admin configuration for the brand, color and size lookup tables
+@admin.register(Brand, Color, Size)
+class ProductAttributeAdmin(admin.ModelAdmin):
+    list_display = ('name',)  # Fields to display
+    search_fields = ('name',)  # Enable search by name
+    ordering = ('name',)  # Alphabetical
+
+# Size/color variants edited on their product's page
+class ProductVariantInline(admin.TabularInline):
+    model = ProductVariant
+    extra = 0
+    fields = ('sku', 'size', 'color', 'price', 'stock')  # Empty price = product price
+    autocomplete_fields = ('size', 'color')
+
 # Admin configuration for Product model
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug', 'category', 'subcategory', 'price', 'brand', 'color', 'size')  # Fields to display
-    search_fields = ('name', 'description')  # Enable search by name and description
-    list_filter = ('category', 'subcategory', 'brand', 'color', 'size')  # Filters in admin
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('name', 'slug', 'category', 'subcategory', 'price', 'stock', 'brand', 'color', 'size')  # Fields to display
+    search_fields = ('name', 'description')  # Enable search by name and description (full-text index when available)
+    list_filter = (
+        'category',
+        ('subcategory', SubcategoryListFilter),
+        ('brand', AttributeListFilter),
+        ('color', AttributeListFilter),
+        ('size', AttributeListFilter),
+    )  # Filters in admin
+    list_select_related = ('category', 'subcategory__category', 'brand', 'color', 'size')  # Names in list_display
+    autocomplete_fields = ('category', 'subcategory', 'brand', 'color', 'size')
+    ordering = ('-created_at', '-id')  # Served by the product_newest index, as are filtered pages
     prepopulated_fields = {'slug': ('name',)}  # Auto-populate slug
+    inlines = [ProductVariantInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        # The FTS5 index (store.search) instead of LIKE scans; also an exact SKU
+        term = search_term.strip()
+        if not term or not search_enabled():
+            return super().get_search_results(request, queryset, search_term)
+        matches = search_products(Product.objects.all(), term).values('pk')
+        return queryset.filter(Q(pk__in=matches) | Q(sku=term)), False
 
 # Admin configuration for Review model
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ('product', 'user', 'rating', 'created_at')  # Fields to display
-    list_filter = ('rating', 'created_at')  # Filters in admin
+    list_filter = ('rating', 'created_at')  # Filters in admin (fixed choices, no queries)
+    list_select_related = ('product', 'user')  # Names in list_display
+    search_fields = ('=user__username',)  # Exact username, an indexed lookup
+    autocomplete_fields = ('product', 'user')
 
 # Admin configuration for Cart model
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'created_at')  # Fields to display
+class CartAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'created_at', 'updated_at')  # Fields to display
     list_filter = ('created_at',)  # Filter by creation date
+    list_select_related = ('user',)  # Username in list_display
+    autocomplete_fields = ('user',)
 
 # Admin configuration for CartItem model
 @admin.register(CartItem)
-class CartItemAdmin(admin.ModelAdmin):
-    list_display = ('cart', 'product', 'quantity')  # Fields to display
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ('cart', 'product', 'variant', 'quantity')  # Fields to display
+    list_select_related = ('cart', 'product', 'variant__product', 'variant__size', 'variant__color')  # Names in list_display
+    autocomplete_fields = ('product',)
+    raw_id_fields = ('cart', 'variant')
 
 # Admin configuration for UserProfile model
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'phone')  # Fields to display
+    list_select_related = ('user',)  # Username in list_display
+    search_fields = ('=user__username',)  # Exact username, an indexed lookup
+    autocomplete_fields = ('user', 'wishlist')  # Not a select of every product
 
 # Admin configuration for RecentlyViewed model
 @admin.register(RecentlyViewed)
-class RecentlyViewedAdmin(admin.ModelAdmin):
+class RecentlyViewedAdmin(LargeTableAdmin):
     list_display = ('user', 'product', 'viewed_at')  # Fields to display
-    list_filter = ('user',)  # Filter by user
\ No newline at end of file
+    list_select_related = ('user', 'product')  # Names in list_display
+    search_fields = ('=user__username',)  # Find a user's history (instead of a filter listing every user)
+    autocomplete_fields = ('user', 'product')
+
+# Inline order lines on the order page
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    readonly_fields = ('product', 'variant', 'product_name', 'unit_price', 'quantity')  # Snapshot taken at checkout
+
+# Admin configuration for Order model
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'status', 'total', 'created_at')  # Fields to display
+    list_filter = ('status', 'created_at')  # Filters in admin
+    list_select_related = ('user',)  # Username in list_display
+    search_fields = ('=user__username',)  # Exact username, an indexed lookup
+    autocomplete_fields = ('user',)
+    readonly_fields = ('idempotency_key', 'total')  # Set by checkout
+    inlines = [OrderLineInline]
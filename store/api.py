@@ -0,0 +1,266 @@
+import hashlib
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .catalogue_cache import catalogue_state, get_navigation
+from .facets import get_facets
+from .filters import get_product_filters, apply_product_filters
+from .models import Product, Review
+from .pagination import paginate, get_sort, SORT_ORDERS, DEFAULT_SORT
+from .search import search_products, RELEVANCE_SORT
+
+# Public field name -> ORM path for each resource. Responses are built from
+# values() rows over these paths; model instances are never loaded.
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'sku': 'sku',
+    'description': 'description',
+    'price': 'price',
+    'category': 'category_id',
+    'subcategory': 'subcategory_id',
+    'brand': 'brand__name',
+    'brand_id': 'brand_id',
+    'color': 'color__name',
+    'color_id': 'color_id',
+    'size': 'size__name',
+    'size_id': 'size_id',
+    'rating': 'rating_avg',
+    'rating_count': 'rating_count',
+    'image': 'image',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+# Listings leave out the description unless it is asked for
+PRODUCT_LIST_FIELDS = [name for name in PRODUCT_FIELDS if name != 'description']
+
+REVIEW_FIELDS = {
+    'id': 'id',
+    'user': 'user__username',
+    'rating': 'rating',
+    'comment': 'comment',
+    'created_at': 'created_at',
+}
+REVIEW_SORT_ORDERS = {'newest': ('-created_at', '-id')}
+
+# Rows serialised per chunk of a streamed export
+EXPORT_CHUNK_SIZE = 1000
+
+
+class InvalidFields(ValueError):
+    """Raised for a fields= parameter naming fields the resource does not have"""
+
+
+def get_fields(request, available, default):
+    """Fields requested with ?fields=a,b,c, in the given order; default when absent"""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise InvalidFields(f'Unknown fields: {", ".join(unknown)}' if unknown else 'No fields requested')
+    return fields
+
+
+def project(queryset, fields, available, ordering=()):
+    """values() over the paths of fields plus the ordering keys a cursor needs"""
+    paths = [available[name] for name in fields]
+    paths += [key.lstrip('-') for key in ordering if key.lstrip('-') not in paths]
+    return queryset.values(*paths)
+
+
+def serialize(row, fields, available):
+    data = {name: row[available[name]] for name in fields}
+    if 'image' in data:
+        data['image'] = default_storage.url(data['image']) if data['image'] else None
+    return data
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def catalogue_validators():
+    """
+    (ETag, Last-Modified) for responses derived from the whole catalogue,
+    from its cached version rather than a query: product, review, attribute
+    and counter writes all bump it, deletions included. ETags are per URL,
+    so one version serves every filter, sort and fields= combination.
+    """
+    version, since = catalogue_state()
+    return quote_etag(hashlib.md5(f'catalogue:{version}'.encode()).hexdigest()), since
+
+
+def conditional(request, etag, last_modified, respond):
+    """Answer 304/412 from the validators, otherwise call respond() and tag its response"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = respond()
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Clients may keep responses but must revalidate them before every use
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def filtered_products(request):
+    """
+    Products matching the listing parameters shared with the HTML views
+    (?q=, category, price, brand, color, size and rating filters), with
+    the sort orders valid for them.
+    """
+    products = Product.objects.all()
+    sort_orders, default_sort = SORT_ORDERS, DEFAULT_SORT
+    query = request.GET.get('q', '')
+    if query:
+        products = search_products(products, query)
+        sort_orders, default_sort = {**RELEVANCE_SORT, **SORT_ORDERS}, 'relevance'
+    return apply_product_filters(products, get_product_filters(request)), sort_orders, default_sort
+
+
+@require_safe
+def product_list(request):
+    """A keyset-paginated page of products; same parameters as the HTML listings"""
+    try:
+        fields = get_fields(request, PRODUCT_FIELDS, PRODUCT_LIST_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    products, sort_orders, default_sort = filtered_products(request)
+
+    sort = get_sort(request, sort_orders, default_sort)
+
+    def respond():
+        ordering = sort_orders[sort]
+        page = paginate(project(products, fields, PRODUCT_FIELDS, ordering), request, sort_orders, default_sort)
+        return JsonResponse({
+            'products': [serialize(row, fields, PRODUCT_FIELDS) for row in page],
+            'sort': page.sort,
+            'per_page': page.page_size,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+
+    return conditional(request, *catalogue_validators(), respond)
+
+
+@require_safe
+def product_export(request):
+    """
+    Every product matching the listing filters as one JSON array, streamed
+    in chunks from a server-side iterator instead of being built in memory.
+    """
+    try:
+        fields = get_fields(request, PRODUCT_FIELDS, PRODUCT_LIST_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    products, _, _ = filtered_products(request)
+
+    def chunks():
+        rows = project(products, fields, PRODUCT_FIELDS).order_by('id').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        yield '['
+        separator = ''
+        batch = []
+        for row in rows:
+            batch.append(json.dumps(serialize(row, fields, PRODUCT_FIELDS), cls=DjangoJSONEncoder))
+            if len(batch) >= EXPORT_CHUNK_SIZE:
+                yield separator + ','.join(batch)
+                separator, batch = ',', []
+        if batch:
+            yield separator + ','.join(batch)
+        yield ']'
+
+    return conditional(
+        request, *catalogue_validators(),
+        lambda: StreamingHttpResponse(chunks(), content_type='application/json'),
+    )
+
+
+def get_product_row(slug, fields):
+    """The product's requested fields plus the id and updated_at its validators need"""
+    paths = {'id', 'updated_at', *(PRODUCT_FIELDS[name] for name in fields)}
+    return Product.objects.filter(slug=slug).values(*paths).first()
+
+
+def product_validators(row):
+    # Last-Modified has whole-second precision, as HTTP dates do
+    last_modified = row['updated_at']
+    stamp = last_modified.isoformat() if last_modified else ''
+    etag = quote_etag(hashlib.md5(f"{row['id']}:{stamp}".encode()).hexdigest())
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+@require_safe
+def product_item(request, slug):
+    try:
+        fields = get_fields(request, PRODUCT_FIELDS, PRODUCT_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    row = get_product_row(slug, fields)
+    if row is None:
+        return error('Product not found', status=404)
+    return conditional(
+        request, *product_validators(row),
+        lambda: JsonResponse(serialize(row, fields, PRODUCT_FIELDS)),
+    )
+
+
+@require_safe
+def product_reviews(request, slug):
+    """A product's reviews, newest first; review changes bump the product's updated_at"""
+    try:
+        fields = get_fields(request, REVIEW_FIELDS, REVIEW_FIELDS)
+    except InvalidFields as e:
+        return error(str(e))
+    row = get_product_row(slug, [])
+    if row is None:
+        return error('Product not found', status=404)
+
+    def respond():
+        reviews = project(Review.objects.filter(product_id=row['id']), fields, REVIEW_FIELDS, REVIEW_SORT_ORDERS['newest'])
+        page = paginate(reviews, request, REVIEW_SORT_ORDERS, 'newest')
+        return JsonResponse({
+            'reviews': [serialize(review, fields, REVIEW_FIELDS) for review in page],
+            'per_page': page.page_size,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+
+    return conditional(request, *product_validators(row), respond)
+
+
+@require_safe
+def category_list(request):
+    """The category tree, served from the cached navigation"""
+    navigation = get_navigation()
+    payload = json.dumps(navigation, sort_keys=True, cls=DjangoJSONEncoder)
+    etag = quote_etag(hashlib.md5(payload.encode()).hexdigest())
+    return conditional(request, etag, None, lambda: JsonResponse({'categories': navigation}))
+
+
+@require_safe
+def facet_counts(request):
+    """Facet counts for the listing filters, as shown in the HTML sidebar"""
+    query = request.GET.get('q', '')
+    filters = get_product_filters(request)
+    products = search_products(Product.objects.all(), query) if query else Product.objects.all()
+
+    def respond():
+        facets = get_facets(products, filters, scope=query)
+        return JsonResponse({
+            'category': [{'id': value, 'count': count} for value, count in sorted(facets['category'].items())],
+            'brand': [{'id': value, 'name': name, 'count': count} for value, name, count in facets['brand']],
+            'color': [{'id': value, 'name': name, 'count': count} for value, name, count in facets['color']],
+            'size': [{'id': value, 'name': name, 'count': count} for value, name, count in facets['size']],
+            'price': facets['price'],
+        })
+
+    return conditional(request, *catalogue_validators(), respond)
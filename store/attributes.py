@@ -0,0 +1,62 @@
+from django.core.cache import cache
+
+from .catalogue_cache import bump_version, versioned_key
+from .models import Brand, Color, Size
+
+# Product foreign key -> lookup table
+ATTRIBUTE_MODELS = {'brand': Brand, 'color': Color, 'size': Size}
+
+ATTRIBUTE_CACHE_TIMEOUT = 60 * 60
+
+
+def normalize_name(value):
+    """Collapse runs of whitespace; blank values become None"""
+    if value is None:
+        return None
+    return ' '.join(str(value).split()) or None
+
+
+def _known_ids(model):
+    # The lookup tables hold tens to hundreds of rows, so read them whole
+    return {name.casefold(): pk for pk, name in model.objects.values_list('pk', 'name')}
+
+
+def attribute_ids(field, names):
+    """
+    Map each non-blank name to the id of its brand, color or size row,
+    creating the rows that are missing. Names that differ only in case or
+    whitespace share a row, named after the first spelling seen.
+    """
+    model = ATTRIBUTE_MODELS[field]
+    wanted = {}
+    for name in names:
+        name = normalize_name(name)
+        if name:
+            wanted.setdefault(name.casefold(), name)
+    if not wanted:
+        return {}
+
+    known = _known_ids(model)
+    missing = [name for key, name in wanted.items() if key not in known]
+    if missing:
+        # A concurrent writer may create the same names; the case-insensitive
+        # unique constraint keeps one row and the re-read picks it up
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        known = _known_ids(model)
+        invalidate_attributes()
+
+    return {name: known[normalize_name(name).casefold()] for name in names if normalize_name(name)}
+
+
+def attribute_names(field):
+    """{id: name} of one lookup table, cached until a value is added, renamed or deleted"""
+    key = versioned_key('attributes', field)
+    names = cache.get(key)
+    if names is None:
+        names = dict(ATTRIBUTE_MODELS[field].objects.values_list('pk', 'name'))
+        cache.set(key, names, ATTRIBUTE_CACHE_TIMEOUT)
+    return names
+
+
+def invalidate_attributes():
+    bump_version('attributes')
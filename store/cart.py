@@ -0,0 +1,224 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+# A variant's price overrides its product's
+UNIT_PRICE = Coalesce(F('variant__price'), F('product__price'))
+LINE_TOTAL = ExpressionWrapper(UNIT_PRICE * F('quantity'), output_field=MONEY)
+CENTS = Decimal('0.01')
+
+# Session key holding the id of the user's cart
+USER_CART_SESSION_KEY = 'user_cart_id'
+
+CART_COUNT_CACHE_KEY = 'store:cart:{}:count'
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+# Lines written per upsert statement (4 parameters each)
+UPSERT_BATCH_SIZE = 250
+
+
+def get_cart(request, create=True):
+    """
+    Get the logged-in user's cart. Carts are only created when create is
+    set, i.e. on the first add; read-only callers pass create=False and get
+    None for a user without a cart. Anonymous visitors never have one: their
+    catalogue pages come from the shared page cache, which cannot carry add
+    buttons or a cart badge, so the cart views are login-only.
+    """
+    if not request.user.is_authenticated:
+        return None
+    # Resolve the cart once per request
+    if getattr(request, '_cart', None) is not None:
+        return request._cart
+
+    if create:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+    else:
+        cart = Cart.objects.filter(user=request.user).first()
+    # Remember the cart so the badge can find its count without a query
+    if cart is not None and request.session.get(USER_CART_SESSION_KEY) != str(cart.id):
+        request.session[USER_CART_SESSION_KEY] = str(cart.id)
+
+    request._cart = cart
+    return cart
+
+
+class CartSnapshot:
+    """
+    A cart with its lines, their products and all totals, loaded by a single
+    joined query. Line totals, the grand total and the item count are computed
+    by the database (the totals as window aggregates over the same rows).
+    """
+
+    def __init__(self, cart):
+        self.cart = cart
+        # A visitor without a cart has nothing to load
+        self.lines = [] if cart is None else list(
+            CartItem.objects.filter(cart=cart)
+            .select_related('product', 'product__category', 'variant', 'variant__size', 'variant__color')
+            .annotate(
+                unit_price=UNIT_PRICE,
+                line_total=LINE_TOTAL,
+                cart_total=Window(Sum(LINE_TOTAL), output_field=MONEY),
+                cart_count=Window(Sum('quantity')),
+            )
+            .order_by('id')
+        )
+        # Computed decimals are not rounded to the field's places on every backend
+        for line in self.lines:
+            line.line_total = line.line_total.quantize(CENTS)
+        first = self.lines[0] if self.lines else None
+        self.total = first.cart_total.quantize(CENTS) if first else Decimal('0.00')
+        self.count = first.cart_count if first else 0
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def get_cart_snapshot(request):
+    """Return the CartSnapshot for the request's cart, loading it at most once"""
+    if not hasattr(request, '_cart_snapshot'):
+        request._cart_snapshot = CartSnapshot(get_cart(request, create=False))
+    return request._cart_snapshot
+
+
+def get_session_cart_id(request):
+    """
+    Id of the request's cart without creating one. Users whose session does
+    not know their cart yet cost one read query, after which the id is
+    remembered in the session.
+    """
+    if not request.user.is_authenticated:
+        return None
+
+    cart_id = request.session.get(USER_CART_SESSION_KEY)
+    if cart_id is None:
+        cart_id = Cart.objects.filter(user=request.user).values_list('id', flat=True).first()
+        if cart_id is not None:
+            cart_id = str(cart_id)
+            request.session[USER_CART_SESSION_KEY] = cart_id
+    return cart_id
+
+
+def remember_user_cart(request, user):
+    """Store the id of user's cart, if they have one, in the session at login"""
+    if request.session.get(USER_CART_SESSION_KEY) is None:
+        cart_id = Cart.objects.filter(user=user).values_list('id', flat=True).first()
+        if cart_id is not None:
+            request.session[USER_CART_SESSION_KEY] = str(cart_id)
+
+
+def _upsert_lines(cart_id, quantities, on_conflict):
+    """
+    Write {(product_id, variant_id): quantity} lines into a cart with one
+    INSERT ... ON CONFLICT DO UPDATE per batch on the cartitem_line unique
+    index, so concurrent writers never lose an update or duplicate a line.
+    """
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    cart_id = CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)
+    lines = list(quantities.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(lines), UPSERT_BATCH_SIZE):
+            batch = lines[start:start + UPSERT_BATCH_SIZE]
+            values = ', '.join(['(%s, %s, %s, %s)'] * len(batch))
+            params = [
+                value for (product_id, variant_id), quantity in batch
+                for value in (cart_id, product_id, variant_id, quantity)
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} (cart_id, product_id, variant_id, quantity) VALUES {values} '
+                f'ON CONFLICT (cart_id, product_id, COALESCE(variant_id, 0)) DO UPDATE SET quantity = {on_conflict}',
+                params,
+            )
+
+
+def touch_cart(cart_id):
+    """Mark a cart as active now, when its lines change"""
+    Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now())
+
+
+def add_items(cart_id, quantities):
+    """
+    Add {(product_id, variant_id): n} to a cart, incrementing existing lines
+    in the database; variant_id is None for products without variants.
+    """
+    quantities = {line: n for line, n in quantities.items() if n > 0}
+    if quantities:
+        table = connection.ops.quote_name(CartItem._meta.db_table)
+        _upsert_lines(cart_id, quantities, f'{table}.quantity + excluded.quantity')
+        touch_cart(cart_id)
+
+
+def set_quantities(cart_id, quantities):
+    """
+    Set {(product_id, variant_id): n} lines of a cart in at most two
+    statements; lines set to zero or less are removed.
+    """
+    keep = {line: n for line, n in quantities.items() if n > 0}
+    drop = [line for line, n in quantities.items() if n <= 0]
+    if keep:
+        _upsert_lines(cart_id, keep, 'excluded.quantity')
+        touch_cart(cart_id)
+    if drop:
+        remove_items(cart_id, drop)
+
+
+def remove_items(cart_id, lines):
+    """Delete the cart's (product_id, variant_id) lines; returns how many were removed"""
+    if not lines:
+        return 0
+    matches = Q()
+    for product_id, variant_id in lines:
+        matches |= Q(product_id=product_id, variant_id=variant_id)
+    deleted, _ = CartItem.objects.filter(matches, cart_id=cart_id).delete()
+    if deleted:
+        touch_cart(cart_id)
+    return deleted
+
+
+def get_cart_line(cart, item_id):
+    """(product_id, variant_id) of the CartItem item_id if it is in cart, else None"""
+    if cart is None:
+        return None
+    return CartItem.objects.filter(id=item_id, cart=cart).values_list('product_id', 'variant_id').first()
+
+
+def update_cart_count(cart_id, count=None):
+    """Store the number of items in a cart; recomputed when count is not given"""
+    if count is None:
+        count = CartItem.objects.filter(cart_id=cart_id).aggregate(total=Sum('quantity'))['total'] or 0
+    cache.set(CART_COUNT_CACHE_KEY.format(cart_id), count, CART_COUNT_TIMEOUT)
+    return count
+
+
+def get_cart_count(request):
+    """
+    Number of items in the request's cart for the navbar badge. Served from
+    the per-cart cache entry kept current by the cart views, or by the
+    request's CartSnapshot when one was loaded; never creates a cart or
+    writes to the database.
+    """
+    # A page that loaded the cart's lines already knows the count
+    snapshot = getattr(request, '_cart_snapshot', None)
+    if snapshot is not None:
+        return snapshot.count
+    cart_id = get_session_cart_id(request)
+    if cart_id is None:
+        return 0
+    count = cache.get(CART_COUNT_CACHE_KEY.format(cart_id))
+    if count is None:
+        count = update_cart_count(cart_id)
+    return count
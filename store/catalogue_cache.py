@@ -0,0 +1,140 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache.utils import make_template_fragment_key
+from django.http import HttpResponse
+
+from .models import Category, Subcategory
+
+# Timeouts (seconds) for the catalogue caches, overridable from settings
+NAVIGATION_TIMEOUT = getattr(settings, 'STORE_NAVIGATION_CACHE_TIMEOUT', 60 * 60)
+PAGE_TIMEOUT = getattr(settings, 'STORE_PAGE_CACHE_TIMEOUT', 60 * 5)
+PRODUCT_CARD_TIMEOUT = getattr(settings, 'STORE_PRODUCT_CARD_CACHE_TIMEOUT', 60 * 60)
+
+# Fragment name used by {% cache %} around product cards in listing templates
+PRODUCT_CARD_FRAGMENT = 'product_card'
+
+
+def get_version(namespace):
+    """Current version of a cache namespace; bumping it orphans every key in it"""
+    key = f'store:version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted version never reuses an old value
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(namespace):
+    key = f'store:version:{namespace}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def versioned_key(namespace, *parts):
+    """Cache key inside a namespace, valid until the namespace is bumped"""
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'store:{namespace}:{get_version(namespace)}:{digest}'
+
+
+def get_navigation():
+    """
+    Category -> subcategory tree rendered by the base template's navbar,
+    built from two queries and cached until a category changes.
+    """
+    key = versioned_key('navigation')
+    navigation = cache.get(key)
+    if navigation is None:
+        subcategories = {}
+        for sub in Subcategory.objects.order_by('name').values('category_id', 'name', 'slug'):
+            subcategories.setdefault(sub['category_id'], []).append(sub)
+        navigation = [
+            {**category, 'subcategories': subcategories.get(category['id'], [])}
+            for category in Category.objects.order_by('name').values('id', 'name', 'slug')
+        ]
+        cache.set(key, navigation, NAVIGATION_TIMEOUT)
+    return navigation
+
+
+def invalidate_navigation():
+    bump_version('navigation')
+
+
+def invalidate_product_card(product_id):
+    cache.delete(make_template_fragment_key(PRODUCT_CARD_FRAGMENT, [product_id]))
+
+
+def invalidate_product_cards(product_ids):
+    cache.delete_many([make_template_fragment_key(PRODUCT_CARD_FRAGMENT, [pk]) for pk in product_ids])
+
+
+def invalidate_pages():
+    bump_version('pages')
+
+
+def catalogue_state():
+    """
+    (version, since) of the catalogue: the page cache version, which every
+    catalogue write bumps through invalidate_pages(), and the Unix time it
+    was first read at. Validates API listings without reading the products.
+    """
+    version = get_version('pages')
+    key = f'store:pages:{version}:since'
+    since = cache.get(key)
+    if since is None:
+        cache.add(key, int(time.time()), None)
+        since = cache.get(key, int(time.time()))
+    return version, since
+
+
+def _is_cacheable_request(request):
+    if not getattr(settings, 'STORE_PAGE_CACHE', True):
+        return False
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # Pages carrying flash messages are personal
+    return CookieStorage.cookie_name not in request.COOKIES
+
+
+def cache_anonymous_page(view):
+    """
+    Cache the full response of a catalogue view for anonymous visitors, keyed
+    by path and query string. Unlike cache_page this ignores the session
+    cookie, so every anonymous visitor shares one entry; entries are dropped
+    when the catalogue changes through invalidate_pages().
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        key = versioned_key('pages', request.get_full_path())
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Store-Cache'] = 'hit'
+            return response
+
+        response = view(request, *args, **kwargs)
+        cacheable = (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            # A CSRF token was rendered, which is specific to this visitor
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        )
+        if cacheable:
+            cache.set(key, (response.content, response['Content-Type']), PAGE_TIMEOUT)
+            response['X-Store-Cache'] = 'miss'
+        return response
+
+    return wrapper
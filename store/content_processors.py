@@ -1,9 +1,14 @@
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .cart import get_cart_count
+from .catalogue_cache import get_navigation, PRODUCT_CARD_TIMEOUT
 
 def cart_count(request):
-    try:
-        cart = Cart.objects.get(id=request.session.get('cart_id'))
-        count = cart.items.aggregate(total=Sum('quantity'))['total'] or 0
-        return {'cart_count': count}
-    except Cart.DoesNotExist:
-        return {'cart_count': 0}
\ No newline at end of file
+    # Evaluated only if a template renders the badge; served from the cache
+    return {'cart_count': SimpleLazyObject(lambda: get_cart_count(request))}
+
+def catalogue(request):
+    # Navbar category tree and cache settings shared by every page
+    return {
+        'nav_categories': SimpleLazyObject(get_navigation),
+        'product_card_timeout': PRODUCT_CARD_TIMEOUT,
+    }
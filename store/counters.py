@@ -0,0 +1,230 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .catalogue_cache import invalidate_pages, invalidate_product_cards
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Event -> (Product counter column, lookup identifying the product). Views are
+# counted by slug so cached product pages, which never reach the view, count too.
+EVENTS = {
+    'view': ('view_count', 'slug'),
+    'cart_add': ('cart_add_count', 'pk'),
+    'wishlist_add': ('wishlist_add_count', 'pk'),
+}
+
+# Contribution of one event to Product.popularity (the "popular" listing sort)
+POPULARITY_WEIGHTS = getattr(settings, 'STORE_POPULARITY_WEIGHTS', {'view': 1, 'cart_add': 5, 'wishlist_add': 3})
+
+# Pending increments are written after this many seconds or events, whichever comes first
+FLUSH_INTERVAL = getattr(settings, 'STORE_COUNTER_FLUSH_INTERVAL', 30)
+FLUSH_SIZE = getattr(settings, 'STORE_COUNTER_FLUSH_SIZE', 1000)
+
+# Products updated per UPDATE statement
+FLUSH_BATCH_SIZE = 500
+
+COUNTER_CACHE_KEY = 'store:counter:{}:{}'
+
+
+def write_counts(counts):
+    """
+    Apply {(event, key): n} to the product counters and popularity in one
+    transaction, with one UPDATE ... SET col = col + CASE ... END per event
+    and batch of products. Rows are visited in key order so concurrent
+    flushes lock them in the same order. update() sends no post_save, so the
+    cached cards and pages showing these products are dropped here.
+    """
+    by_event = defaultdict(dict)
+    for (event, key), n in counts.items():
+        if n:
+            by_event[event][key] = n
+
+    product_ids = set()
+    with transaction.atomic():
+        for event, increments in by_event.items():
+            column, lookup = EVENTS[event]
+            weight = POPULARITY_WEIGHTS.get(event, 0)
+            keys = sorted(increments)
+            for start in range(0, len(keys), FLUSH_BATCH_SIZE):
+                batch = keys[start:start + FLUSH_BATCH_SIZE]
+                delta = Case(
+                    *[When(**{lookup: key}, then=Value(increments[key])) for key in batch],
+                    default=Value(0), output_field=IntegerField(),
+                )
+                products = Product.objects.filter(**{f'{lookup}__in': batch})
+                products.update(**{
+                    column: F(column) + delta,
+                    'popularity': F('popularity') + delta * weight,
+                })
+                product_ids.update(batch if lookup == 'pk' else products.values_list('pk', flat=True))
+
+    if product_ids:
+        invalidate_product_cards(product_ids)
+        invalidate_pages()
+
+
+def recompute_popularity():
+    """Rebuild Product.popularity from the stored counters, e.g. after changing the weights"""
+    score = sum(
+        (F(column) * POPULARITY_WEIGHTS.get(event, 0) for event, (column, _) in EVENTS.items()),
+        Value(0),
+    )
+    updated = Product.objects.update(popularity=score)
+    # Popular listings are ordered by it
+    invalidate_pages()
+    return updated
+
+
+class MemoryCounterBuffer:
+    """
+    Sums increments in this process and writes them with write_counts()
+    every FLUSH_INTERVAL seconds or FLUSH_SIZE events, and at exit. Writes
+    happen on a background thread, never in the request that recorded the
+    event, so they add nothing to its latency or query count. A worker that
+    dies without exiting cleanly loses at most one flush worth.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL, size=FLUSH_SIZE):
+        self.interval = interval
+        self.size = size
+        self.lock = threading.Lock()
+        self.pending = Counter()
+        self.events = 0
+        self.due = threading.Event()
+        self.thread = None
+
+    def incr(self, event, key, n=1):
+        with self.lock:
+            self.pending[(event, key)] += n
+            self.events += n
+            if self.events >= self.size:
+                self.due.set()
+            self.start_flusher()
+
+    def start_flusher(self):
+        # Started on first use rather than at import, so a worker forked
+        # after importing this module (which loses the thread) starts its own
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run_flusher, name='store-counters', daemon=True)
+            self.thread.start()
+
+    def run_flusher(self):
+        while True:
+            self.due.wait(self.interval)
+            self.due.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Product counter flush failed')
+            finally:
+                # This thread's connection is never closed by a request cycle
+                connection.close()
+
+    def take(self):
+        """Swap out the pending increments; the caller owns what is returned"""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.events = 0
+        return pending
+
+    def restore(self, counts):
+        with self.lock:
+            self.pending.update(counts)
+            self.events += sum(counts.values())
+
+    def flush(self):
+        counts = self.take()
+        if not counts:
+            return 0
+        try:
+            write_counts(counts)
+        except DatabaseError:
+            # Keep them for the next flush rather than dropping them
+            logger.warning('Could not write %d product counters; retrying later', len(counts), exc_info=True)
+            self.restore(counts)
+            return 0
+        return len(counts)
+
+
+class CacheCounterBuffer(MemoryCounterBuffer):
+    """
+    Keeps the increments themselves in the shared cache (e.g. Redis), so a
+    worker restart loses nothing; this process only remembers which keys it
+    touched. Keys left behind by a worker that died are picked up by the
+    next process touching the same product, or by `manage.py flush_counters --all`.
+    """
+
+    def incr(self, event, key, n=1):
+        cache_key = COUNTER_CACHE_KEY.format(event, key)
+        cache.add(cache_key, 0, None)
+        try:
+            cache.incr(cache_key, n)
+        except ValueError:
+            # Evicted between add and incr
+            cache.add(cache_key, n, None)
+        super().incr(event, key, n)
+
+    def flush(self, keys=None):
+        """Move the cached counts of keys (default: the ones touched here) into the database"""
+        keys = list(self.take()) if keys is None else list(keys)
+        if not keys:
+            return 0
+        cache_keys = {COUNTER_CACHE_KEY.format(event, key): (event, key) for event, key in keys}
+        counts = Counter()
+        for cache_key, value in cache.get_many(list(cache_keys)).items():
+            if value:
+                # Only subtract what was read; increments since then stay for the next flush
+                cache.decr(cache_key, value)
+                counts[cache_keys[cache_key]] = value
+        if not counts:
+            return 0
+        try:
+            write_counts(counts)
+        except DatabaseError:
+            logger.warning('Could not write %d product counters; retrying later', len(counts), exc_info=True)
+            for (event, key), value in counts.items():
+                cache.incr(COUNTER_CACHE_KEY.format(event, key), value)
+            self.restore(Counter(dict.fromkeys(counts, 0)))
+            return 0
+        return len(counts)
+
+
+def make_buffer():
+    if getattr(settings, 'STORE_COUNTER_BUFFER', 'memory') == 'cache':
+        return CacheCounterBuffer()
+    return MemoryCounterBuffer()
+
+
+counters = make_buffer()
+atexit.register(counters.flush)
+
+
+def record_event(event, key, n=1):
+    """Count n occurrences of event ('view', 'cart_add' or 'wishlist_add') for a product"""
+    if event not in EVENTS:
+        raise ValueError(f'Unknown product event {event}')
+    counters.incr(event, key, n)
+
+
+def count_product_view(view):
+    """
+    Count successful GETs of a product page by slug. Applied outside
+    cache_anonymous_page so that cached responses are counted as well.
+    """
+    @wraps(view)
+    def wrapper(request, slug, *args, **kwargs):
+        response = view(request, slug, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200:
+            record_event('view', slug)
+        return response
+
+    return wrapper
@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+from .attributes import attribute_names
+from .catalogue_cache import bump_version, versioned_key
+from .filters import active_dimensions, apply_product_filters
+from .models import ProductVariant
+
+# Price ranges offered as facets: (min, max) with None meaning unbounded
+PRICE_BUCKETS = (
+    (None, 25),
+    (25, 50),
+    (50, 100),
+    (100, None),
+)
+
+FACET_DIMENSIONS = ('category', 'brand', 'color', 'size', 'price')
+FACET_CACHE_TIMEOUT = 60 * 15
+
+# Column each facet dimension is grouped on
+FACET_COLUMNS = {
+    'category': 'category_id',
+    'brand': 'brand_id',
+    'color': 'color_id',
+    'size': 'size_id',
+    'price': 'price_bucket',
+}
+
+# Dimensions a product can also take from its variants
+VARIANT_DIMENSIONS = ('color', 'size')
+
+
+def price_bucket_expression():
+    """Map Product.price to the index of its bucket in PRICE_BUCKETS"""
+    whens = [
+        When(price__lt=upper, then=Value(index))
+        for index, (lower, upper) in enumerate(PRICE_BUCKETS)
+        if upper is not None
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def _count(queryset, dimensions):
+    """
+    Count products per value of each dimension with a single GROUP BY over the
+    combination of their columns, then fold the rows into one map per facet.
+    """
+    counts = {dimension: {} for dimension in dimensions}
+    if not dimensions:
+        return counts
+
+    if 'price' in dimensions:
+        queryset = queryset.annotate(price_bucket=price_bucket_expression())
+    columns = [FACET_COLUMNS[dimension] for dimension in dimensions]
+    rows = queryset.order_by().values(*columns).annotate(facet_count=Count('id'))
+
+    for row in rows:
+        for dimension, column in zip(dimensions, columns):
+            value = row[column]
+            if value is None:
+                continue
+            counts[dimension][value] = counts[dimension].get(value, 0) + row['facet_count']
+
+    _count_variants(queryset, [dimension for dimension in dimensions if dimension in VARIANT_DIMENSIONS], counts)
+    return counts
+
+
+def _count_variants(queryset, dimensions, counts):
+    """
+    Add the products sold in a color or size through their variants, each
+    counted once per value and only where its own column did not count it
+    already; all dimensions share one UNION ALL query.
+    """
+    if not dimensions:
+        return
+    products = queryset.order_by().values('pk')
+    parts = [
+        ProductVariant.objects.filter(product__in=products, **{f'{dimension}__isnull': False})
+        .filter(Q(**{f'product__{dimension}__isnull': True}) | ~Q(**{f'product__{dimension}': F(dimension)}))
+        .values(facet_value=F(dimension))
+        .annotate(facet_count=Count('product', distinct=True), facet_dimension=Value(dimension))
+        .order_by()
+        for dimension in dimensions
+    ]
+    rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    for row in rows:
+        dimension_counts = counts[row['facet_dimension']]
+        dimension_counts[row['facet_value']] = dimension_counts.get(row['facet_value'], 0) + row['facet_count']
+
+
+def compute_facets(queryset, filters):
+    """
+    Return {dimension: {value: count}} for every facet dimension, restricted to
+    the products matching filters. A dimension that is itself filtered is
+    counted without its own filter so the other values remain selectable; all
+    unfiltered dimensions share one grouped query.
+    """
+    selected = [dimension for dimension in active_dimensions(filters) if dimension in FACET_DIMENSIONS]
+    free = [dimension for dimension in FACET_DIMENSIONS if dimension not in selected]
+
+    facets = _count(apply_product_filters(queryset, filters), free)
+    for dimension in selected:
+        facets.update(_count(apply_product_filters(queryset, filters, exclude=dimension), [dimension]))
+
+    # Present buckets as their bounds instead of an index
+    facets['price'] = [
+        {'min': lower, 'max': upper, 'count': facets['price'][index]}
+        for index, (lower, upper) in enumerate(PRICE_BUCKETS)
+        if index in facets['price']
+    ]
+    # Attribute facets are counted by id; list them as (id, name, count) by name
+    for dimension in ('brand', 'color', 'size'):
+        names = attribute_names(dimension)
+        facets[dimension] = sorted(
+            ((value, names.get(value, ''), count) for value, count in facets[dimension].items()),
+            key=lambda facet: (facet[1].casefold(), facet[0]),
+        )
+    return facets
+
+
+def invalidate_facets():
+    """Drop every cached facet set"""
+    bump_version('facets')
+
+
+def get_facets(queryset, filters, scope=''):
+    """
+    Cached compute_facets(). scope must identify anything that narrows
+    queryset beyond filters (e.g. the search query).
+    """
+    key = versioned_key('facets', scope, sorted(filters.items()))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset, filters)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,85 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Exists, OuterRef, Q
+
+from .models import ProductVariant
+
+# Facet dimensions a product listing can be filtered on. "price" covers both
+# the min_price and max_price query parameters.
+FILTER_DIMENSIONS = {
+    'category': ('category',),
+    'price': ('min_price', 'max_price'),
+    'brand': ('brand',),
+    'color': ('color',),
+    'size': ('size',),
+    'rating': ('min_rating',),
+}
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_decimal(value):
+    try:
+        return Decimal(value)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+
+
+def get_product_filters(request):
+    """Collect the listing filters from the query string, dropping invalid values"""
+    params = request.GET
+    filters = {
+        'category': _parse_int(params.get('category')),
+        'min_price': _parse_decimal(params.get('min_price')),
+        'max_price': _parse_decimal(params.get('max_price')),
+        'brand': _parse_int(params.get('brand')),
+        'color': _parse_int(params.get('color')),
+        'size': _parse_int(params.get('size')),
+        'min_rating': _parse_decimal(params.get('min_rating')),
+    }
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def variant_match(field, value):
+    """
+    Products whose own size/color is value, or that have a variant in it.
+    The variant side is an EXISTS probe of the (size|color, product) index,
+    so each product is matched once however many variants it has.
+    """
+    variants = ProductVariant.objects.filter(product=OuterRef('pk'), **{f'{field}_id': value})
+    return Q(**{f'{field}_id': value}) | Q(Exists(variants))
+
+
+def active_dimensions(filters):
+    """Facet dimensions that have at least one filter applied"""
+    return [
+        dimension for dimension, keys in FILTER_DIMENSIONS.items()
+        if any(key in filters for key in keys)
+    ]
+
+
+def apply_product_filters(queryset, filters, exclude=None):
+    """
+    Apply the listing filters to a Product queryset. Filters belonging to the
+    dimension named by exclude are skipped (used to count the other values of
+    a facet that is currently selected).
+    """
+    skipped = FILTER_DIMENSIONS.get(exclude, ())
+    lookups = {
+        'category': 'category_id',
+        'min_price': 'price__gte',
+        'max_price': 'price__lte',
+        'brand': 'brand_id',
+        'min_rating': 'rating_avg__gte',
+    }
+    conditions = [
+        variant_match(key, value) if key in ('color', 'size') else Q(**{lookups[key]: value})
+        for key, value in filters.items()
+        if key not in skipped
+    ]
+    return queryset.filter(*conditions) if conditions else queryset
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+# Widths (px) generated for every source image, overridable from settings
+DERIVATIVE_WIDTHS = tuple(getattr(settings, 'STORE_IMAGE_WIDTHS', (160, 320, 480, 800)))
+# Modern formats offered to browsers that accept them, best first; JPEG is always the fallback
+DERIVATIVE_FORMATS = tuple(
+    fmt for fmt in getattr(settings, 'STORE_IMAGE_FORMATS', ('avif', 'webp')) if features.check(fmt)
+)
+FALLBACK_FORMAT = 'jpeg'
+
+# Encoder options per format
+ENCODERS = {
+    'avif': {'format': 'AVIF', 'quality': 60, 'speed': 8},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Bump to regenerate every derivative after changing the encoders above
+DERIVATIVE_VERSION = 1
+DERIVATIVE_DIR = 'derivatives'
+
+ORIENTATION_TAG = 0x0112
+
+
+def source_digest(data):
+    return hashlib.sha256(data + f'v{DERIVATIVE_VERSION}'.encode()).hexdigest()[:16]
+
+
+def derivative_name(source_name, digest, width, fmt):
+    """Content-hashed storage name, so derivatives can be served with far-future expiry"""
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{DERIVATIVE_DIR}/{digest[:2]}/{stem}-{digest}-{width}w.{extension}'
+
+
+def target_widths(source_width):
+    """Configured widths that don't upscale, capped by the source width itself"""
+    widths = [width for width in DERIVATIVE_WIDTHS if width < source_width]
+    if source_width <= max(DERIVATIVE_WIDTHS):
+        widths.append(source_width)
+    return widths
+
+
+def encode(image, width, fmt):
+    height = round(image.height * width / image.width)
+    resized = image.resize((width, height), Image.Resampling.LANCZOS) if width != image.width else image
+    if fmt == 'jpeg' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')
+    buffer = BytesIO()
+    resized.save(buffer, **ENCODERS[fmt])
+    return buffer.getvalue()
+
+
+def generate_derivatives(source_name, storage=None):
+    """
+    Write every missing derivative of source_name to storage and return its
+    manifest, {'source', 'width', 'height', 'variants': {format: [(width, name), ...]}}.
+    Existing files are left alone, since a content-hashed name can only ever
+    hold the same bytes. Safe to run from a worker process.
+    """
+    storage = storage or default_storage
+    with storage.open(source_name, 'rb') as source:
+        data = source.read()
+    digest = source_digest(data)
+
+    with Image.open(BytesIO(data)) as opened:
+        width, height = opened.size
+        # EXIF orientations 5-8 rotate by 90 degrees
+        if opened.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+            width, height = height, width
+
+        variants = {
+            fmt: [(target, derivative_name(source_name, digest, target, fmt)) for target in target_widths(width)]
+            for fmt in DERIVATIVE_FORMATS + (FALLBACK_FORMAT,)
+        }
+        missing = [
+            (fmt, target, name)
+            for fmt, sizes in variants.items()
+            for target, name in sizes
+            if not storage.exists(name)
+        ]
+        # Only decode the source when something needs encoding
+        if missing:
+            image = ImageOps.exif_transpose(opened)
+            for fmt, target, name in missing:
+                storage.save(name, ContentFile(encode(image, target, fmt)))
+
+    return {'source': source_name, 'width': width, 'height': height, 'variants': variants}
+
+
+def manifest_field(field_file):
+    """Name of the JSONField next to an ImageField that stores its manifest"""
+    return f'{field_file.field.name}_manifest'
+
+
+def get_manifest(field_file):
+    """
+    Stored manifest of an ImageField value, or None when derivatives have
+    not been generated for its current file, so callers fall back to the
+    original. Never generates anything: rendering stays free of image work.
+    """
+    if not field_file:
+        return None
+    manifest = getattr(field_file.instance, manifest_field(field_file), None)
+    if manifest is None or manifest.get('source') != field_file.name:
+        return None
+    return manifest
+
+
+def prepare_manifest(instance, field_name):
+    """
+    Generate the derivatives of an instance's image field when its stored
+    manifest is missing or belongs to a previous file, and store the new
+    manifest with an UPDATE (so no further save signals run). Runs when the
+    image is saved; generate_image_derivatives backfills existing rows.
+    Returns whether the stored manifest changed.
+    """
+    field_file = getattr(instance, field_name)
+    if get_manifest(field_file) is not None:
+        return False
+    manifest = None
+    if field_file:
+        try:
+            manifest = generate_derivatives(field_file.name, field_file.storage)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            logger.warning('Could not generate derivatives for %s: %s', field_file.name, e)
+    column = f'{field_name}_manifest'
+    if getattr(instance, column) != manifest:
+        setattr(instance, column, manifest)
+        type(instance)._default_manager.filter(pk=instance.pk).update(**{column: manifest})
+        return True
+    return False
+
+
+def srcset(manifest, fmt, storage=None):
+    storage = storage or default_storage
+    return ', '.join(f'{storage.url(name)} {width}w' for width, name in manifest['variants'][fmt])
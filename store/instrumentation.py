@@ -0,0 +1,185 @@
+import atexit
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# Methods that cannot have written anything a failed response would misreport
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Metrics of the request currently being handled (None outside the middleware)
+current_metrics = contextvars.ContextVar('store_request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a view issues more queries than its budget"""
+
+
+class RequestMetrics:
+    """Counters collected for a single request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.started = time.perf_counter()
+        self.total_time = 0.0
+        self.response_size = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time every query on every alias
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'total_ms': round(self.total_time * 1000, 3),
+            'bytes': self.response_size,
+        }
+
+
+class MetricsCollector:
+    """
+    Buffers per-request samples in memory and appends them as JSON lines to
+    STORE_METRICS_LOG, where the request_metrics command reads them back.
+    """
+
+    def __init__(self, path=None, flush_every=100):
+        self.path = path
+        self.flush_every = flush_every
+        self.buffer = []
+        self.lock = threading.Lock()
+
+    def record(self, url_name, metrics):
+        if not self.path:
+            return
+        sample = {'view': url_name, 'ts': time.time(), **metrics.as_dict()}
+        with self.lock:
+            self.buffer.append(sample)
+            if len(self.buffer) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        lines = ''.join(json.dumps(sample) + '\n' for sample in self.buffer)
+        self.buffer = []
+        with open(self.path, 'a') as log:
+            log.write(lines)
+
+
+collector = MetricsCollector(getattr(settings, 'STORE_METRICS_LOG', None))
+atexit.register(collector.flush)
+
+
+def check_query_budget(url_name, queries, method='GET'):
+    """
+    Compare a request's query count against STORE_QUERY_BUDGETS, where a
+    view's budget is a number or a {method: number} dict. Overruns are
+    logged, and raise QueryBudgetExceeded when STORE_QUERY_BUDGET_STRICT is
+    on (as in store.tests) so N+1 regressions fail the suite. Only safe
+    methods raise: the response of a POST may already stand for committed
+    writes (a placed order), so its overruns are logged as errors instead.
+    """
+    budget = getattr(settings, 'STORE_QUERY_BUDGETS', {}).get(url_name)
+    if isinstance(budget, dict):
+        budget = budget.get(method)
+    if budget is None or queries <= budget:
+        return
+    message = f'{url_name} issued {queries} queries on {method} (budget {budget})'
+    if not getattr(settings, 'STORE_QUERY_BUDGET_STRICT', False):
+        logger.warning(message)
+    elif method in SAFE_METHODS:
+        raise QueryBudgetExceeded(message)
+    else:
+        logger.error(message)
+
+
+class RequestMetricsMiddleware:
+    """
+    Counts SQL queries, database time, template render time and response size
+    for every request, records them per URL name and checks query budgets.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'STORE_METRICS_HEADER', False)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        metrics.total_time = time.perf_counter() - metrics.started
+        if not response.streaming:
+            metrics.response_size = len(response.content)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match and match.url_name else 'unresolved'
+        collector.record(url_name, metrics)
+
+        if self.header:
+            response['X-Store-Metrics'] = (
+                f'view={url_name};queries={metrics.queries};'
+                f'db={metrics.db_time * 1000:.1f}ms;'
+                f'template={metrics.template_time * 1000:.1f}ms;'
+                f'total={metrics.total_time * 1000:.1f}ms'
+            )
+
+        check_query_budget(url_name, metrics.queries, request.method)
+        return response
+
+
+class TimedTemplate:
+    """Wraps a backend template to add its render time to the request metrics"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Django template backend that reports render time to RequestMetricsMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,86 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from store.models import Category, Product, Cart, CartItem, OrderLine
+from store.orders import InsufficientStock, place_order
+
+
+class Command(BaseCommand):
+    help = 'Runs concurrent checkouts against one hot product and checks for oversells'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50, help='Concurrent checkouts')
+        parser.add_argument('--stock', type=int, default=20, help='Units of the hot product in stock')
+        parser.add_argument('--quantity', type=int, default=1, help='Units in each cart')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, product and orders')
+
+    def handle(self, *args, **options):
+        buyers, stock, quantity = options['buyers'], options['stock'], options['quantity']
+        run = uuid.uuid4().hex[:8]
+
+        category = Category.objects.create(name=f'Checkout benchmark {run}')
+        product = Product.objects.create(name=f'Hot product {run}', category=category, price='10.00', stock=stock)
+        users = User.objects.bulk_create([User(username=f'checkout-bench-{run}-{i}') for i in range(buyers)])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=quantity) for cart in carts])
+
+        barrier = threading.Barrier(buyers)
+        outcomes = []
+
+        def checkout(user, cart):
+            barrier.wait()
+            started = time.perf_counter()
+            try:
+                # Submit twice, as a double click would
+                key = uuid.uuid4().hex
+                place_order(user, cart, key)
+                place_order(user, cart, key)
+                outcome = 'placed'
+            except InsufficientStock:
+                outcome = 'sold out'
+            except DatabaseError as e:
+                outcome = f'error: {e}'
+            finally:
+                connection.close()
+            outcomes.append((outcome, time.perf_counter() - started))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=buyers) as executor:
+            for user, cart in zip(users, carts):
+                executor.submit(checkout, user, cart)
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        placed = sum(1 for outcome, _ in outcomes if outcome == 'placed')
+        sold_out = sum(1 for outcome, _ in outcomes if outcome == 'sold out')
+        errors = [outcome for outcome, _ in outcomes if outcome.startswith('error')]
+        sold = OrderLine.objects.filter(product=product).aggregate(units=Sum('quantity'))['units'] or 0
+        latencies = sorted(duration * 1000 for _, duration in outcomes)
+
+        self.stdout.write(
+            f'{buyers} checkouts in {elapsed:.2f}s: {placed} placed, {sold_out} sold out, {len(errors)} errors'
+        )
+        self.stdout.write(
+            f'latency ms: p50 {statistics.median(latencies):.1f}, '
+            f'p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f}, max {latencies[-1]:.1f}'
+        )
+        for error in sorted(set(errors)):
+            self.stderr.write(error)
+
+        if not options['keep']:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            product.delete()
+            category.delete()
+
+        consistent = sold == placed * quantity and product.stock == stock - sold and placed * quantity <= stock
+        if not consistent:
+            raise CommandError(f'Oversold: {sold} units sold from {stock}, {product.stock} left')
+        self.stdout.write(self.style.SUCCESS(f'No oversell: {sold} of {stock} units sold, {product.stock} left'))
@@ -0,0 +1,400 @@
+import json
+import logging
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from store import urls as store_urls
+from store.cart import add_items
+from store.models import Cart, CartItem, Category, Product, Subcategory
+from .request_metrics import percentile
+from .seed_benchmark_data import USERNAME_PREFIX
+
+
+def cart_line(visitor):
+    """Make sure the visitor's cart holds a line and return its id"""
+    product_id = visitor.product_id()
+    add_items(visitor.cart_id, {(product_id, None): 1})
+    return CartItem.objects.get(cart_id=visitor.cart_id, product_id=product_id, variant=None).pk
+
+
+def checkout_page(visitor):
+    cart_line(visitor)
+    return 'GET', reverse('checkout'), None
+
+
+def checkout_form(visitor):
+    # Products without tracked stock never sell out, so every run can order
+    add_items(visitor.cart_id, {(visitor.rng.choice(visitor.untracked_ids), None): 1})
+    return {'idempotency_key': uuid.uuid4().hex}
+
+
+# Every route of store/urls.py: (label, url name, logged in, request builder).
+# A builder returns (method, path, data); it runs before the timer starts, so
+# any setup it writes to the database is not measured.
+ROUTES = [
+    ('home', 'home', False, lambda v: ('GET', reverse('home'), None)),
+    ('home (search)', 'home', False, lambda v: ('GET', f"{reverse('home')}?{urlencode({'q': v.rng.choice(v.words)})}", None)),
+    ('product_detail', 'product_detail', True, lambda v: ('GET', reverse('product_detail', args=[v.product_slug()]), None)),
+    ('category', 'category', False, lambda v: ('GET', reverse('category', args=[v.rng.choice(v.category_slugs)]), None)),
+    ('subcategory', 'subcategory', False, lambda v: ('GET', reverse('subcategory', args=[v.rng.choice(v.subcategory_slugs)]), None)),
+    ('register', 'register', True, lambda v: ('GET', reverse('register'), None)),
+    ('login', 'login', False, lambda v: ('GET', reverse('login'), None)),
+    ('logout', 'logout', False, lambda v: ('GET', reverse('logout'), None)),
+    ('profile', 'profile', True, lambda v: ('GET', reverse('profile'), None)),
+    ('dashboard', 'dashboard', True, lambda v: ('GET', reverse('dashboard'), None)),
+    ('cart', 'cart', True, lambda v: ('GET', reverse('cart'), None)),
+    ('add_to_cart', 'add_to_cart', True, lambda v: ('POST', reverse('add_to_cart', args=[v.product_id()]), {})),
+    ('remove_from_cart', 'remove_from_cart', True, lambda v: ('POST', reverse('remove_from_cart', args=[cart_line(v)]), {})),
+    ('update_cart', 'update_cart', True, lambda v: ('POST', reverse('update_cart', args=[cart_line(v)]), {'quantity': 2})),
+    ('update_cart_lines', 'update_cart_lines', True, lambda v: ('POST', reverse('update_cart_lines'), {f'quantity-{v.product_id()}': 2})),
+    ('cart_count', 'cart_count', True, lambda v: ('GET', reverse('cart_count'), None)),
+    ('add_review', 'add_review', True, lambda v: ('POST', reverse('add_review', args=[v.product_id()]), {'rating': v.rng.randint(1, 5), 'comment': 'Benchmark review'})),
+    ('add_to_wishlist', 'add_to_wishlist', True, lambda v: ('POST', reverse('add_to_wishlist', args=[v.product_id()]), {})),
+    ('remove_from_wishlist', 'remove_from_wishlist', True, lambda v: ('POST', reverse('remove_from_wishlist', args=[v.product_id()]), {})),
+    ('toggle_wishlist', 'toggle_wishlist', True, lambda v: ('POST', reverse('toggle_wishlist', args=[v.product_id()]), {})),
+    ('checkout', 'checkout', True, checkout_page),
+    ('checkout (POST)', 'checkout', True, lambda v: ('POST', reverse('checkout'), checkout_form(v))),
+    ('api_products', 'api_products', False, lambda v: ('GET', reverse('api_products'), None)),
+    ('api_products (fields)', 'api_products', False, lambda v: ('GET', f"{reverse('api_products')}?fields=id,name,price", None)),
+    ('api_product', 'api_product', False, lambda v: ('GET', reverse('api_product', args=[v.product_slug()]), None)),
+    ('api_product_reviews', 'api_product_reviews', False, lambda v: ('GET', reverse('api_product_reviews', args=[v.product_slug()]), None)),
+    ('api_product_export', 'api_product_export', False, lambda v: ('GET', f"{reverse('api_product_export')}?fields=id,sku,price", None)),
+    ('api_categories', 'api_categories', False, lambda v: ('GET', reverse('api_categories'), None)),
+    ('api_facets', 'api_facets', False, lambda v: ('GET', reverse('api_facets'), None)),
+]
+
+
+class Visitor:
+    """One benchmark user with its own random stream and sampled catalogue"""
+
+    def __init__(self, user, catalogue, seed):
+        self.user = user
+        self.rng = random.Random(seed)
+        self.cart_id = Cart.objects.get_or_create(user=user)[0].id
+        self.__dict__.update(catalogue)
+
+    def product_id(self):
+        return self.rng.choice(self.products)[0]
+
+    def product_slug(self):
+        return self.rng.choice(self.products)[1]
+
+
+class NoRedirects(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every storefront route through the test client or a concurrent HTTP load '
+        'against a local server, and compares the results with a stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per route')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per route first')
+        parser.add_argument('--route', action='append', help='Only benchmark these route labels')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the visited products')
+        parser.add_argument('--http', action='store_true', help='Load a real server over HTTP instead of the test client')
+        parser.add_argument('--url', help='With --http, base URL of a running server on this database (default: start runserver)')
+        parser.add_argument('--concurrency', type=int, default=8, help='With --http, concurrent connections')
+        parser.add_argument('--save-baseline', metavar='FILE', help='Write the results as a baseline JSON file')
+        parser.add_argument('--baseline', metavar='FILE', help='Compare with this baseline and fail on regressions')
+        parser.add_argument('--threshold', type=float, default=0.25, help='Allowed p95 / peak RSS growth (0.25 = 25%%)')
+        parser.add_argument('--min-delta', type=float, default=2.0, help='p95 increases below this many ms are noise')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        routes = self.select_routes(options['route'])
+        visitor_count = options['concurrency'] if options['http'] else 1
+        visitors = self.get_visitors(visitor_count, options['seed'])
+
+        # Overruns are part of the results here, not errors or log noise
+        budget_logger = logging.getLogger('store.instrumentation')
+        level = budget_logger.level
+        budget_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(STORE_QUERY_BUDGET_STRICT=False):
+                if options['http']:
+                    results = self.run_http(routes, visitors, options)
+                else:
+                    results = self.run_client(routes, visitors[0], options)
+        finally:
+            budget_logger.setLevel(level)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.print_results(results)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2)
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+
+        if options['baseline']:
+            self.compare(results, options)
+
+    def select_routes(self, labels):
+        # Keep the table honest: a new URL without a benchmark fails loudly
+        covered = {name for _, name, _, _ in ROUTES}
+        missing = [pattern.name for pattern in store_urls.urlpatterns if pattern.name not in covered]
+        if missing:
+            raise CommandError(f'No benchmark for routes: {", ".join(missing)}')
+        if not labels:
+            return ROUTES
+        unknown = set(labels) - {label for label, _, _, _ in ROUTES}
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(sorted(unknown))}')
+        return [route for route in ROUTES if route[0] in labels]
+
+    def get_visitors(self, count, seed):
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')[:count])
+        if len(users) < count:
+            raise CommandError(f'Need {count} benchmark users; run `manage.py seed_benchmark_data` first')
+        products = list(Product.objects.order_by('id').values_list('id', 'slug')[:2000])
+        untracked = [product_id for product_id, in Product.objects.filter(stock=None).order_by('id').values_list('id')[:200]]
+        if not products or not untracked:
+            raise CommandError('The catalogue is empty; run `manage.py seed_benchmark_data` first')
+        catalogue = {
+            'products': products,
+            'untracked_ids': untracked,
+            'category_slugs': list(Category.objects.values_list('slug', flat=True)),
+            'subcategory_slugs': list(Subcategory.objects.values_list('slug', flat=True)),
+            'words': sorted({slug.split('-')[0] for _, slug in products}),
+        }
+        return [Visitor(user, catalogue, seed + i) for i, user in enumerate(users)]
+
+    def summarise(self, samples, elapsed, queries=None):
+        """Per-route result from (latency in seconds, status) samples"""
+        latencies = sorted(latency * 1000 for latency, _ in samples)
+        return {
+            'requests': len(samples),
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+            'queries': round(sum(queries) / len(queries), 1) if queries else None,
+            'errors': sum(1 for _, status in samples if status >= 500),
+        }
+
+    def run_client(self, routes, visitor, options):
+        """Serial requests through the in-process test client"""
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        anonymous, member = Client(HTTP_HOST=host), Client(HTTP_HOST=host)
+        member.force_login(visitor.user)
+
+        results = {}
+        for label, _, logged_in, build in routes:
+            client = member if logged_in else anonymous
+            samples, queries = [], []
+            elapsed = 0.0
+            for i in range(options['warmup'] + options['requests']):
+                method, path, data = build(visitor)
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                    started = time.perf_counter()
+                    response = client.generic(method, path, urlencode(data or {}),
+                                              content_type='application/x-www-form-urlencoded', secure=True)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    latency = time.perf_counter() - started
+                if i >= options['warmup']:
+                    samples.append((latency, response.status_code))
+                    queries.append(sum(len(capture) for capture in captured))
+                    elapsed += latency
+            results[label] = self.summarise(samples, elapsed, queries)
+
+        return {
+            'mode': 'client',
+            'routes': results,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    def run_http(self, routes, visitors, options):
+        """Concurrent requests from one thread per visitor against a real server"""
+        server = None
+        base_url = options['url']
+        if not base_url:
+            server, base_url = self.start_server()
+        base_url = base_url.rstrip('/')
+
+        # Log every visitor in once; the session cookies are replayed by the load threads
+        csrf_token = get_random_string(32)
+        cookies = {}
+        for visitor in visitors:
+            client = Client()
+            client.force_login(visitor.user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            cookies[visitor] = (
+                f'{settings.CSRF_COOKIE_NAME}={csrf_token}',
+                f'{settings.CSRF_COOKIE_NAME}={csrf_token}; {settings.SESSION_COOKIE_NAME}={session}',
+            )
+        opener = build_opener(NoRedirects)
+
+        def fetch(visitor, logged_in, method, path, data):
+            request = Request(
+                base_url + path,
+                data=urlencode(data).encode() if method == 'POST' else None,
+                method=method,
+                headers={
+                    'Cookie': cookies[visitor][logged_in],
+                    'X-CSRFToken': csrf_token,
+                    'Origin': base_url,
+                    'Referer': base_url + '/',
+                },
+            )
+            started = time.perf_counter()
+            try:
+                with opener.open(request, timeout=30) as response:
+                    response.read()
+                    status, headers = response.status, response.headers
+            except HTTPError as e:
+                status, headers = e.code, e.headers
+            latency = time.perf_counter() - started
+            if status in (301, 308) and headers.get('Location', '').startswith('https://'):
+                raise CommandError(f'{base_url} redirects to HTTPS; pass an https:// --url or run with DEBUG on')
+            # Query counts are only reported when the server sets STORE_METRICS_HEADER
+            metrics = dict(part.split('=', 1) for part in headers.get('X-Store-Metrics', '').split(';') if '=' in part)
+            return latency, status, int(metrics['queries']) if 'queries' in metrics else None
+
+        results = {}
+        try:
+            for label, _, logged_in, build in routes:
+                total = options['warmup'] + options['requests']
+                samples, queries, failures = [], [], []
+                counter = iter(range(total))
+                lock = threading.Lock()
+
+                def worker(visitor):
+                    try:
+                        while True:
+                            with lock:
+                                i = next(counter, None)
+                            if i is None:
+                                return
+                            method, path, data = build(visitor)
+                            latency, status, count = fetch(visitor, logged_in, method, path, data)
+                            if i >= options['warmup']:
+                                with lock:
+                                    samples.append((latency, status))
+                                    if count is not None:
+                                        queries.append(count)
+                    except Exception as e:
+                        failures.append(e)
+                    finally:
+                        connection.close()
+
+                started = time.perf_counter()
+                threads = [threading.Thread(target=worker, args=(visitor,)) for visitor in visitors]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+                if failures:
+                    raise failures[0]
+                # Throughput over the whole run, warmup included, since it ran concurrently
+                result = self.summarise(samples, elapsed, queries)
+                result['rps'] = round(total / elapsed, 1)
+                results[label] = result
+        finally:
+            peak_rss = self.stop_server(server) if server else None
+
+        return {'mode': 'http', 'routes': results, 'peak_rss_mb': peak_rss}
+
+    def start_server(self):
+        """Start `manage.py runserver` on a free local port; returns (process, base URL)"""
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        process = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('runserver exited during startup')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return process, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        process.kill()
+        raise CommandError('runserver did not start within 30 seconds')
+
+    def stop_server(self, process):
+        """Stop the server; returns its peak RSS in MB (the largest of any waited-for child)"""
+        process.terminate()
+        process.wait()
+        return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+    def print_results(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{'route':<22} {'reqs':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'req/s':>8} {'5xx':>4}"
+        ))
+        for label, route in results['routes'].items():
+            queries = '-' if route['queries'] is None else route['queries']
+            line = (
+                f"{label:<22} {route['requests']:>5} {route['p50']:>8} {route['p95']:>8} {route['p99']:>8} "
+                f"{queries:>8} {route['rps']:>8} {route['errors']:>4}"
+            )
+            self.stdout.write(self.style.ERROR(line) if route['errors'] else line)
+        if results['peak_rss_mb'] is not None:
+            process = 'server' if results['mode'] == 'http' else 'process'
+            self.stdout.write(f"Peak RSS ({process}): {results['peak_rss_mb']} MB")
+
+    def compare(self, results, options):
+        """Fail on routes slower, issuing more queries or erroring more than in the baseline"""
+        try:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            raise CommandError(f"Baseline {options['baseline']} does not exist")
+        if baseline.get('mode') != results['mode']:
+            raise CommandError(f"Baseline was recorded in {baseline.get('mode')} mode, not {results['mode']}")
+
+        threshold = options['threshold']
+        regressions = []
+        for label, route in results['routes'].items():
+            before = baseline['routes'].get(label)
+            if before is None:
+                self.stdout.write(f'{label}: not in the baseline')
+                continue
+            if route['p95'] > before['p95'] * (1 + threshold) and route['p95'] - before['p95'] > options['min_delta']:
+                regressions.append(f"{label}: p95 {before['p95']} -> {route['p95']} ms")
+            # Means vary a little with the sampled products; a whole extra query per request does not
+            if route['queries'] is not None and before['queries'] is not None and route['queries'] >= before['queries'] + 1:
+                regressions.append(f"{label}: queries {before['queries']} -> {route['queries']}")
+            if route['errors'] > before['errors']:
+                regressions.append(f"{label}: 5xx responses {before['errors']} -> {route['errors']}")
+        if results['peak_rss_mb'] and baseline.get('peak_rss_mb'):
+            if results['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + threshold):
+                regressions.append(f"peak RSS {baseline['peak_rss_mb']} -> {results['peak_rss_mb']} MB")
+
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Mod
+
+from store.catalogue_cache import invalidate_pages
+from store.models import ProductRecommendation
+from store.recommendations import SIMILARITIES, cooccurrence, interaction_baskets, top_neighbours
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the "also viewed" recommendations from recently viewed and wishlist history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=10, help='Neighbours kept per product')
+        parser.add_argument('--metric', choices=sorted(SIMILARITIES), default='cosine', help='Similarity measure')
+        parser.add_argument('--min-together', type=int, default=2, help='Users two products need in common')
+        parser.add_argument(
+            '--shards', type=int, default=1,
+            help='Passes over the history, each keeping the pairs of 1/N of the products in memory',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows fetched per database round trip')
+        parser.add_argument('--max-basket', type=int, default=200, help='Products considered per user')
+
+    def handle(self, *args, **options):
+        if min(options['top_k'], options['shards'], options['chunk_size'], options['max_basket']) < 1:
+            raise CommandError('--top-k, --shards, --chunk-size and --max-basket must be positive')
+        similarity = SIMILARITIES[options['metric']]
+        shards = options['shards']
+
+        started = time.perf_counter()
+        products = neighbours = 0
+        for shard in range(shards):
+            baskets = interaction_baskets(options['chunk_size'], options['max_basket'])
+            counts, pairs = cooccurrence(baskets, shard, shards)
+            rows = [
+                ProductRecommendation(product_id=product_id, recommended_id=other, rank=rank, score=score)
+                for product_id, top in top_neighbours(counts, pairs, options['top_k'], similarity, options['min_together'])
+                for rank, (score, other) in enumerate(top)
+            ]
+            del pairs
+
+            # Each shard's products are swapped in one short transaction, so
+            # product pages always see a complete old or new list
+            with transaction.atomic():
+                ProductRecommendation.objects.alias(shard=Mod('product_id', shards)).filter(shard=shard).delete()
+                ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
+
+            products += len({row.product_id for row in rows})
+            neighbours += len(rows)
+            if shards > 1:
+                self.stdout.write(f'Shard {shard + 1}/{shards}: {len(rows)} neighbours')
+
+        # Cached anonymous product pages embed the old recommendations
+        invalidate_pages()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {neighbours} {options["metric"]} neighbours for {products} products '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,180 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.conf import settings
+
+from store.models import Category, Subcategory, Product
+
+# Lookup tables small enough that reading them whole is expected
+SMALL_TABLES = {'store_category', 'store_subcategory', 'store_brand', 'store_color', 'store_size'}
+
+# Any SCAN reads a whole table or index, whichever index it goes through,
+# except a virtual table scan with a constraint (an FTS5 MATCH)
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)\b(?! VIRTUAL TABLE INDEX \d+:\S)(.*)$')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)()')
+# Table aliases in Django's SQL (T3, U0, ...), which plans report instead of table names
+SQL_ALIAS = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+SQL_LIMIT = re.compile(r'\bLIMIT \d+')
+
+
+class Command(BaseCommand):
+    help = "Requests each catalogue view, runs EXPLAIN on its queries and flags full table scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username for the views that need a login (default: first user)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any query scans a whole table')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'EXPLAIN parsing is not implemented for {connection.vendor}')
+
+        user = self.get_user(options['user'])
+        # Anonymous routes get their own client so they run as a visitor would
+        anonymous, member = Client(HTTP_HOST=self.get_host()), Client(HTTP_HOST=self.get_host())
+        if user:
+            member.force_login(user)
+
+        scans = sorts = 0
+        # Disable every cache so each view actually runs its queries
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            STORE_PAGE_CACHE=False,
+            STORE_QUERY_BUDGET_STRICT=False,
+        ):
+            for path, needs_user in self.get_paths():
+                if needs_user and not user:
+                    continue
+                with CaptureQueriesContext(connection) as captured:
+                    response = (member if needs_user else anonymous).get(path, secure=True)
+                    if response.streaming:
+                        # Streamed responses run their queries as they are read
+                        b''.join(response.streaming_content)
+                label = f'{path} (logged in)' if needs_user else path
+                scanning, sorting = self.report(label, captured.captured_queries, options['verbose_plans'])
+                scans += scanning
+                sorts += sorting
+
+        message = f'{scans} queries with full table scans, {sorts} sorting unbounded rows'
+        if scans and options['fail']:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message) if not scans else self.style.WARNING(message))
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'No user named {username}')
+        return User.objects.order_by('id').first()
+
+    def get_host(self):
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+        return hosts[0] if hosts else 'localhost'
+
+    def get_paths(self):
+        """Representative requests for every listing, account and API view: (path, needs_user)"""
+        product = Product.objects.exclude(brand=None).order_by('id').first()
+        category = Category.objects.order_by('id').first()
+        subcategory = Subcategory.objects.order_by('id').first()
+
+        listings = [
+            {}, {'sort': 'price_asc'}, {'sort': 'price_desc'}, {'sort': 'rating'}, {'sort': 'popular'},
+            {'min_price': 25, 'max_price': 50}, {'min_rating': 4}, {'q': 'shirt'},
+        ]
+        if product:
+            listings += [{'brand': product.brand_id}, {'color': product.color_id}, {'size': product.size_id}]
+        if category:
+            listings.append({'category': category.id})
+
+        home = reverse('home')
+        paths = [(f'{home}?{urlencode(params)}' if params else home, False) for params in listings]
+        if product:
+            paths += [(product.get_absolute_url(), False), (product.get_absolute_url(), True)]
+        if category:
+            paths.append((reverse('category', args=[category.slug]), False))
+        if subcategory:
+            paths.append((reverse('subcategory', args=[subcategory.slug]), False))
+        paths += [(reverse(name), True) for name in ('dashboard', 'cart', 'checkout')]
+
+        api = reverse('api_products')
+        paths += [(f'{api}?{urlencode(params)}' if params else api, False) for params in listings]
+        if product:
+            paths += [
+                (reverse('api_product', args=[product.slug]), False),
+                (reverse('api_product_reviews', args=[product.slug]), False),
+            ]
+        paths += [(reverse(name), False) for name in ('api_categories', 'api_facets', 'api_product_export')]
+        return paths
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
+
+    def problems(self, sql, plan):
+        """
+        (full scans, sorts) found in a plan. Full scans of the small lookup
+        tables are expected, as is walking an index in ORDER BY order until
+        a LIMIT is reached (a keyset page). A sort is only reported when its
+        input is not bounded by an equality lookup, i.e. it could grow with
+        the catalogue.
+        """
+        pattern = SQLITE_FULL_SCAN if connection.vendor == 'sqlite' else POSTGRES_FULL_SCAN
+        aliases = {alias: table for table, alias in SQL_ALIAS.findall(sql)}
+        details = [line.strip().lstrip('->').strip() for line in plan]
+        stops_at_limit = SQL_LIMIT.search(sql) and not any(
+            detail.startswith('USE TEMP B-TREE FOR ORDER BY') for detail in details
+        )
+        scans = []
+        unbounded = False
+        sorted_rows = False
+        for detail in details:
+            match = pattern.search(detail)
+            if match:
+                table, using = aliases.get(match.group(1), match.group(1)), match.group(2).strip()
+                if table in SMALL_TABLES or (stops_at_limit and using.startswith('USING INDEX')):
+                    continue
+                scans.append(f'full scan of {table}' + (f' {using}' if using else ''))
+                unbounded = True
+            elif detail.startswith(('SEARCH', 'Index Scan', 'Index Only Scan', 'Bitmap')) and re.search(r'[<>]', detail):
+                unbounded = True
+            if detail.startswith('USE TEMP B-TREE FOR ORDER BY') or detail.startswith('Sort '):
+                sorted_rows = True
+        sorts = ['sort of an unbounded row set'] if sorted_rows and unbounded else []
+        return scans, sorts
+
+    def report(self, label, queries, verbose):
+        """Print the flagged queries of one request; returns (scans, sorts) counts"""
+        selects = [query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')]
+        scanning = sorting = 0
+        lines = []
+        for sql in selects:
+            plan = self.explain(sql)
+            scans, sorts = self.problems(sql, plan)
+            scanning += bool(scans)
+            sorting += bool(sorts)
+            if scans or sorts or verbose:
+                lines.append(f'  {sql[:200]}')
+                lines.extend(f'    | {line}' for line in plan)
+                lines.extend(f'    ! {problem}' for problem in scans + sorts)
+
+        if scanning:
+            status = self.style.ERROR(f'{scanning} full scans')
+        elif sorting:
+            status = self.style.WARNING(f'{sorting} sorts')
+        else:
+            status = self.style.SUCCESS('index-served')
+        self.stdout.write(f'{label}: {len(selects)} selects, {status}')
+        for line in lines:
+            self.stdout.write(line)
+        return scanning, sorting
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from store.counters import EVENTS, CacheCounterBuffer, counters, recompute_popularity
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered product counters to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='With the cache buffer, collect the counters of every product, including ones left by dead workers',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products read from the cache at a time')
+        parser.add_argument(
+            '--recompute-popularity', action='store_true',
+            help='Rebuild every popularity score from the stored counters (after changing the weights)',
+        )
+
+    def handle(self, *args, **options):
+        flushed = counters.flush()
+        if options['all'] and isinstance(counters, CacheCounterBuffer):
+            products = Product.objects.order_by('pk').values_list('pk', 'slug')
+            batch = []
+            for pk, slug in products.iterator(chunk_size=options['batch_size']):
+                batch += [(event, slug if lookup == 'slug' else pk) for event, (_, lookup) in EVENTS.items()]
+                if len(batch) >= options['batch_size']:
+                    flushed += counters.flush(batch)
+                    batch = []
+            flushed += counters.flush(batch)
+        self.stdout.write(f'Flushed {flushed} product counters')
+
+        if options['recompute_popularity']:
+            updated = recompute_popularity()
+            self.stdout.write(f'Recomputed popularity of {updated} products')
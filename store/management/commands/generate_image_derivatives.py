@@ -0,0 +1,71 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store.catalogue_cache import invalidate_pages, invalidate_product_cards
+from store.images import generate_derivatives
+from store.models import Product, UserProfile
+
+# (model, image field) pairs whose derivatives are generated; each field's
+# manifest is stored in the "<field>_manifest" column next to it
+IMAGE_FIELDS = [(Product, 'image'), (UserProfile, 'profile_picture')]
+
+
+def process_image(name):
+    """Worker process entry point; returns (name, manifest or error message)"""
+    try:
+        return name, generate_derivatives(name), None
+    except Exception as e:
+        return name, None, f'{type(e).__name__}: {e}'
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnails and WebP/AVIF variants for existing product and profile images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+        parser.add_argument('--all', action='store_true', help='Regenerate images whose manifest is already stored')
+
+    def handle(self, *args, **options):
+        # Source file -> the rows showing it, for each model
+        rows = defaultdict(lambda: defaultdict(list))
+        for model, field in IMAGE_FIELDS:
+            images = model.objects.exclude(**{field: ''}).exclude(**{field: None}).values_list('pk', field, f'{field}_manifest')
+            for pk, name, manifest in images.iterator():
+                if options['all'] or not manifest or manifest.get('source') != name:
+                    rows[name][(model, field)].append(pk)
+        # Workers must not inherit open database connections
+        connections.close_all()
+
+        started = time.perf_counter()
+        done = failed = 0
+        updated_products = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            futures = [executor.submit(process_image, name) for name in sorted(rows)]
+            for future in as_completed(futures):
+                name, manifest, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                # Stored on the rows themselves, where every web process reads them
+                for (model, field), pks in rows[name].items():
+                    model.objects.filter(pk__in=pks).update(**{f'{field}_manifest': manifest})
+                    if model is Product:
+                        updated_products += pks
+                done += 1
+
+        # update() sends no signals; drop the cards and pages showing the old images
+        if updated_products:
+            invalidate_product_cards(updated_products)
+            invalidate_pages()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {done} images in {elapsed:.1f}s with {options["workers"]} workers, {failed} failed'
+        ))
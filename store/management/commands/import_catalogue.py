@@ -0,0 +1,377 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from urllib.error import URLError, HTTPError
+from urllib.parse import urlparse
+from urllib.request import urlopen, Request
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import DecimalValidator
+from django.db import IntegrityError, connection, transaction
+from PIL import Image, UnidentifiedImageError
+
+from store.attributes import ATTRIBUTE_MODELS, attribute_ids
+from store.catalogue_cache import invalidate_navigation, invalidate_pages, invalidate_product_cards
+from store.facets import invalidate_facets
+from store.images import generate_derivatives
+from store.models import Category, Subcategory, Product, ProductVariant
+from store.search import rebuild_index, search_enabled
+from store.slugs import MAX_ATTEMPTS as SLUG_ATTEMPTS, allocate_slugs
+
+# Columns written on insert and refreshed when a SKU is imported again
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'subcategory', 'brand', 'color', 'size', 'updated_at']
+VARIANT_UPDATE_FIELDS = ['product', 'size', 'color', 'price']
+
+IMAGE_HEADERS = {'User-Agent': 'Outfitr catalogue importer'}
+IMAGE_URL_SCHEMES = ('http', 'https')
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_price(value, field):
+    """A finite decimal that fits the model field's digits, or RowError"""
+    try:
+        price = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise RowError(f'invalid price {value!r}')
+    if not price.is_finite():
+        raise RowError(f'invalid price {value!r}')
+    try:
+        DecimalValidator(field.max_digits, field.decimal_places)(price)
+    except ValidationError:
+        raise RowError(
+            f'price {value!r} does not fit {field.max_digits} digits with {field.decimal_places} decimal places'
+        )
+    return price
+
+
+def read_rows(path, fmt):
+    """Stream rows from a CSV or JSON-lines file without loading it whole"""
+    with open(path, newline='', encoding='utf-8') as source:
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports products from a CSV or JSONL file, upserting by SKU. Rows with a parent_sku are '
+        'size/color variants of that product, which must come in an earlier or the same chunk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with one product per row')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows written per transaction')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent image downloads')
+        parser.add_argument('--image-root', help='Read images from this directory instead of downloading them')
+        parser.add_argument('--skip-images', action='store_true', help='Import product data only')
+        parser.add_argument('--refresh-images', action='store_true', help='Fetch images for products that already have one')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+
+        self.image_root = options['image_root']
+        self.refresh_images = options['refresh_images']
+        self.categories = {category.name: category for category in Category.objects.all()}
+        self.subcategories = {
+            (sub.category_id, sub.name): sub for sub in Subcategory.objects.all()
+        }
+        self.created_categories = False
+        self.touched_ids = []
+
+        started = time.perf_counter()
+        products = variants = failed = images = image_errors = 0
+        executor = None if options['skip_images'] else ThreadPoolExecutor(max_workers=options['workers'])
+        pending = set()
+
+        try:
+            for chunk in chunked(read_rows(path, fmt), options['chunk_size']):
+                chunk_products, chunk_variants, image_jobs, errors = self.import_chunk(chunk)
+                products += chunk_products
+                variants += chunk_variants
+                failed += errors
+
+                if executor:
+                    for job in image_jobs:
+                        # Bound in-flight downloads so memory stays flat on huge files
+                        while len(pending) >= options['workers'] * 4:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            saved, errored = self.store_images(done)
+                            images, image_errors = images + saved, image_errors + errored
+                        pending.add(executor.submit(self.fetch_image, *job))
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{products} products and {variants} variants imported '
+                    f'({(products + variants) / elapsed:.0f} rows/sec)'
+                )
+
+            if pending:
+                saved, errored = self.store_images(wait(pending).done)
+                images, image_errors = images + saved, image_errors + errored
+        finally:
+            if executor:
+                executor.shutdown()
+            # Chunks committed before a failure are live as well, so resync
+            # the search index and caches for them either way
+            if products or variants:
+                self.refresh_derived_data()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {products} products and {variants} variants in {elapsed:.1f}s '
+            f'({(products + variants) / max(elapsed, 1e-9):.0f} rows/sec), '
+            f'{failed} invalid rows, {images} images stored, {image_errors} image errors'
+        ))
+
+    def parse_row(self, row):
+        sku = (row.get('sku') or '').strip()
+        name = (row.get('name') or '').strip()
+        if not sku or not name:
+            raise RowError('sku and name are required')
+        price = parse_price(row.get('price'), Product._meta.get_field('price'))
+
+        category_name = (row.get('category') or '').strip()
+        if not category_name:
+            raise RowError('category is required')
+        category = self.get_category(category_name)
+        subcategory_name = (row.get('subcategory') or '').strip()
+        subcategory = self.get_subcategory(category, subcategory_name) if subcategory_name else None
+
+        product = Product(
+            sku=sku,
+            name=name,
+            description=row.get('description') or '',
+            price=price,
+            category=category,
+            subcategory=subcategory,
+        )
+        # Attribute names are resolved to lookup ids per chunk (import_chunk)
+        product.attribute_names = {field: row.get(field) for field in ATTRIBUTE_MODELS}
+        return product, (row.get('image') or '').strip()
+
+    def parse_variant(self, row):
+        sku = (row.get('sku') or '').strip()
+        if not sku:
+            raise RowError('sku is required')
+        price = row.get('price')
+        # An empty price sells the variant at its product's price
+        if price not in (None, ''):
+            price = parse_price(price, ProductVariant._meta.get_field('price'))
+        else:
+            price = None
+
+        variant = ProductVariant(sku=sku, price=price)
+        variant.parent_sku = row['parent_sku'].strip()
+        variant.attribute_names = {field: row.get(field) for field in ('size', 'color')}
+        return variant
+
+    def resolve_attributes(self, objects, fields):
+        """Set the brand/color/size ids of parsed rows, one lookup per field"""
+        for field in fields:
+            ids = attribute_ids(field, [obj.attribute_names[field] for obj in objects])
+            for obj in objects:
+                setattr(obj, f'{field}_id', ids.get(obj.attribute_names[field]))
+
+    def get_category(self, name):
+        if name not in self.categories:
+            self.categories[name], created = Category.objects.get_or_create(name=name)
+            self.created_categories |= created
+        return self.categories[name]
+
+    def get_subcategory(self, category, name):
+        key = (category.id, name)
+        if key not in self.subcategories:
+            self.subcategories[key], created = Subcategory.objects.get_or_create(category=category, name=name)
+            self.created_categories |= created
+        return self.subcategories[key]
+
+    def import_chunk(self, rows):
+        """
+        Upsert one chunk of rows in a single transaction; returns the number
+        of products and variants written, the image jobs to run and the
+        number of rows skipped
+        """
+        parsed = {}
+        variants = {}
+        errors = 0
+        for number, row in enumerate(rows):
+            try:
+                if (row.get('parent_sku') or '').strip():
+                    variant = self.parse_variant(row)
+                    variants[variant.sku] = variant
+                    continue
+                product, image = self.parse_row(row)
+            except RowError as e:
+                errors += 1
+                self.stderr.write(f'Skipping row {row.get("sku") or number}: {e}')
+                continue
+            # Later rows for the same SKU win
+            parsed[product.sku] = (product, image)
+
+        if not parsed and not variants:
+            return 0, 0, [], errors
+
+        self.resolve_attributes([product for product, _ in parsed.values()], ATTRIBUTE_MODELS)
+        self.resolve_attributes(list(variants.values()), ('size', 'color'))
+
+        for attempt in range(1, SLUG_ATTEMPTS + 1):
+            try:
+                existing, ids, skipped = self.write_chunk(parsed, variants)
+                break
+            except IntegrityError:
+                # A concurrent import claimed one of the slugs allocated for
+                # this chunk; it was rolled back, so allocate afresh and retry
+                slugs = [product.slug for product, _ in parsed.values() if product.slug]
+                if attempt == SLUG_ATTEMPTS or not Product.objects.filter(slug__in=slugs).exclude(sku__in=parsed).exists():
+                    raise
+        errors += skipped
+
+        self.touched_ids.extend(ids[sku] for sku in existing)
+
+        image_jobs = [
+            (ids[sku], product.slug, image)
+            for sku, (product, image) in parsed.items()
+            if image and (self.refresh_images or not existing.get(sku, (None, False))[1])
+        ]
+        return len(parsed), len(variants), image_jobs, errors
+
+    def write_chunk(self, parsed, variants):
+        """
+        Write a parsed chunk in one transaction; returns the existing products
+        ({sku: (slug, has_image)}), the ids of every product by SKU and the
+        number of variant rows skipped
+        """
+        with transaction.atomic():
+            existing = {
+                sku: (slug, bool(image))
+                for sku, slug, image in Product.objects.filter(sku__in=parsed).values_list('sku', 'slug', 'image')
+            }
+            new = [product for sku, (product, image) in parsed.items() if sku not in existing]
+            for product, slug in zip(new, allocate_slugs(Product, [product.name for product in new])):
+                product.slug = slug
+            for sku, (slug, has_image) in existing.items():
+                parsed[sku][0].slug = slug
+
+            # One INSERT ... ON CONFLICT (sku) DO UPDATE for the whole chunk
+            Product.objects.bulk_create(
+                [product for product, image in parsed.values()],
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=UPDATE_FIELDS,
+            )
+            ids = dict(Product.objects.filter(sku__in=parsed).values_list('sku', 'id'))
+            skipped = self.import_variants(variants)
+        return existing, ids, skipped
+
+    def import_variants(self, variants):
+        """
+        Upsert variant rows by SKU under their parent products; returns the
+        number skipped. A product sells each size and color once, so a row
+        whose option already belongs to another SKU (stored, or earlier in
+        the chunk) is skipped rather than merged into it.
+        """
+        if not variants:
+            return 0
+        parents = dict(
+            Product.objects.filter(sku__in={variant.parent_sku for variant in variants.values()}).values_list('sku', 'id')
+        )
+        owners = {
+            (product_id, size_id, color_id): sku
+            for product_id, size_id, color_id, sku in ProductVariant.objects.filter(
+                product_id__in=set(parents.values()),
+            ).values_list('product_id', 'size_id', 'color_id', 'sku')
+        }
+        errors = 0
+        for sku in list(variants):
+            variant = variants[sku]
+            variant.product_id = parents.get(variant.parent_sku)
+            error = None
+            if variant.product_id is None:
+                error = f'unknown parent_sku {variant.parent_sku!r}'
+            else:
+                owner = owners.setdefault((variant.product_id, variant.size_id, variant.color_id), sku)
+                if owner != sku:
+                    error = f'{variant.parent_sku} already has this size and color as {owner or "a variant without a SKU"}'
+            if error:
+                errors += 1
+                del variants[sku]
+                self.stderr.write(f'Skipping row {sku}: {error}')
+        ProductVariant.objects.bulk_create(
+            list(variants.values()),
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=VARIANT_UPDATE_FIELDS,
+        )
+        return errors
+
+    def fetch_image(self, product_id, slug, source):
+        """
+        Runs in the worker pool: read the image bytes, write them to storage
+        and generate their responsive derivatives (None if that fails)
+        """
+        if self.image_root:
+            with open(os.path.join(self.image_root, source), 'rb') as image:
+                data = image.read()
+            extension = os.path.splitext(source)[1]
+        else:
+            if urlparse(source).scheme not in IMAGE_URL_SCHEMES:
+                raise ValueError(f'not an http(s) URL: {source!r}')
+            with urlopen(Request(source, headers=IMAGE_HEADERS), timeout=10) as response:
+                data = response.read()
+            extension = os.path.splitext(urlparse(source).path)[1]
+        name = default_storage.save(f'products/{slug}{extension.lower() or ".jpg"}', ContentFile(data))
+        try:
+            manifest = generate_derivatives(name)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+            self.stderr.write(f'No derivatives for {name}: {e}')
+            manifest = None
+        return product_id, name, manifest
+
+    def store_images(self, futures):
+        """Record finished downloads on their products"""
+        stored = []
+        errors = 0
+        for future in futures:
+            try:
+                stored.append(future.result())
+            except (URLError, HTTPError, TimeoutError, OSError, ValueError) as e:
+                errors += 1
+                self.stderr.write(f'Image failed: {e}')
+        with transaction.atomic():
+            for product_id, name, manifest in stored:
+                Product.objects.filter(pk=product_id).update(image=name, image_manifest=manifest)
+        return len(stored), errors
+
+    def refresh_derived_data(self):
+        """bulk_create and update() skip model signals, so resync once at the end"""
+        if search_enabled():
+            with transaction.atomic(), connection.cursor() as cursor:
+                rebuild_index(cursor)
+        invalidate_facets()
+        invalidate_pages()
+        invalidate_product_cards(self.touched_ids)
+        if self.created_categories:
+            invalidate_navigation()
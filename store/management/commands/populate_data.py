@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from store.models import Category, Subcategory, Product, UserProfile
+from store.attributes import attribute_ids
 import decimal
 from django.contrib.auth.models import User
 from django.core.files import File
@@ -149,6 +150,11 @@ class Command(BaseCommand):
             }
         ]
         
+        # Brand, color and size lookup rows for every product
+        brands = attribute_ids('brand', [product_data["brand"] for product_data in products_data])
+        colors = attribute_ids('color', [product_data["color"] for product_data in products_data])
+        sizes = attribute_ids('size', [product_data.get("size") for product_data in products_data])
+
         # Create products
         for product_data in products_data:
             # Create product without image first
@@ -157,9 +163,9 @@ class Command(BaseCommand):
                 price=decimal.Decimal(str(product_data["price"])),
                 category=product_data["category"],
                 subcategory=product_data.get("subcategory", None),
-                brand=product_data["brand"],
-                color=product_data["color"],
-                size=product_data.get("size", None),
+                brand_id=brands.get(product_data["brand"]),
+                color_id=colors.get(product_data["color"]),
+                size_id=sizes.get(product_data.get("size")),
                 description=product_data["description"]
             )
             
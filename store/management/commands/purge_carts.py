@@ -0,0 +1,84 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from store.cart import CART_COUNT_CACHE_KEY
+from store.models import Cart, CartItem
+
+# Session engines that keep rows in django_session
+DATABASE_SESSION_ENGINES = {
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+}
+
+
+class Command(BaseCommand):
+    help = 'Deletes abandoned carts without a user with their lines, and expired sessions, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'STORE_CART_RETENTION_DAYS', 30),
+            help='Delete carts without a user untouched for this many days',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be positive')
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+
+        carts, lines = self.purge_carts(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(f'Deleted {carts} abandoned carts with {lines} lines')
+
+        if settings.SESSION_ENGINE in DATABASE_SESSION_ENGINES:
+            sessions = self.purge_sessions(timezone.now())
+            self.stdout.write(f'Deleted {sessions} expired sessions')
+        else:
+            self.stdout.write(f'Sessions are not stored in the database ({settings.SESSION_ENGINE})')
+
+    def batches(self, queryset):
+        """
+        Yield lists of at most batch_size primary keys from queryset until it
+        is empty. Each batch is deleted in its own short transaction, so no
+        lock is held across the whole purge.
+        """
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            yield ids
+            if self.pause:
+                time.sleep(self.pause)
+
+    def purge_carts(self, cutoff):
+        # Carts are login-only now; these were made for anonymous visitors
+        # (bots hitting /cart/count/ included) before that
+        # Served by the cart_user_updated index
+        abandoned = Cart.objects.filter(user=None, updated_at__lt=cutoff).order_by('updated_at')
+        carts = lines = 0
+        for ids in self.batches(abandoned):
+            with transaction.atomic():
+                # Re-checks the cutoff, skipping carts used since the batch was
+                # read; the cascade deletes their lines in the same transaction
+                _, per_model = abandoned.filter(pk__in=ids).delete()
+            carts += per_model.get(Cart._meta.label, 0)
+            lines += per_model.get(CartItem._meta.label, 0)
+            cache.delete_many([CART_COUNT_CACHE_KEY.format(cart_id) for cart_id in ids])
+        return carts, lines
+
+    def purge_sessions(self, now):
+        # Like `manage.py clearsessions`, without one DELETE over the whole table
+        expired = Session.objects.filter(expire_date__lt=now)
+        sessions = 0
+        for keys in self.batches(expired):
+            with transaction.atomic():
+                sessions += Session.objects.filter(pk__in=keys, expire_date__lt=now).delete()[0]
+        return sessions
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from store.search import rebuild_index, search_enabled
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text product search index from the Product table'
+
+    def handle(self, *args, **kwargs):
+        if not search_enabled():
+            raise CommandError('The search index is only available on SQLite databases')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            count = rebuild_index(cursor)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from store.catalogue_cache import invalidate_pages, invalidate_product_cards
+from store.models import Product
+from store.ratings import drifted_products
+
+class Command(BaseCommand):
+    help = 'Recomputes stored product rating aggregates that drifted from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drifted products')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products updated per transaction')
+
+    def handle(self, *args, **options):
+        drifted = drifted_products().values_list('id', 'actual_count', 'actual_sum')
+        batch_size = options['batch_size']
+        fixed = 0
+
+        batch = []
+        for row in drifted.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                fixed += self.fix(batch, options['dry_run'])
+                batch = []
+        if batch:
+            fixed += self.fix(batch, options['dry_run'])
+
+        verb = 'Found' if options['dry_run'] else 'Reconciled'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} products with drifted ratings'))
+
+    def fix(self, rows, dry_run):
+        for product_id, count, total in rows:
+            self.stdout.write(f'Product {product_id}: {count} reviews, rating sum {total}')
+        if dry_run:
+            return len(rows)
+
+        with transaction.atomic():
+            for product_id, count, total in rows:
+                Product.objects.filter(pk=product_id).update(
+                    rating_count=count,
+                    rating_sum=total,
+                    rating_avg=total / count if count else 0,
+                    updated_at=timezone.now(),
+                )
+        # update() skips the signals that drop cached cards and pages
+        invalidate_product_cards([product_id for product_id, _, _ in rows])
+        invalidate_pages()
+        return len(rows)
@@ -0,0 +1,65 @@
+import json
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+METRICS = ('queries', 'db_ms', 'template_ms', 'total_ms', 'bytes')
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = 'Summarises recorded request metrics (p50/p95/p99 per URL name)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Metrics log to read (defaults to STORE_METRICS_LOG)')
+        parser.add_argument('--view', action='append', help='Only report these URL names')
+        parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    def handle(self, *args, **options):
+        path = options['file'] or getattr(settings, 'STORE_METRICS_LOG', None)
+        if not path:
+            raise CommandError('No metrics log configured; set STORE_METRICS_LOG or pass --file')
+
+        samples = defaultdict(lambda: defaultdict(list))
+        try:
+            with open(path) as log:
+                for line in log:
+                    sample = json.loads(line)
+                    if options['view'] and sample['view'] not in options['view']:
+                        continue
+                    for metric in METRICS:
+                        if sample.get(metric) is not None:
+                            samples[sample['view']][metric].append(sample[metric])
+        except FileNotFoundError:
+            raise CommandError(f'Metrics log {path} does not exist')
+
+        summary = {}
+        for view, metrics in sorted(samples.items()):
+            summary[view] = {'requests': len(metrics['queries'])}
+            for metric, values in metrics.items():
+                values.sort()
+                summary[view][metric] = {
+                    'p50': percentile(values, 0.50),
+                    'p95': percentile(values, 0.95),
+                    'p99': percentile(values, 0.99),
+                    'max': values[-1],
+                }
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        for view, metrics in summary.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{view} ({metrics['requests']} requests)"))
+            for metric in METRICS:
+                if metric in metrics:
+                    stats = metrics[metric]
+                    self.stdout.write(
+                        f"  {metric:<12} p50={stats['p50']:<10} p95={stats['p95']:<10} "
+                        f"p99={stats['p99']:<10} max={stats['max']}"
+                    )
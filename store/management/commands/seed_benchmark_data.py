@@ -0,0 +1,192 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.attributes import attribute_ids
+from store.catalogue_cache import invalidate_navigation, invalidate_pages
+from store.facets import invalidate_facets
+from store.models import Category, Subcategory, Product, ProductVariant, Review, Cart, CartItem, UserProfile, RecentlyViewed
+from store.search import rebuild_index, search_enabled
+from store.slugs import allocate_slugs
+
+# Everything seeded is named with these prefixes so --clear can find it again
+CATEGORY_PREFIX = 'Bench '
+USERNAME_PREFIX = 'bench-'
+PASSWORD = 'bench'
+
+BRANDS = ['Adidas', 'Puma', 'Nike', "Levi's", 'Zara', 'Uniqlo', 'Gap', 'Reebok', 'Vans', 'Converse']
+COLORS = ['Black', 'White', 'Blue', 'Red', 'Green', 'Grey', 'Brown', 'Beige']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', '30', '32', '34', '40', '42']
+NOUNS = ['T-Shirt', 'Shirt', 'Jeans', 'Chinos', 'Jacket', 'Hoodie', 'Sneakers', 'Boots', 'Belt', 'Cap']
+COMMENTS = ['', 'Great fit.', 'Runs small.', 'Good value for the price.', 'Colour faded after a few washes.']
+
+
+class Command(BaseCommand):
+    help = 'Seeds a reproducible synthetic catalogue, users, carts and history for benchmark_routes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help='Products to create')
+        parser.add_argument('--categories', type=int, default=8, help='Categories to create')
+        parser.add_argument('--subcategories', type=int, default=4, help='Subcategories per category')
+        parser.add_argument('--variants', type=int, default=0, help='Size/color variants per product')
+        parser.add_argument('--users', type=int, default=50, help='Users to create (password "bench")')
+        parser.add_argument('--reviews', type=int, default=5, help='Reviews per user')
+        parser.add_argument('--cart-items', type=int, default=3, help='Cart lines per user')
+        parser.add_argument('--viewed', type=int, default=20, help='Recently viewed products per user')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded benchmark data first')
+
+    def handle(self, *args, **options):
+        per_user = max(options['reviews'], options['cart_items'], options['viewed'])
+        if options['products'] < per_user:
+            raise CommandError(f'--products must be at least {per_user} to give every user distinct products')
+        existing = Category.objects.filter(name__startswith=CATEGORY_PREFIX).exists()
+        if existing and not options['clear']:
+            raise CommandError('Benchmark data already exists; pass --clear to replace it')
+
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            subcategories = self.create_categories(options['categories'], options['subcategories'])
+            products = self.create_products(options['products'], subcategories)
+            variants = self.create_variants(products, options['variants'])
+            users = self.create_users(options['users'])
+            reviews = self.create_reviews(users, products, options['reviews'])
+            self.create_carts(users, products, options['cart_items'])
+            self.create_history(users, products, options['viewed'])
+
+        # bulk_create skips the model signals that maintain these
+        if search_enabled():
+            with transaction.atomic(), connection.cursor() as cursor:
+                rebuild_index(cursor)
+        invalidate_facets()
+        invalidate_navigation()
+        invalidate_pages()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(subcategories)} subcategories, {len(products)} products, {variants} variants, '
+            f'{len(users)} users and {reviews} reviews (seed {options["seed"]})'
+        ))
+
+    def clear(self):
+        # Products, reviews, cart lines and history cascade from these
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Category.objects.filter(name__startswith=CATEGORY_PREFIX).delete()
+
+    def create_categories(self, count, per_category):
+        names = [f'{CATEGORY_PREFIX}Category {i + 1}' for i in range(count)]
+        categories = [
+            Category(name=name, slug=slug)
+            for name, slug in zip(names, allocate_slugs(Category, names))
+        ]
+        Category.objects.bulk_create(categories)
+
+        subcategories = [
+            Subcategory(name=f'Subcategory {i + 1}', category=category)
+            for category in categories for i in range(per_category)
+        ]
+        slugs = allocate_slugs(Subcategory, [f'{sub.category.name} {sub.name}' for sub in subcategories])
+        for subcategory, slug in zip(subcategories, slugs):
+            subcategory.slug = slug
+        return Subcategory.objects.bulk_create(subcategories)
+
+    def create_products(self, count, subcategories):
+        rng = self.random
+        brands, colors, sizes = (attribute_ids(field, names) for field, names in (
+            ('brand', BRANDS), ('color', COLORS), ('size', SIZES),
+        ))
+        products = []
+        for i in range(count):
+            subcategory = rng.choice(subcategories)
+            brand, color = rng.choice(BRANDS), rng.choice(COLORS)
+            products.append(Product(
+                name=f'{brand} {color} {rng.choice(NOUNS)} {i + 1}',
+                sku=f'BENCH-{i + 1:07d}',
+                description=f'Synthetic benchmark product {i + 1}.',
+                price=Decimal(rng.randrange(500, 20000)) / 100,
+                category_id=subcategory.category_id,
+                subcategory=subcategory,
+                brand_id=brands[brand],
+                color_id=colors[color],
+                size_id=sizes[rng.choice(SIZES)],
+            ))
+        for product, slug in zip(products, allocate_slugs(Product, [product.name for product in products])):
+            product.slug = slug
+        return Product.objects.bulk_create(products, batch_size=500)
+
+    def create_variants(self, products, per_product):
+        if not per_product:
+            return 0
+        sizes, colors = attribute_ids('size', SIZES), attribute_ids('color', COLORS)
+        combinations = [(size, color) for size in SIZES for color in COLORS]
+        variants = [
+            ProductVariant(
+                product=product,
+                sku=f'{product.sku}-{i + 1}',
+                size_id=sizes[size],
+                color_id=colors[color],
+                # Mostly the product price; some untracked, some sold out
+                price=self.random.choice([None, None, None, product.price + 5]),
+                stock=self.random.choice([None, 0, self.random.randint(1, 50)]),
+            )
+            for product in products
+            for i, (size, color) in enumerate(self.random.sample(combinations, min(per_product, len(combinations))))
+        ]
+        ProductVariant.objects.bulk_create(variants, batch_size=500)
+        return len(variants)
+
+    def create_users(self, count):
+        # One hash for every user; hashing per user would dominate the run
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{i + 1}', password=password) for i in range(count)
+        ])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+        return users
+
+    def create_reviews(self, users, products, per_user):
+        reviews = []
+        for user in users:
+            for product in self.random.sample(products, per_user):
+                reviews.append(Review(
+                    product=product, user=user,
+                    rating=self.random.randint(1, 5), comment=self.random.choice(COMMENTS),
+                ))
+                product.rating_count += 1
+                product.rating_sum += reviews[-1].rating
+        Review.objects.bulk_create(reviews, batch_size=500)
+
+        # Denormalised aggregates, normally kept by the Review signals
+        rated = [product for product in products if product.rating_count]
+        for product in rated:
+            product.rating_avg = product.rating_sum / product.rating_count
+        Product.objects.bulk_update(rated, ['rating_count', 'rating_sum', 'rating_avg'], batch_size=500)
+        return len(reviews)
+
+    def create_carts(self, users, products, per_user):
+        if not per_user:
+            return
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=self.random.randint(1, 3))
+            for cart in carts for product in self.random.sample(products, per_user)
+        ], batch_size=500)
+
+    def create_history(self, users, products, per_user):
+        now = timezone.now()
+        views = [
+            RecentlyViewed(user=user, product=product)
+            for user in users for product in self.random.sample(products, per_user)
+        ]
+        views = RecentlyViewed.objects.bulk_create(views, batch_size=500)
+        # auto_now_add stamps every row alike; spread them out so "recent" has an order
+        for i, view in enumerate(views):
+            view.viewed_at = now - timedelta(minutes=i)
+        RecentlyViewed.objects.bulk_update(views, ['viewed_at'], batch_size=500)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_views(apps, schema_editor):
+    # Keep the newest row of each (user, product) pair so the constraint applies
+    RecentlyViewed = apps.get_model('store', 'RecentlyViewed')
+    latest = RecentlyViewed.objects.values('user_id', 'product_id').annotate(latest=Max('id')).values('latest')
+    RecentlyViewed.objects.exclude(pk__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_product_sku'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_views, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='recentlyviewed',
+            unique_together={('user', 'product')},
+        ),
+        migrations.AddIndex(
+            model_name='recentlyviewed',
+            index=models.Index(fields=['user', '-viewed_at'], name='recently_viewed_user_recent'),
+        ),
+    ]
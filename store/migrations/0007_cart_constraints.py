@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    # Fold every user's extra carts into their oldest one, then sum duplicate
+    # lines, so the unique constraints below can be added
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+
+    duplicated_users = (
+        Cart.objects.filter(user__isnull=False)
+        .values('user_id').annotate(carts=Count('id')).filter(carts__gt=1)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in list(duplicated_users):
+        carts = list(Cart.objects.filter(user_id=user_id).order_by('created_at').values_list('id', flat=True))
+        CartItem.objects.filter(cart_id__in=carts[1:]).update(cart_id=carts[0])
+        Cart.objects.filter(id__in=carts[1:]).delete()
+
+    duplicated_lines = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for line in list(duplicated_lines):
+        CartItem.objects.filter(pk=line['keep']).update(quantity=line['quantity'])
+        CartItem.objects.filter(cart_id=line['cart_id'], product_id=line['product_id']).exclude(pk=line['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_recently_viewed_bounded'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together={('cart', 'product')},
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_per_user'),
+        ),
+    ]
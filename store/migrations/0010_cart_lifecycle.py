@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_from_creation(apps, schema_editor):
+    # Creation time is the only activity recorded for existing carts; without
+    # this every old cart would look freshly used to purge_carts
+    Cart = apps.get_model('store', 'Cart')
+    Cart.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_catalogue_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(start_from_creation, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user', 'updated_at'], name='cart_user_updated'),
+        ),
+    ]
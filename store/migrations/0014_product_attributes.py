@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:41
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+ATTRIBUTES = (('brand', 'Brand'), ('color', 'Color'), ('size', 'Size'))
+
+
+def deduplicate_attributes(apps, schema_editor):
+    # Spellings that differ only in case or whitespace ("Nike", "nike ") become
+    # one row, named after the spelling most products use
+    Product = apps.get_model('store', 'Product')
+    for field, model_name in ATTRIBUTES:
+        Attribute = apps.get_model('store', model_name)
+        rows = list(
+            Product.objects.exclude(**{f'{field}_name': None})
+            .values_list(f'{field}_name').annotate(models.Count('id')).order_by()
+        )
+        spellings = defaultdict(Counter)
+        for value, count in rows:
+            name = ' '.join(value.split())
+            if name:
+                spellings[name.casefold()][name] += count
+
+        for group in spellings.values():
+            name = min(group, key=lambda spelling: (-group[spelling], spelling))
+            attribute = Attribute.objects.create(name=name)
+            raw = [value for value, _ in rows if ' '.join(value.split()) in group]
+            Product.objects.filter(**{f'{field}_name__in': raw}).update(**{field: attribute})
+
+
+def restore_attribute_names(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    for field, model_name in ATTRIBUTES:
+        Attribute = apps.get_model('store', model_name)
+        for attribute in Attribute.objects.all():
+            Product.objects.filter(**{field: attribute}).update(**{f'{field}_name': attribute.name})
+
+
+def lookup_table(name):
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ('name', models.CharField(max_length=100)),
+        ],
+        options={
+            'abstract': False,
+            'constraints': [
+                models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name=f'store_{name.lower()}_name_ci'),
+            ],
+        },
+    )
+
+
+def lookup_key(field, model_name):
+    return migrations.AddField(
+        model_name='product',
+        name=field,
+        field=models.ForeignKey(
+            blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL,
+            related_name='products', to=f'store.{model_name.lower()}',
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_product_popularity'),
+    ]
+
+    operations = [
+        lookup_table('Brand'),
+        lookup_table('Color'),
+        lookup_table('Size'),
+        migrations.RemoveIndex(model_name='product', name='product_brand_newest'),
+        migrations.RemoveIndex(model_name='product', name='product_color_newest'),
+        migrations.RemoveIndex(model_name='product', name='product_size_newest'),
+        migrations.RemoveIndex(model_name='product', name='product_facets'),
+        migrations.RenameField(model_name='product', old_name='brand', new_name='brand_name'),
+        migrations.RenameField(model_name='product', old_name='color', new_name='color_name'),
+        migrations.RenameField(model_name='product', old_name='size', new_name='size_name'),
+        lookup_key('brand', 'Brand'),
+        lookup_key('color', 'Color'),
+        lookup_key('size', 'Size'),
+        migrations.RunPython(deduplicate_attributes, restore_attribute_names),
+        migrations.RemoveField(model_name='product', name='brand_name'),
+        migrations.RemoveField(model_name='product', name='color_name'),
+        migrations.RemoveField(model_name='product', name='size_name'),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', '-created_at'], name='product_brand_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['color', '-created_at'], name='product_color_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['size', '-created_at'], name='product_size_newest'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'brand', 'color', 'size', 'price', 'rating_avg'], name='product_facets'),
+        ),
+    ]
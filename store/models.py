@@ -1,12 +1,14 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce, Lower
 from django.urls import reverse
 import uuid
-from django.utils.text import slugify
-import random
+from .search import SearchDocumentField
+from .slugs import UniqueSlugMixin
 
 # Category model for product categorization
-class Category(models.Model):
+class Category(UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=100)  # Category name
     slug = models.SlugField(max_length=100, unique=True, blank=True)  # Unique slug for URLs
 
@@ -15,20 +17,9 @@ class Category(models.Model):
 
     def __str__(self):
         return self.name
-    
-    def save(self, *args, **kwargs):
-        # Auto-generate unique slug if not set
-        if not self.slug:
-            base_slug = slugify(self.name)
-            unique_slug = base_slug
-            counter = 1
-            while Category.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{random.randint(1000,9999)}"
-            self.slug = unique_slug
-        super().save(*args, **kwargs)
 
 # Subcategory model linked to Category
-class Subcategory(models.Model):
+class Subcategory(UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=100)  # Subcategory name
     slug = models.SlugField(max_length=100, unique=True, blank=True)  # Unique slug for URLs
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='subcategories')  # Parent category
@@ -38,55 +29,128 @@ class Subcategory(models.Model):
 
     def __str__(self):
         return f"{self.category.name} - {self.name}"
-    
-    def save(self, *args, **kwargs):
-        # Auto-generate unique slug if not set
-        if not self.slug:
-            base_slug = slugify(self.name)
-            unique_slug = base_slug
-            counter = 1
-            while Subcategory.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{random.randint(1000,9999)}"
-            self.slug = unique_slug
-        super().save(*args, **kwargs)
+
+# Base for the small lookup tables a product's brand, color and size point at
+class ProductAttribute(models.Model):
+    name = models.CharField(max_length=100)  # Display name, unique ignoring case
+
+    class Meta:
+        abstract = True
+        constraints = [
+            # "Nike" and "nike" are one value (store.attributes also folds whitespace)
+            models.UniqueConstraint(Lower('name'), name='%(app_label)s_%(class)s_name_ci'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class Brand(ProductAttribute):
+    pass
+
+class Color(ProductAttribute):
+    pass
+
+class Size(ProductAttribute):
+    pass
 
 # Product model representing store items
-class Product(models.Model):
+class Product(UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=255)  # Product name
     slug = models.SlugField(max_length=255, unique=True, blank=True)  # Unique slug for URLs
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)  # Stock keeping unit (import key)
     description = models.TextField(blank=True)  # Product description
     price = models.DecimalField(max_digits=10, decimal_places=2)  # Product price
     image = models.ImageField(upload_to='products/', blank=True, null=True)  # Product image
+    image_manifest = models.JSONField(blank=True, null=True, editable=False)  # Responsive derivatives of image (store.images)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')  # Main category
     subcategory = models.ForeignKey(Subcategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='products')  # Optional subcategory
-    brand = models.CharField(max_length=100, blank=True, null=True)  # Brand name
-    color = models.CharField(max_length=50, blank=True, null=True)  # Product color
-    size = models.CharField(max_length=20, blank=True, null=True)  # Product size
+    # Lookup keys; each leads a composite index below, so they get no index of their own
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='products')  # Brand
+    color = models.ForeignKey(Color, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='products')  # Product color
+    size = models.ForeignKey(Size, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='products')  # Product size
     created_at = models.DateTimeField(auto_now_add=True, null=True)  # Creation timestamp
     updated_at = models.DateTimeField(auto_now=True, null=True)  # Last update timestamp
+    rating_count = models.PositiveIntegerField(default=0)  # Number of reviews (maintained by signals)
+    rating_sum = models.PositiveIntegerField(default=0)  # Sum of review ratings (maintained by signals)
+    rating_avg = models.FloatField(default=0)  # Average review rating (maintained by signals)
+    stock = models.PositiveIntegerField(blank=True, null=True)  # Units in stock (empty = not tracked)
+    view_count = models.PositiveIntegerField(default=0)  # Page views (written behind by store.counters)
+    cart_add_count = models.PositiveIntegerField(default=0)  # Times added to a cart (store.counters)
+    wishlist_add_count = models.PositiveIntegerField(default=0)  # Times wishlisted (store.counters)
+    popularity = models.PositiveIntegerField(default=0)  # Weighted sum of the counters above
+
+    class Meta:
+        indexes = [
+            # Listing sort orders (store.pagination.SORT_ORDERS), ending in id for keyset paging
+            models.Index(fields=['-created_at', '-id'], name='product_newest'),
+            models.Index(fields=['price', 'id'], name='product_price'),
+            models.Index(fields=['-rating_avg', '-id'], name='product_rating'),
+            models.Index(fields=['-popularity', '-id'], name='product_popular'),
+            # Category/subcategory pages and single-value filters in the default order
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_newest'),
+            models.Index(fields=['subcategory', '-created_at', '-id'], name='product_subcategory_newest'),
+            models.Index(fields=['brand', '-created_at'], name='product_brand_newest'),
+            models.Index(fields=['color', '-created_at'], name='product_color_newest'),
+            models.Index(fields=['size', '-created_at'], name='product_size_newest'),
+            # Covers the facet GROUP BY (store.facets) so it never reads table rows
+            models.Index(fields=['category', 'brand', 'color', 'size', 'price', 'rating_avg'], name='product_facets'),
+            # Last-Modified of the JSON API (store.api)
+            models.Index(fields=['updated_at'], name='product_updated'),
+        ]
 
     def __str__(self):
         return self.name
     
-    def save(self, *args, **kwargs):
-        # Auto-generate unique slug if not set
-        if not self.slug:
-            base_slug = slugify(self.name)
-            unique_slug = base_slug
-            counter = 1
-            while Product.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{random.randint(1000,9999)}"
-            self.slug = unique_slug
-        super().save(*args, **kwargs)
-    
     def get_absolute_url(self):
         # Returns the URL for the product detail page
         return reverse('product_detail', args=[self.slug])
     
     def average_rating(self):
-        # Calculates the average rating for the product
-        from django.db.models import Avg
-        return self.reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+        # Average rating for the product, kept up to date by the Review signals
+        return self.rating_avg
+
+# Read-only view of the SQLite FTS5 search index (created by migration 0003,
+# written by store.search), so searches can join it instead of sub-querying it
+class ProductSearchEntry(models.Model):
+    product = models.OneToOneField(
+        Product, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )  # The index row's rowid is the product id
+    document = SearchDocumentField(db_column='store_product_fts')  # Whole indexed row
+
+    class Meta:
+        managed = False
+        db_table = 'store_product_fts'
+
+# ProductVariant model: one purchasable size/color combination of a product,
+# which keeps the shared name, description, image and reviews
+class ProductVariant(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')  # Parent product
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)  # Stock keeping unit (import key)
+    size = models.ForeignKey(Size, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='variants')  # Variant size
+    color = models.ForeignKey(Color, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='variants')  # Variant color
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # Overrides the product price when set
+    stock = models.PositiveIntegerField(blank=True, null=True)  # Units in stock (empty = not tracked)
+
+    class Meta:
+        unique_together = ['product', 'size', 'color']  # Also serves product.variants
+        indexes = [
+            # Variant-level size/color listing filters (EXISTS per product, store.filters)
+            models.Index(fields=['size', 'product'], name='variant_size_product'),
+            models.Index(fields=['color', 'product'], name='variant_color_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} ({self.label})" if self.label else self.product.name
+
+    @property
+    def label(self):
+        # e.g. "M / Blue"; expects size and color to be select_related
+        return ' / '.join(str(value) for value in (self.size, self.color) if value is not None)
+
+    @property
+    def unit_price(self):
+        return self.product.price if self.price is None else self.price
 
 # Review model for product reviews
 class Review(models.Model):
@@ -98,27 +162,62 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ['product', 'user']  # One review per user per product
+        indexes = [
+            models.Index(fields=['product', '-created_at'], name='review_product_recent'),  # Product page
+            models.Index(fields=['user', '-created_at'], name='review_user_recent'),  # Dashboard
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so the aggregate signals can apply the difference
+        stored = dict(zip(field_names, values))
+        instance._stored_rating = stored.get('rating')
+        instance._stored_product_id = stored.get('product_id')
+        return instance
 
 # Cart model for shopping carts
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # Unique cart ID
     created_at = models.DateTimeField(auto_now_add=True)  # Creation timestamp
+    updated_at = models.DateTimeField(auto_now=True)  # Last change to the cart or its lines
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)  # Associated user (optional)
 
+    class Meta:
+        constraints = [
+            # At most one cart per user; anonymous carts have no user
+            models.UniqueConstraint(fields=['user'], name='unique_cart_per_user'),
+        ]
+        indexes = [
+            # Abandoned anonymous carts (user IS NULL), oldest first (purge_carts)
+            models.Index(fields=['user', 'updated_at'], name='cart_user_updated'),
+        ]
+
 # CartItem model for items in a cart
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')  # Parent cart
     product = models.ForeignKey(Product, on_delete=models.CASCADE)  # Product in cart
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True)  # Chosen size/color, if the product has variants
     quantity = models.PositiveIntegerField(default=1)  # Quantity of product
 
+    class Meta:
+        constraints = [
+            # One line per product and variant, quantities are summed; also the
+            # conflict target of the cart upserts (store.cart), so NULL variants
+            # must compare equal
+            models.UniqueConstraint(F('cart'), F('product'), Coalesce('variant', 0), name='cartitem_line'),
+        ]
+
     def total_price(self):
         # Returns total price for this cart item
-        return self.product.price * self.quantity
+        unit_price = self.variant.unit_price if self.variant_id else self.product.price
+        return unit_price * self.quantity
 
 # UserProfile model for additional user info
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)  # Linked user
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)  # Profile image
+    profile_picture_manifest = models.JSONField(blank=True, null=True, editable=False)  # Responsive derivatives of profile_picture
     phone = models.CharField(max_length=20, blank=True, null=True)  # Phone number
     address = models.TextField(blank=True, null=True)  # Address
     wishlist = models.ManyToManyField(Product, blank=True)  # Wishlist products
@@ -130,4 +229,57 @@ class UserProfile(models.Model):
 class RecentlyViewed(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)  # User who viewed
     product = models.ForeignKey(Product, on_delete=models.CASCADE)  # Viewed product
-    viewed_at = models.DateTimeField(auto_now_add=True)  # View timestamp
\ No newline at end of file
+    viewed_at = models.DateTimeField(auto_now_add=True)  # Last view timestamp
+
+    class Meta:
+        unique_together = ['user', 'product']  # One row per product, bumped on repeat views
+        indexes = [
+            models.Index(fields=['user', '-viewed_at'], name='recently_viewed_user_recent'),
+        ]
+
+# Order model for completed checkouts
+class Order(models.Model):
+    STATUS_PLACED = 'placed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_PLACED, 'Placed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')  # Customer
+    idempotency_key = models.CharField(max_length=64)  # Checkout form token; a resubmit finds the same order
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PLACED)  # Order status
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # Sum of line totals
+    created_at = models.DateTimeField(auto_now_add=True)  # Placement timestamp
+
+    class Meta:
+        unique_together = ['user', 'idempotency_key']  # One order per checkout submission
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_recent'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.pk}"
+
+# OrderLine model snapshotting a product at checkout
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')  # Parent order
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)  # Product bought (kept if deleted)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True)  # Variant bought, if any
+    product_name = models.CharField(max_length=255)  # Name (with the variant's size/color) at checkout
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)  # Price at checkout
+    quantity = models.PositiveIntegerField()  # Units bought
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+# ProductRecommendation model holding precomputed "also viewed" neighbours
+class ProductRecommendation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')  # Product shown
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')  # Neighbour to recommend
+    rank = models.PositiveSmallIntegerField()  # 0 = most similar
+    score = models.FloatField()  # Similarity (cosine or Jaccard) from build_recommendations
+
+    class Meta:
+        unique_together = ['product', 'rank']  # Also the index serving the detail page lookup
@@ -0,0 +1,132 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+
+from .models import CartItem, Order, OrderLine, Product, ProductVariant
+
+
+class InsufficientStock(Exception):
+    """Raised when a cart line asks for more units than are left"""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f'Not enough stock for {", ".join(products)}')
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class OptionRequired(Exception):
+    """Raised when a cart line has no variant but its product is sold in variants"""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f'Choose an option of {", ".join(products)}')
+
+
+def line_name(item):
+    """A cart line's product name, with its variant's size/color if it has one"""
+    if item.variant_id and item.variant.label:
+        return f'{item.product.name} ({item.variant.label})'
+    return item.product.name
+
+
+def reserve_stock(model, quantities):
+    """
+    Take {pk: quantity} units from the stock of Product or ProductVariant
+    rows with one conditional UPDATE; untracked stock (NULL) always
+    succeeds. Returns False when any row is short, in which case the rows
+    that had enough were still decremented and the caller must roll back.
+    """
+    if not quantities:
+        return True
+    if connection.features.has_select_for_update:
+        # The UPDATE locks rows in whatever order its plan visits them; lock
+        # them by primary key first so checkouts sharing products queue up
+        # instead of deadlocking. (SQLite locks the whole database instead.)
+        list(model.objects.select_for_update().filter(pk__in=list(quantities)).order_by('pk').values_list('pk', flat=True))
+    needed = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    updated = model.objects.filter(
+        Q(stock__isnull=True) | Q(stock__gte=needed), pk__in=list(quantities),
+    ).update(stock=F('stock') - needed)
+    return updated == len(quantities)
+
+
+def short_lines(items):
+    """Names of the lines asking for more than the stock read with them; all of them if none do"""
+    def stock(item):
+        return item.variant.stock if item.variant_id else item.product.stock
+
+    short = [line_name(item) for item in items if stock(item) is not None and stock(item) < item.quantity]
+    return short or [line_name(item) for item in items]
+
+
+def place_order(user, cart, idempotency_key):
+    """
+    Turn a cart into an Order in one transaction: claim the idempotency key,
+    snapshot prices, reserve stock for every line and empty the cart.
+    Returns (order, created); resubmitting the same key returns the existing
+    order with created=False. Raises InsufficientStock, OptionRequired or
+    EmptyCart, rolling everything back.
+    """
+    try:
+        with transaction.atomic():
+            # Writing first takes the database write lock up front (on SQLite
+            # this avoids a failed read-to-write lock upgrade), and the unique
+            # (user, idempotency_key) constraint rejects a concurrent resubmit
+            order = Order.objects.create(user=user, idempotency_key=idempotency_key)
+
+            items = list(
+                CartItem.objects.filter(cart=cart)
+                .select_related('product', 'variant', 'variant__size', 'variant__color')
+                # Variant-less lines of products sold in variants (added before
+                # the product had any) would skip the variant's price and stock
+                .annotate(needs_variant=Exists(ProductVariant.objects.filter(product=OuterRef('product_id'))))
+                # A concurrent checkout of the same cart waits for these lines,
+                # then finds them gone
+                .select_for_update(of=('self',))
+                .order_by('product_id', 'variant_id')
+            )
+            if not items:
+                raise EmptyCart()
+            unchosen = [item.product.name for item in items if item.needs_variant and not item.variant_id]
+            if unchosen:
+                raise OptionRequired(unchosen)
+
+            # One UPDATE per table however many lines the cart has; lines
+            # without a variant take from the product's stock
+            products = {item.product_id: item.quantity for item in items if not item.variant_id}
+            variants = {item.variant_id: item.quantity for item in items if item.variant_id}
+            if not (reserve_stock(Product, products) and reserve_stock(ProductVariant, variants)):
+                raise InsufficientStock(short_lines(items))
+
+            lines = [
+                OrderLine(
+                    order=order,
+                    product_id=item.product_id,
+                    variant_id=item.variant_id,
+                    product_name=line_name(item)[:255],
+                    unit_price=item.variant.unit_price if item.variant else item.product.price,
+                    quantity=item.quantity,
+                )
+                for item in items
+            ]
+            OrderLine.objects.bulk_create(lines)
+            order.total = sum((line.line_total for line in lines), Decimal('0.00'))
+            order.save(update_fields=['total'])
+
+            CartItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+    except IntegrityError:
+        # A resubmit of the same form (concurrent or not) finds the order
+        # already placed under its key
+        existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        return existing, False
+
+    return order, True
@@ -0,0 +1,251 @@
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+# Page size limits for product listings (overridable from settings)
+DEFAULT_PAGE_SIZE = getattr(settings, 'STORE_PAGE_SIZE', 24)
+MAX_PAGE_SIZE = getattr(settings, 'STORE_MAX_PAGE_SIZE', 96)
+
+# Available listing orders. Every order ends with the primary key so that the
+# key is unique and the keyset comparison never skips or repeats a row.
+SORT_ORDERS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+    'rating': ('-rating_avg', '-id'),
+    'popular': ('-popularity', '-id'),
+}
+DEFAULT_SORT = 'newest'
+
+CURSOR_SALT = 'store.pagination.cursor'
+
+# Offset pagination of large tables (the admin changelists): tables estimated
+# below EXACT_COUNT_BELOW rows are counted exactly, filtered results are
+# counted up to COUNT_LIMIT rows
+EXACT_COUNT_BELOW = getattr(settings, 'STORE_EXACT_COUNT_BELOW', 10000)
+COUNT_LIMIT = getattr(settings, 'STORE_COUNT_LIMIT', 10000)
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor cannot be decoded or belongs to another ordering"""
+
+
+def get_page_size(request):
+    """Read ?per_page= and clamp it to the allowed range"""
+    try:
+        size = int(request.GET.get('per_page', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def get_sort(request, sort_orders=SORT_ORDERS, default_sort=DEFAULT_SORT):
+    """Read ?sort= and fall back to the default ordering for unknown values"""
+    sort = request.GET.get('sort', default_sort)
+    return sort if sort in sort_orders else default_sort
+
+
+def encode_cursor(sort, direction, values):
+    # Signed so clients cannot craft arbitrary filter values
+    return signing.dumps([sort, direction, values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor, sort):
+    try:
+        cursor_sort, direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+    if cursor_sort != sort or direction not in ('next', 'prev'):
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+def _field_name(order):
+    return order.lstrip('-')
+
+
+def _is_nullable(model, order):
+    try:
+        return model._meta.get_field(_field_name(order)).null
+    except FieldDoesNotExist:
+        # Annotations used as sort keys (e.g. search_rank) are never NULL
+        return False
+
+
+def _order_expressions(model, ordering, reverse):
+    """
+    Translate an ordering into ORDER BY expressions. NULLs of nullable keys
+    always sort last when paging forward (and therefore first when walking
+    backwards) so the keyset filter below can place them consistently.
+    """
+    expressions = []
+    for order in ordering:
+        descending = order.startswith('-') != reverse
+        name = _field_name(order)
+        if not _is_nullable(model, order):
+            expressions.append(f'-{name}' if descending else name)
+            continue
+        expression = F(name).desc if descending else F(name).asc
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        expressions.append(expression(**nulls))
+    return expressions
+
+
+def _after(model, order, value, reverse):
+    """Condition for rows strictly after value in the key column"""
+    name = _field_name(order)
+    descending = order.startswith('-') != reverse
+    nullable = _is_nullable(model, order)
+    if value is None:
+        # Forward, NULLs are the tail; backwards, every non-NULL follows them
+        return Q(**{f'{name}__isnull': False}) if reverse else None
+    condition = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+    if nullable and not reverse:
+        condition |= Q(**{f'{name}__isnull': True})
+    return condition
+
+
+def _equal(order, value):
+    name = _field_name(order)
+    if value is None:
+        return Q(**{f'{name}__isnull': True})
+    return Q(**{name: value})
+
+
+def _keyset_filter(model, ordering, values, reverse):
+    """
+    Build the row-value comparison "(a, b, c) > (x, y, z)" for the given
+    ordering as an OR of prefix equalities, which every backend can serve
+    from a composite index on the ordering columns.
+    """
+    condition = Q()
+    for position, order in enumerate(ordering):
+        clause = _after(model, order, values[position], reverse)
+        if clause is None:
+            continue
+        for previous, value in zip(ordering[:position], values):
+            clause &= _equal(previous, value)
+        condition |= clause
+    return condition
+
+
+def _cursor_values(obj, ordering):
+    values = []
+    for order in ordering:
+        # Rows are model instances, or dicts for values() querysets
+        value = obj[_field_name(order)] if isinstance(obj, dict) else getattr(obj, _field_name(order))
+        # Decimals and datetimes are stored as strings; the ORM converts them back
+        values.append(value if isinstance(value, (int, float, type(None))) else str(value))
+    return values
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, sort, sort_options, page_size, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.sort = sort
+        self.sort_options = sort_options
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def paginate(queryset, request, sort_orders=SORT_ORDERS, default_sort=DEFAULT_SORT):
+    """
+    Return a KeysetPage for the queryset based on ?sort=, ?per_page= and
+    ?cursor=. Each page is a single indexed range query of page_size + 1 rows,
+    so the cost does not grow with how deep the user has browsed.
+    """
+    sort = get_sort(request, sort_orders, default_sort)
+    page_size = get_page_size(request)
+    ordering = sort_orders[sort]
+
+    direction, values = 'next', None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            direction, values = decode_cursor(cursor, sort)
+        except InvalidCursor:
+            # Stale or tampered cursors restart from the first page
+            direction, values = 'next', None
+
+    reverse = direction == 'prev'
+    if values is not None:
+        queryset = queryset.filter(_keyset_filter(queryset.model, ordering, values, reverse))
+
+    # Walking backwards reads the rows before the cursor with the ordering reversed
+    order_by = _order_expressions(queryset.model, ordering, reverse)
+    rows = list(queryset.order_by(*order_by)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if reverse:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(sort, 'next', _cursor_values(rows[-1], ordering))
+    if rows and has_previous:
+        previous_cursor = encode_cursor(sort, 'prev', _cursor_values(rows[0], ordering))
+
+    return KeysetPage(rows, sort, list(sort_orders), page_size, next_cursor, previous_cursor)
+
+
+def estimate_count(model, using='default'):
+    """
+    Approximate row count of a model's table without scanning it: the
+    planner statistics on PostgreSQL, the highest rowid on SQLite. None when
+    the backend offers neither (or PostgreSQL has not analysed the table).
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never runs an unbounded COUNT(*). An unfiltered large
+    table reports estimate_count(); anything else is counted exactly up to
+    COUNT_LIMIT rows, so pages past the limit are reached by filtering.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= EXACT_COUNT_BELOW:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
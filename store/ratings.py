@@ -0,0 +1,71 @@
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import Product, Review
+
+
+def apply_rating_change(product_id, count_delta, sum_delta):
+    """
+    Adjust a product's stored rating aggregates in one UPDATE. The new average
+    is computed from the pre-update column values in the same statement, so
+    concurrent reviews cannot interleave between reading and writing.
+    Reviews are part of the product's public data, so updated_at (the API's
+    Last-Modified) is bumped even when only a comment changed.
+    """
+    if not count_delta and not sum_delta:
+        Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+        return
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    Product.objects.filter(pk=product_id).update(
+        updated_at=timezone.now(),
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Case(
+            When(Q(rating_count__gt=-count_delta), then=Cast(new_sum, FloatField()) / Cast(new_count, FloatField())),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+
+def review_saved(review, created):
+    """Apply a created or edited review to the product aggregates"""
+    stored_rating = getattr(review, '_stored_rating', None)
+    stored_product_id = getattr(review, '_stored_product_id', None)
+
+    if created or stored_rating is None:
+        apply_rating_change(review.product_id, 1 if created else 0, review.rating if created else 0)
+    elif stored_product_id != review.product_id:
+        # Review moved to another product
+        apply_rating_change(stored_product_id, -1, -stored_rating)
+        apply_rating_change(review.product_id, 1, review.rating)
+    else:
+        apply_rating_change(review.product_id, 0, review.rating - stored_rating)
+
+    review._stored_rating = review.rating
+    review._stored_product_id = review.product_id
+
+
+def review_deleted(review):
+    """Remove a deleted review from the product aggregates"""
+    rating = getattr(review, '_stored_rating', None) or review.rating
+    product_id = getattr(review, '_stored_product_id', None) or review.product_id
+    apply_rating_change(product_id, -1, -rating)
+
+
+def actual_rating_aggregates():
+    """Product queryset annotated with aggregates recomputed from Review rows"""
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return Product.objects.annotate(
+        actual_count=Coalesce(Subquery(reviews.annotate(n=Count('id')).values('n')), 0),
+        actual_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+    )
+
+
+def drifted_products():
+    """Products whose stored aggregates disagree with their reviews"""
+    return actual_rating_aggregates().exclude(
+        rating_count=F('actual_count'), rating_sum=F('actual_sum'),
+    )
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import RecentlyViewed
+
+# Products remembered per user; older views are pruned
+RECENTLY_VIEWED_LIMIT = getattr(settings, 'STORE_RECENTLY_VIEWED_LIMIT', 20)
+# Views recorded between prunes, so a user holds at most LIMIT + PRUNE_EVERY rows
+PRUNE_EVERY = getattr(settings, 'STORE_RECENTLY_VIEWED_PRUNE_EVERY', RECENTLY_VIEWED_LIMIT)
+
+VIEW_COUNTER_CACHE_KEY = 'store:recently_viewed:{}:views'
+
+
+def record_view(user, product):
+    """
+    Mark product as just viewed by user with a single
+    INSERT ... ON CONFLICT (user, product) DO UPDATE SET viewed_at. Old
+    rows are pruned every PRUNE_EVERY views, counted in the cache rather
+    than the database.
+    """
+    RecentlyViewed.objects.bulk_create(
+        [RecentlyViewed(user=user, product=product)],
+        update_conflicts=True,
+        unique_fields=['user', 'product'],
+        update_fields=['viewed_at'],
+    )
+
+    key = VIEW_COUNTER_CACHE_KEY.format(user.pk)
+    cache.add(key, 0, None)
+    try:
+        views = cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr; start counting again
+        return
+    if views % PRUNE_EVERY == 0:
+        prune(user)
+
+
+def prune(user, limit=RECENTLY_VIEWED_LIMIT):
+    """Delete all but the user's `limit` most recent views"""
+    cutoff = (
+        RecentlyViewed.objects.filter(user=user)
+        .order_by('-viewed_at', '-id')
+        .values_list('viewed_at', flat=True)[limit:limit + 1]
+        .first()
+    )
+    if cutoff is not None:
+        RecentlyViewed.objects.filter(user=user, viewed_at__lte=cutoff).delete()
+
+
+def get_recently_viewed(user, limit=RECENTLY_VIEWED_LIMIT):
+    """The user's latest views with their products, read from the (user, -viewed_at) index"""
+    return RecentlyViewed.objects.filter(user=user).select_related('product').order_by('-viewed_at')[:limit]
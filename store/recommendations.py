@@ -0,0 +1,85 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from .models import ProductRecommendation, RecentlyViewed
+from .wishlist import WishlistItem
+
+# Neighbours shown on a product page
+RECOMMENDATION_LIMIT = getattr(settings, 'STORE_RECOMMENDATION_LIMIT', 6)
+
+
+def cosine(together, count_a, count_b):
+    return together / math.sqrt(count_a * count_b)
+
+
+def jaccard(together, count_a, count_b):
+    return together / (count_a + count_b - together)
+
+
+SIMILARITIES = {'cosine': cosine, 'jaccard': jaccard}
+
+
+def get_recommendations(product_id, limit=RECOMMENDATION_LIMIT):
+    """Precomputed neighbours of a product, best first: one query on the (product, rank) index"""
+    rows = (
+        ProductRecommendation.objects.filter(product_id=product_id, rank__lt=limit)
+        .select_related('recommended')
+        .order_by('rank')
+    )
+    return [row.recommended for row in rows]
+
+
+def interaction_baskets(chunk_size=5000, max_basket=200):
+    """
+    Yield the distinct product ids each user viewed or wishlisted. Views and
+    wishlist rows are streamed from two cursors ordered by user and merged,
+    so only one user's rows are held in memory at a time.
+    """
+    views = (
+        RecentlyViewed.objects.order_by('user_id')
+        .values_list('user_id', 'product_id').iterator(chunk_size=chunk_size)
+    )
+    wishlisted = (
+        WishlistItem.objects.order_by('userprofile__user_id')
+        .values_list('userprofile__user_id', 'product_id').iterator(chunk_size=chunk_size)
+    )
+    for _, rows in groupby(heapq.merge(views, wishlisted, key=itemgetter(0)), key=itemgetter(0)):
+        yield list(dict.fromkeys(product_id for _, product_id in rows))[:max_basket]
+
+
+def cooccurrence(baskets, shard=0, shards=1):
+    """
+    Sparse item-item co-occurrence counts: ({product: baskets containing it},
+    {product: {other product: baskets containing both}}). Only rows of
+    products in the given shard (id % shards) are kept, so a large history
+    can be processed in several passes of bounded memory.
+    """
+    counts = Counter()
+    pairs = defaultdict(Counter)
+    for basket in baskets:
+        counts.update(basket)
+        for product_id in basket:
+            if product_id % shards == shard:
+                # Counter.update counts the whole basket in C; the product's
+                # count of itself is dropped in top_neighbours
+                pairs[product_id].update(basket)
+    return counts, pairs
+
+
+def top_neighbours(counts, pairs, top_k, similarity=cosine, min_together=2):
+    """Yield (product id, [(score, neighbour id), ...]) with at most top_k neighbours, best first"""
+    for product_id, row in pairs.items():
+        row.pop(product_id, None)
+        count = counts[product_id]
+        scored = (
+            (similarity(together, count, counts[other]), other)
+            for other, together in row.items() if together >= min_together
+        )
+        neighbours = heapq.nlargest(top_k, scored)
+        if neighbours:
+            yield product_id, neighbours
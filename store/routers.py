@@ -0,0 +1,66 @@
+import contextvars
+import random
+
+from django.conf import settings
+
+# True while handling a request whose catalogue reads may be served by a replica
+replica_reads = contextvars.ContextVar('store_replica_reads', default=False)
+
+# Models read from replicas; per-user data (sessions, carts, wishlists, orders)
+# always comes from the primary so a visitor sees their own writes at once.
+# Reviews are public catalogue content, but views that look up the visitor's
+# own review read it with .using('default') for the same reason
+CATALOGUE_MODELS = {'store.category', 'store.subcategory', 'store.product', 'store.review'}
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+class ReplicaRouter:
+    """
+    Sends catalogue reads made by the views in STORE_REPLICA_VIEWS to a random
+    replica; every other read and all writes use the primary. Once a request
+    writes, its later reads stay on the primary too. Without replicas
+    configured this routes everything to default.
+    """
+
+    def __init__(self):
+        self.replicas = replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        if self.replicas and replica_reads.get() and model._meta.label_lower in CATALOGUE_MODELS:
+            return random.choice(self.replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # The replicas may not have this write yet
+        replica_reads.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in self.replicas
+
+
+class ReplicaReadsMiddleware:
+    """Enables replica reads for safe requests to the views in STORE_REPLICA_VIEWS"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'STORE_REPLICA_VIEWS', ()))
+
+    def __call__(self, request):
+        token = replica_reads.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            replica_reads.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if request.method in ('GET', 'HEAD') and match and match.url_name in self.views:
+            replica_reads.set(True)
@@ -0,0 +1,117 @@
+import re
+
+from django.db import connection, models
+from django.db.models import F, FloatField, Func, Q, Value
+
+# SQLite FTS5 index over the searchable product columns. The rowid of each
+# index row is the product id, so matches map straight back to store_product.
+SEARCH_TABLE = 'store_product_fts'
+SEARCH_COLUMNS = ('name', 'brand', 'color', 'description')
+
+# Index rows built from store_product and its brand and color lookup tables,
+# in SEARCH_COLUMNS order; callers append a WHERE clause over store_product
+SEARCH_SOURCE = (
+    "SELECT store_product.id, COALESCE(store_product.name, ''), COALESCE(store_brand.name, ''), "
+    "COALESCE(store_color.name, ''), COALESCE(store_product.description, '') FROM store_product "
+    "LEFT JOIN store_brand ON store_brand.id = store_product.brand_id "
+    "LEFT JOIN store_color ON store_color.id = store_product.color_id"
+)
+
+# bm25() weights per column (name matches count most, description least)
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# Listing order used for ranked results; bm25() scores are lower for better matches
+RELEVANCE_SORT = {'relevance': ('search_rank', 'id')}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchDocumentField(models.TextField):
+    """
+    The hidden column an FTS5 table shares its name with (ProductSearchEntry):
+    the left side of MATCH and the first argument of bm25()
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def search_enabled():
+    """The FTS5 index only exists on SQLite databases"""
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    """
+    Turn free text into an FTS5 MATCH expression. Every word must match, either
+    as a stemmed term ("running" finds "run") or as a prefix of an indexed term
+    ("snea" finds "sneakers") so results update while the user types.
+    """
+    terms = TOKEN_RE.findall(query.lower())
+    return ' AND '.join(f'("{term}" OR "{term}"*)' for term in terms)
+
+
+def search_products(queryset, query):
+    """
+    Restrict a Product queryset to the rows matching the search query and
+    annotate each with its relevance as search_rank. Any other filters on the
+    queryset are applied by the same SQL statement.
+    """
+    if not search_enabled():
+        # Fallback for databases without the FTS5 index (unranked)
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    match = build_match_query(query)
+    if not match:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    # Joined once on rowid, so the index is queried a single time and each
+    # match carries its score, instead of probing it again per product
+    rank = Func(
+        F('search_entry__document'), *(Value(weight) for weight in SEARCH_WEIGHTS),
+        function='bm25', output_field=FloatField(),
+    )
+    return queryset.filter(search_entry__document__match=match).annotate(search_rank=rank)
+
+
+def reindex_products(where, params):
+    """Replace the index rows of the products matching a WHERE clause over store_product"""
+    if not search_enabled():
+        return
+    columns = ', '.join(SEARCH_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM store_product WHERE {where})', params)
+        cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) {SEARCH_SOURCE} WHERE {where}', params)
+
+
+def index_product(product):
+    """Insert or replace the index row of a single product"""
+    reindex_products('store_product.id = %s', [product.pk])
+
+
+def unindex_product(product_id):
+    """Remove a product from the index"""
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_index(cursor):
+    """Repopulate the whole index from store_product in a single statement"""
+    columns = ', '.join(SEARCH_COLUMNS)
+    cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) {SEARCH_SOURCE}')
+    # Merge the index b-trees so queries touch as few segments as possible
+    cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}')
+    return cursor.fetchone()[0]
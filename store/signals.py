@@ -0,0 +1,124 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Category, Subcategory, Product, ProductVariant, Review, UserProfile, Brand, Color, Size
+from .search import index_product, unindex_product, reindex_products, rebuild_index, search_enabled
+from .attributes import invalidate_attributes
+from .facets import invalidate_facets
+from .ratings import review_saved, review_deleted
+from .catalogue_cache import invalidate_navigation, invalidate_pages, invalidate_product_card
+from .images import prepare_manifest
+from .cart import remember_user_cart
+
+# Keep the product search index in sync with the catalogue
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_product(instance)
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+# Cached facet counts depend on every product row
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reset_facet_cache(sender, **kwargs):
+    invalidate_facets()
+
+# Brand, color and size names appear in facets, search and product pages
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=Size)
+def attribute_saved(sender, instance, created, raw=False, **kwargs):
+    invalidate_attributes()
+    if created or raw:
+        return
+    # The JSON API serves the names with products, validated by their updated_at
+    instance.products.update(updated_at=timezone.now())
+    if sender is not Size:
+        # Only the renamed value's products need new search rows
+        reindex_products(f'store_product.{sender.__name__.lower()}_id = %s', [instance.pk])
+    invalidate_facets()
+    invalidate_pages()
+
+@receiver(pre_delete, sender=Brand)
+@receiver(pre_delete, sender=Color)
+@receiver(pre_delete, sender=Size)
+def attribute_deleting(sender, instance, **kwargs):
+    instance.products.update(updated_at=timezone.now())
+
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=Size)
+def attribute_deleted(sender, **kwargs):
+    # Products lost the value through SET_NULL, which sends no Product signals
+    invalidate_attributes()
+    if sender is not Size and search_enabled():
+        with transaction.atomic(), connection.cursor() as cursor:
+            rebuild_index(cursor)
+    invalidate_facets()
+    invalidate_pages()
+
+# Incrementally maintain the denormalized rating aggregates on Product
+@receiver(post_save, sender=Review)
+def update_rating_aggregates(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        review_saved(instance, created)
+
+@receiver(post_delete, sender=Review)
+def remove_rating_aggregates(sender, instance, **kwargs):
+    review_deleted(instance)
+
+# Catalogue caches: the navbar tree depends on categories, product cards on
+# their product and its reviews, and cached anonymous pages on all of them
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def reset_navigation_cache(sender, **kwargs):
+    invalidate_navigation()
+    invalidate_pages()
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def reset_product_cache(sender, instance, **kwargs):
+    invalidate_product_card(instance.pk)
+    invalidate_pages()
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def reset_review_cache(sender, instance, **kwargs):
+    invalidate_product_card(instance.product_id)
+    invalidate_pages()
+
+# Variants feed the color/size filters and facets, and the product page
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def reset_variant_cache(sender, **kwargs):
+    invalidate_facets()
+    invalidate_pages()
+
+# Generate image derivatives when an image is saved, never while rendering;
+# a no-op while the stored manifest matches the current file
+@receiver(post_save, sender=Product)
+def prepare_product_image(sender, instance, raw=False, **kwargs):
+    if not raw and prepare_manifest(instance, 'image'):
+        # The UPDATE sends no signals, and pages rendered since
+        # reset_product_cache ran still show the old image
+        invalidate_product_card(instance.pk)
+        invalidate_pages()
+
+@receiver(post_save, sender=UserProfile)
+def prepare_profile_picture(sender, instance, raw=False, **kwargs):
+    if not raw:
+        prepare_manifest(instance, 'profile_picture')
+
+# Remember the user's cart in the session so pages never look it up
+@receiver(user_logged_in)
+def remember_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        remember_user_cart(request, user)
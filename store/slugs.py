@@ -0,0 +1,120 @@
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Length
+from django.utils.text import slugify
+
+# Room kept at the end of a truncated slug for a "-<n>" suffix
+SUFFIX_RESERVE = 8
+# Inserts attempted before giving up on a contended slug
+MAX_ATTEMPTS = 5
+# Slugs checked per query when allocating in bulk (SQLite allows 999 parameters)
+BATCH_QUERY_SIZE = 500
+
+
+def base_slug(model, source):
+    """Slugified source, truncated to the model's slug length"""
+    max_length = model._meta.get_field('slug').max_length
+    return slugify(source)[:max_length] or model._meta.model_name
+
+
+def _suffix_stem(model, base):
+    max_length = model._meta.get_field('slug').max_length
+    return base[:max_length - SUFFIX_RESERVE].rstrip('-')
+
+
+def highest_suffix(model, base):
+    """
+    Largest n among existing "<base>-<n>" slugs (0 if there are none). The
+    prefix is matched as an index range rather than LIKE, so this is a single
+    index seek regardless of how many products share the name.
+    """
+    prefix = f'{_suffix_stem(model, base)}-'
+    # Every string starting with prefix sorts in [prefix, prefix with its last char incremented)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    last = (
+        model._default_manager
+        .filter(slug__gte=prefix, slug__lt=upper, slug__regex=rf'^{re.escape(prefix)}[0-9]+$')
+        .order_by(Length('slug').desc(), '-slug')
+        .values_list('slug', flat=True)
+        .first()
+    )
+    return int(last[len(prefix):]) if last else 0
+
+
+def suffixed_slug(model, base, number):
+    return f'{_suffix_stem(model, base)}-{number}'
+
+
+def save_with_unique_slug(instance, save, source):
+    """
+    Assign a unique slug derived from source and save the instance. The plain
+    slug is tried first; if the insert hits the unique constraint (including
+    a concurrent insert of the same slug) the next free numeric suffix is
+    looked up and the insert retried, each attempt inside its own savepoint.
+    """
+    model = type(instance)
+    base = base_slug(model, source)
+    candidate = base
+    for attempt in range(MAX_ATTEMPTS):
+        instance.slug = candidate
+        try:
+            with transaction.atomic():
+                save()
+            return
+        except IntegrityError:
+            instance.slug = ''
+            # Some other constraint failed; don't mask it
+            if not model._default_manager.filter(slug=candidate).exists():
+                raise
+            candidate = suffixed_slug(model, base, highest_suffix(model, base) + 1)
+    raise IntegrityError(f'Could not allocate a unique slug for {source!r}')
+
+
+def allocate_slugs(model, sources):
+    """
+    Allocate unique slugs for many new rows at once (e.g. before bulk_create),
+    returning them in the order of sources. Costs one query per 500 distinct
+    slugs plus one per slug that is already taken, instead of an existence
+    check per row. Concurrent writers can still claim a slug in between, so
+    callers retry the batch on IntegrityError (as import_catalogue does, up
+    to MAX_ATTEMPTS times).
+    """
+    bases = [base_slug(model, source) for source in sources]
+    distinct = list(dict.fromkeys(bases))
+
+    taken = set()
+    for start in range(0, len(distinct), BATCH_QUERY_SIZE):
+        chunk = distinct[start:start + BATCH_QUERY_SIZE]
+        taken.update(model._default_manager.filter(slug__in=chunk).values_list('slug', flat=True))
+
+    used = set()
+    counters = {}
+    slugs = []
+    for base in bases:
+        slug = base
+        if slug in taken or slug in used:
+            # Next free suffix, looked up once per base that is taken or repeated
+            if base not in counters:
+                counters[base] = highest_suffix(model, base)
+            while slug in taken or slug in used:
+                counters[base] += 1
+                slug = suffixed_slug(model, base, counters[base])
+        used.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+class UniqueSlugMixin:
+    """Model mixin that fills a blank slug from slug_source on save"""
+
+    slug_source = 'name'
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+        save_with_unique_slug(
+            self,
+            lambda: super(UniqueSlugMixin, self).save(*args, **kwargs),
+            getattr(self, self.slug_source),
+        )
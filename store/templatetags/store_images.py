@@ -0,0 +1,54 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from store.images import FALLBACK_FORMAT, MIME_TYPES, get_manifest, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(field_file, sizes='100vw', **attrs):
+    """
+    Render an ImageField as a <picture> offering AVIF/WebP/JPEG derivatives at
+    several widths, so the browser downloads only what the layout needs:
+
+        {% responsive_image product.image sizes="(min-width: 992px) 25vw, 50vw" alt=product.name class="card-img-top" %}
+
+    Extra keyword arguments become attributes of the <img>. Falls back to the
+    original file until derivatives have been generated (on save, or by
+    `manage.py generate_image_derivatives`).
+    """
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    manifest = get_manifest(field_file)
+    if manifest is None:
+        return format_html('<img src="{}"{}>', field_file.url, flatatt(attrs))
+
+    storage = field_file.storage
+    fallback = manifest['variants'][FALLBACK_FORMAT]
+    # Dimensions reserve layout space before the image loads; a lone width
+    # keeps the source's aspect ratio
+    if 'width' in attrs and 'height' not in attrs:
+        attrs['height'] = round(manifest['height'] * int(attrs['width']) / manifest['width'])
+    elif 'width' not in attrs and 'height' not in attrs:
+        # Only an aspect ratio hint; CSS (e.g. width: 100%) decides the size
+        attrs['width'], attrs['height'] = manifest['width'], manifest['height']
+        attrs['style'] = f'height: auto; {attrs.get("style", "")}'.strip()
+    sources = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES[fmt], srcset(manifest, fmt, storage), sizes)
+            for fmt in manifest['variants'] if fmt != FALLBACK_FORMAT
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        sources,
+        storage.url(fallback[-1][1]),
+        srcset(manifest, FALLBACK_FORMAT, storage),
+        sizes,
+        flatatt(attrs),
+    )
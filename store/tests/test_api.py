@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from store.counters import counters, write_counts
+from store.models import Category, Product, Review
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Clothing')
+        cls.shirt = Product.objects.create(name='Shirt', price=Decimal('10.00'), category=cls.category)
+        cls.hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(counters.take)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code
+
+    def test_listings_revalidate_without_reading_the_catalogue(self):
+        for url in (reverse('api_products'), reverse('api_facets'), reverse('api_product_export')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.revalidate(url, response), 304)
+                since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(since.status_code, 304)
+
+    def test_catalogue_writes_change_the_listing_etag(self):
+        url = reverse('api_products') + '?sort=popular'
+        writes = [
+            lambda: Product.objects.create(name='Scarf', price=Decimal('8.00'), category=self.category),
+            lambda: Product.objects.filter(name='Scarf').delete(),
+            lambda: Review.objects.create(product=self.hat, user=User.objects.create_user('critic'), rating=4),
+            # Written behind by the counters with update(), leaving updated_at alone
+            lambda: write_counts({('cart_add', self.hat.pk): 3}),
+        ]
+        for write in writes:
+            response = self.client.get(url)
+            write()
+            self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_single_product_validators(self):
+        url = reverse('api_product', args=[self.shirt.slug])
+        response = self.client.get(url)
+        self.assertEqual(response['Last-Modified'], http_date(int(self.shirt.updated_at.timestamp())))
+        self.assertEqual(self.revalidate(url, response), 304)
+        # Other products changing leaves it valid, its own change does not
+        self.hat.save()
+        self.assertEqual(self.revalidate(url, response), 304)
+        self.shirt.save()
+        self.assertEqual(self.revalidate(url, response), 200)
+
+    def test_fields_selects_and_validates(self):
+        response = self.client.get(reverse('api_product', args=[self.shirt.slug]), {'fields': 'name,price,name'})
+        self.assertEqual(response.json(), {'name': 'Shirt', 'price': '10.00'})
+        listing = self.client.get(reverse('api_products'), {'fields': 'id', 'sort': 'price_asc'}).json()
+        self.assertEqual(listing['products'], [{'id': self.hat.id}, {'id': self.shirt.id}])
+
+        for url in (reverse('api_products'), reverse('api_product', args=[self.shirt.slug]),
+                    reverse('api_product_reviews', args=[self.shirt.slug]), reverse('api_product_export')):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'fields': 'id,secret'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Unknown fields: secret'})
+                self.assertEqual(self.client.get(url, {'fields': ' , '}).status_code, 400)
@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from store.attributes import attribute_ids, attribute_names
+from store.models import Brand, Color
+
+BEFORE = [('store', '0013_product_popularity')]
+AFTER = [('store', '0014_product_attributes')]
+
+
+class AttributeTests(TestCase):
+    def test_spellings_share_a_row(self):
+        Brand.objects.create(name='Nike')
+        ids = attribute_ids('brand', ['nike ', 'NIKE', ' Old  Navy', 'old navy', '', None])
+        nike, old_navy = Brand.objects.get(name='Nike'), Brand.objects.get(name='Old Navy')
+        self.assertEqual(ids, {'nike ': nike.pk, 'NIKE': nike.pk, ' Old  Navy': old_navy.pk, 'old navy': old_navy.pk})
+        self.assertEqual(Brand.objects.count(), 2)
+        self.assertEqual(attribute_names('brand'), {nike.pk: 'Nike', old_navy.pk: 'Old Navy'})
+
+    def test_names_are_unique_ignoring_case(self):
+        Color.objects.create(name='Navy')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Color.objects.create(name='NAVY')
+
+
+class DeduplicateAttributesMigrationTests(TransactionTestCase):
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('store')
+        self.addCleanup(self.migrate, latest)
+        apps = self.migrate(BEFORE)
+        Category = apps.get_model('store', 'Category')
+        Product = apps.get_model('store', 'Product')
+        category = Category.objects.create(name='Clothing', slug='clothing')
+        spellings = [('Nike', 'Red'), ('Nike', 'red'), ('nike ', None), ('NIKE', ''), ('Old  Navy', ' Red '), ('', 'Blue')]
+        for n, (brand, color) in enumerate(spellings):
+            Product.objects.create(
+                name=f'Product {n}', slug=f'product-{n}', price=Decimal('10.00'), category=category,
+                brand=brand, color=color,
+            )
+
+    def test_forward_merges_spellings_into_one_row(self):
+        apps = self.migrate(AFTER)
+        Product = apps.get_model('store', 'Product')
+        Brand = apps.get_model('store', 'Brand')
+        Color = apps.get_model('store', 'Color')
+
+        # Named after the spelling most products use
+        self.assertEqual(sorted(Brand.objects.values_list('name', flat=True)), ['Nike', 'Old Navy'])
+        self.assertEqual(sorted(Color.objects.values_list('name', flat=True)), ['Blue', 'Red'])
+        products = {
+            name: (brand, color)
+            for name, brand, color in Product.objects.values_list('name', 'brand__name', 'color__name')
+        }
+        self.assertEqual(products, {
+            'Product 0': ('Nike', 'Red'),
+            'Product 1': ('Nike', 'Red'),
+            'Product 2': ('Nike', None),
+            'Product 3': ('Nike', None),
+            'Product 4': ('Old Navy', 'Red'),
+            'Product 5': (None, 'Blue'),
+        })
+
+    def test_backward_restores_the_merged_names(self):
+        self.migrate(AFTER)
+        apps = self.migrate(BEFORE)
+        Product = apps.get_model('store', 'Product')
+        self.assertEqual(
+            list(Product.objects.order_by('name').values_list('brand', 'color')),
+            [('Nike', 'Red'), ('Nike', 'Red'), ('Nike', None), ('Nike', None), ('Old Navy', 'Red'), (None, 'Blue')],
+        )
@@ -0,0 +1,153 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from store.cart import add_items, remove_items, set_quantities
+from store.models import Cart, CartItem, Category, Product, ProductVariant, Size
+
+
+def lines(cart):
+    return {
+        (product_id, variant_id): quantity
+        for product_id, variant_id, quantity in cart.items.values_list('product_id', 'variant_id', 'quantity')
+    }
+
+
+class CartMutationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.shirt = Product.objects.create(name='Shirt', price=Decimal('10.00'), category=category)
+        cls.hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=category)
+        cls.small = ProductVariant.objects.create(product=cls.shirt, size=Size.objects.create(name='S'))
+
+    def setUp(self):
+        self.cart = Cart.objects.create()
+
+    def test_add_items_increments_existing_lines(self):
+        add_items(self.cart.id, {(self.shirt.id, self.small.id): 1, (self.hat.id, None): 2})
+        add_items(self.cart.id, {(self.shirt.id, self.small.id): 3, (self.hat.id, None): 1, (self.shirt.id, None): 1})
+        self.assertEqual(lines(self.cart), {
+            (self.shirt.id, self.small.id): 4,
+            (self.hat.id, None): 3,
+            (self.shirt.id, None): 1,
+        })
+
+    def test_set_quantities_replaces_and_removes(self):
+        add_items(self.cart.id, {(self.shirt.id, self.small.id): 2, (self.hat.id, None): 2})
+        set_quantities(self.cart.id, {(self.shirt.id, self.small.id): 5, (self.hat.id, None): 0})
+        self.assertEqual(lines(self.cart), {(self.shirt.id, self.small.id): 5})
+        self.assertEqual(remove_items(self.cart.id, [(self.shirt.id, self.small.id), (self.hat.id, None)]), 1)
+        self.assertEqual(lines(self.cart), {})
+
+    def test_one_line_per_product_and_variant(self):
+        CartItem.objects.create(cart=self.cart, product=self.hat)
+        # A NULL variant still conflicts with another NULL variant
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=self.hat)
+        CartItem.objects.create(cart=self.cart, product=self.shirt, variant=self.small)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=self.cart, product=self.shirt, variant=self.small)
+
+    def test_one_cart_per_user(self):
+        user = User.objects.create_user('shopper')
+        Cart.objects.create(user=user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=user)
+
+
+class CartViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=category)
+        cls.user = User.objects.create_user('shopper')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        add_items(self.cart.id, {(self.hat.id, None): 1})
+        self.item = self.cart.items.get()
+        # Make the cart look long untouched
+        Cart.objects.filter(pk=self.cart.pk).update(updated_at=timezone.now() - timedelta(days=1))
+
+    def touched(self):
+        self.cart.refresh_from_db()
+        return self.cart.updated_at > timezone.now() - timedelta(minutes=1)
+
+    def test_update_sets_the_quantity_and_touches_the_cart(self):
+        self.client.post(reverse('update_cart', args=[self.item.id]), {'quantity': 4})
+        self.assertEqual(lines(self.cart), {(self.hat.id, None): 4})
+        self.assertTrue(self.touched())
+        self.assertEqual(self.client.get(reverse('cart_count')).json(), {'count': 4})
+
+        self.client.post(reverse('update_cart', args=[self.item.id]), {'quantity': 0})
+        self.assertEqual(lines(self.cart), {})
+
+    def test_remove_touches_the_cart(self):
+        self.client.post(reverse('remove_from_cart', args=[self.item.id]))
+        self.assertEqual(lines(self.cart), {})
+        self.assertTrue(self.touched())
+
+    def test_lines_of_other_carts_are_not_found(self):
+        self.client.force_login(User.objects.create_user('other'))
+        self.client.post(reverse('update_cart', args=[self.item.id]), {'quantity': 4})
+        self.client.post(reverse('remove_from_cart', args=[self.item.id]))
+        self.assertEqual(lines(self.cart), {(self.hat.id, None): 1})
+        self.assertFalse(self.touched())
+        # Neither request created a cart for the other user
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_anonymous_visitors_have_no_cart(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('cart_count')).json(), {'count': 0})
+        response = self.client.post(reverse('add_to_cart', args=[self.hat.id]))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('add_to_cart', args=[self.hat.id])}")
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_purge_deletes_old_carts_without_a_user(self):
+        old, recent = Cart.objects.create(), Cart.objects.create()
+        add_items(old.id, {(self.hat.id, None): 1})
+        Cart.objects.filter(pk__in=[old.pk, self.cart.pk]).update(updated_at=timezone.now() - timedelta(days=31))
+        out = StringIO()
+        call_command('purge_carts', '--days', '30', '--batch-size', '1', stdout=out)
+        self.assertIn('Deleted 1 abandoned carts with 1 lines', out.getvalue())
+        # Users' carts are kept however old
+        self.assertEqual(set(Cart.objects.all()), {self.cart, recent})
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    def test_concurrent_adds_are_not_lost(self):
+        category = Category.objects.create(name='Clothing')
+        hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=category)
+        cart = Cart.objects.create()
+        threads, adds = 4, 25
+        errors = []
+        start = threading.Barrier(threads)
+
+        def shopper():
+            try:
+                start.wait()
+                for _ in range(adds):
+                    add_items(cart.id, {(hat.id, None): 1})
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=shopper) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(lines(cart), {(hat.id, None): threads * adds})
@@ -0,0 +1,100 @@
+import threading
+from collections import Counter
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import DatabaseError
+from django.test import TestCase
+from django.urls import reverse
+
+from store.catalogue_cache import PRODUCT_CARD_FRAGMENT, get_version
+from store.counters import CacheCounterBuffer, MemoryCounterBuffer, counters, record_event, write_counts
+from store.models import Category, Product
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.shirt = Product.objects.create(name='Shirt', price=Decimal('10.00'), category=category)
+        cls.hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=category)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(counters.take)
+
+    def counts(self, product):
+        product.refresh_from_db()
+        return product.view_count, product.cart_add_count, product.wishlist_add_count, product.popularity
+
+    def test_write_counts_by_slug_and_pk(self):
+        write_counts({('view', self.shirt.slug): 3, ('cart_add', self.shirt.pk): 2, ('wishlist_add', self.hat.pk): 1})
+        write_counts({('view', self.shirt.slug): 1, ('view', 'no-such-product'): 5})
+        self.assertEqual(self.counts(self.shirt), (4, 2, 0, 4 + 2 * 5))
+        self.assertEqual(self.counts(self.hat), (0, 0, 1, 3))
+
+    def test_write_counts_drops_cached_cards_and_pages(self):
+        cards = [make_template_fragment_key(PRODUCT_CARD_FRAGMENT, [product.pk]) for product in (self.shirt, self.hat)]
+        cache.set_many(dict.fromkeys(cards, 'card'))
+        pages = get_version('pages')
+        write_counts({('view', self.shirt.slug): 1})
+        self.assertEqual(cache.get_many(cards), {cards[1]: 'card'})
+        self.assertNotEqual(get_version('pages'), pages)
+
+    def test_flush_sums_pending_increments(self):
+        buffer = MemoryCounterBuffer(interval=3600)
+        for _ in range(3):
+            buffer.incr('cart_add', self.hat.pk)
+        buffer.incr('view', self.hat.slug, 2)
+        self.assertEqual(self.counts(self.hat), (0, 0, 0, 0))
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self.counts(self.hat), (2, 3, 0, 17))
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_failed_flush_keeps_the_increments(self):
+        buffer = MemoryCounterBuffer(interval=3600)
+        buffer.incr('view', self.shirt.slug)
+        with mock.patch('store.counters.write_counts', side_effect=DatabaseError('locked')), \
+                self.assertLogs('store.counters', 'WARNING'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.incr('view', self.shirt.slug)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.counts(self.shirt)[0], 2)
+
+    def test_flushed_in_the_background_once_size_events_are_pending(self):
+        flushed = threading.Event()
+        written = []
+
+        def write(counts):
+            written.append(counts)
+            flushed.set()
+
+        buffer = MemoryCounterBuffer(interval=3600, size=3)
+        with mock.patch('store.counters.write_counts', write):
+            buffer.incr('view', 'shirt')
+            buffer.incr('view', 'hat', 2)
+            self.assertTrue(flushed.wait(5))
+        self.assertEqual(written, [Counter({('view', 'shirt'): 1, ('view', 'hat'): 2})])
+
+    def test_cache_buffer_moves_cached_counts(self):
+        buffer = CacheCounterBuffer(interval=3600)
+        buffer.incr('cart_add', self.shirt.pk, 2)
+        with mock.patch('store.counters.write_counts', side_effect=DatabaseError('locked')), \
+                self.assertLogs('store.counters', 'WARNING'):
+            self.assertEqual(buffer.flush(), 0)
+        # Another process' increments of the same key are moved along with these
+        CacheCounterBuffer(interval=3600).incr('cart_add', self.shirt.pk)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.counts(self.shirt)[1], 3)
+
+    def test_views_are_recorded_for_cached_pages_too(self):
+        counters.take()
+        url = reverse('product_detail', args=[self.shirt.slug])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Store-Cache'], 'hit')
+        self.client.get(reverse('product_detail', args=['no-such-product']))
+        self.assertEqual(counters.take(), Counter({('view', self.shirt.slug): 2}))
+        with self.assertRaises(ValueError):
+            record_event('purchase', self.shirt.pk)
@@ -0,0 +1,36 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from store.management.commands.explain_queries import Command
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite plan output')
+class SqlitePlanProblemTests(SimpleTestCase):
+    def problems(self, sql, *plan):
+        return Command().problems(sql, list(plan))
+
+    def test_scans_through_an_index_are_full_scans(self):
+        sql = 'SELECT "store_product"."color_id", COUNT(*) FROM "store_product" GROUP BY 1'
+        scans, sorts = self.problems(sql, 'SCAN store_product USING COVERING INDEX product_facets')
+        self.assertEqual(scans, ['full scan of store_product USING COVERING INDEX product_facets'])
+        self.assertEqual(self.problems(sql, 'SCAN store_product')[0], ['full scan of store_product'])
+
+    def test_aliases_resolve_to_their_tables(self):
+        sql = 'SELECT 1 FROM "store_product" WHERE "store_product"."id" IN (SELECT V0."id" FROM "store_product" V0)'
+        scans, sorts = self.problems(sql, 'SCAN V0 USING COVERING INDEX product_color_newest')
+        self.assertEqual(scans, ['full scan of store_product USING COVERING INDEX product_color_newest'])
+        sql = 'SELECT 1 FROM "store_color" U1'
+        self.assertEqual(self.problems(sql, 'SCAN U1'), ([], []))
+
+    def test_limited_index_walks_and_fts_matches_are_index_served(self):
+        sql = 'SELECT "store_product"."id" FROM "store_product" ORDER BY "store_product"."price" LIMIT 21'
+        self.assertEqual(self.problems(sql, 'SCAN store_product USING INDEX product_price'), ([], []))
+        # Sorting first means every row is read before the LIMIT applies
+        scans, sorts = self.problems(sql, 'SCAN store_product USING INDEX product_color', 'USE TEMP B-TREE FOR ORDER BY')
+        self.assertEqual(scans, ['full scan of store_product USING INDEX product_color'])
+        self.assertEqual(sorts, ['sort of an unbounded row set'])
+
+        sql = 'SELECT rowid FROM "store_product_fts" WHERE "store_product_fts" MATCH %s'
+        self.assertEqual(self.problems(sql, 'SCAN store_product_fts VIRTUAL TABLE INDEX 0:M4'), ([], []))
@@ -0,0 +1,69 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+
+from store import images
+from store.catalogue_cache import PRODUCT_CARD_FRAGMENT, get_version
+from store.models import Category, Product
+
+
+def upload(name='shirt.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), 'navy').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ManifestCacheTests(TransactionTestCase):
+    """Manifests are stored with update(), so the caches must be dropped by hand"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        category = Category.objects.create(name='Clothing')
+        self.product = Product.objects.create(name='Shirt', price=Decimal('10.00'), category=category)
+        self.card = make_template_fragment_key(PRODUCT_CARD_FRAGMENT, [self.product.pk])
+
+    def test_cards_rendered_while_derivatives_generate_are_dropped(self):
+        generate = images.generate_derivatives
+
+        def render_meanwhile(*args):
+            # A listing caches the card between reset_product_cache and the manifest UPDATE
+            cache.set(self.card, 'card without the image')
+            return generate(*args)
+
+        self.product.image = upload()
+        with mock.patch('store.images.generate_derivatives', render_meanwhile):
+            self.product.save()
+
+        self.assertIsNone(cache.get(self.card))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_manifest['source'], self.product.image.name)
+
+    def test_backfill_drops_cards_and_pages(self):
+        self.product.image = upload()
+        self.product.save()
+        Product.objects.update(image_manifest=None)
+        cache.set(self.card, 'card without the image')
+        pages = get_version('pages')
+
+        # Workers in threads, so they see the temporary MEDIA_ROOT
+        with mock.patch('store.management.commands.generate_image_derivatives.ProcessPoolExecutor', ThreadPoolExecutor):
+            call_command('generate_image_derivatives', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+
+        self.assertIsNone(cache.get(self.card))
+        self.assertNotEqual(get_version('pages'), pages)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_manifest['source'], self.product.image.name)
@@ -0,0 +1,89 @@
+import csv
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from store.models import Product, ProductVariant
+
+COLUMNS = ['sku', 'parent_sku', 'name', 'price', 'category', 'subcategory', 'brand', 'color', 'size']
+
+
+class ImportCatalogueTests(TestCase):
+    def run_import(self, rows, chunk_size=1000):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as source:
+            writer = csv.DictWriter(source, COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        self.addCleanup(os.remove, source.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_catalogue', source.name, '--skip-images', '--chunk-size', str(chunk_size),
+            stdout=stdout, stderr=stderr,
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def product(self, sku, price='19.99'):
+        return {'sku': sku, 'name': f'Shirt {sku}', 'price': price, 'category': 'Clothing'}
+
+    def variant(self, sku, parent, size='M', color='Red'):
+        return {'sku': sku, 'parent_sku': parent, 'size': size, 'color': color}
+
+    def test_invalid_prices_are_skipped(self):
+        stdout, stderr = self.run_import([
+            self.product('OK', '19.99'),
+            self.product('NAN', 'NaN'),
+            self.product('INF', 'Infinity'),
+            self.product('WIDE', '123456789012.5'),
+            self.product('PRECISE', '1.999'),
+            self.product('TEXT', 'free'),
+        ])
+        self.assertEqual(list(Product.objects.values_list('sku', 'price')), [('OK', Decimal('19.99'))])
+        for sku in ('NAN', 'INF', 'WIDE', 'PRECISE', 'TEXT'):
+            self.assertIn(f'Skipping row {sku}', stderr)
+        self.assertIn('Imported 1 products and 0 variants', stdout)
+        self.assertIn('5 invalid rows', stdout)
+
+    def test_invalid_variant_price_is_skipped(self):
+        _, stderr = self.run_import([self.product('P1'), {**self.variant('P1-M', 'P1'), 'price': 'NaN'}])
+        self.assertFalse(ProductVariant.objects.exists())
+        self.assertIn('Skipping row P1-M', stderr)
+
+    def test_counts_products_and_variants(self):
+        stdout, _ = self.run_import([
+            self.product('P1'),
+            self.variant('P1-M', 'P1', size='M'),
+            self.variant('P1-L', 'P1', size='L'),
+        ])
+        self.assertIn('Imported 1 products and 2 variants', stdout)
+        self.assertEqual(ProductVariant.objects.count(), 2)
+
+    def test_option_taken_in_the_same_chunk(self):
+        stdout, stderr = self.run_import([
+            self.product('P1'),
+            self.variant('P1-A', 'P1'),
+            self.variant('P1-B', 'P1'),
+        ])
+        self.assertEqual(list(ProductVariant.objects.values_list('sku', flat=True)), ['P1-A'])
+        self.assertIn('Skipping row P1-B: P1 already has this size and color as P1-A', stderr)
+        self.assertIn('1 invalid rows', stdout)
+
+    def test_option_taken_in_an_earlier_chunk(self):
+        stdout, stderr = self.run_import([
+            self.product('P1'),
+            self.variant('P1-A', 'P1'),
+            self.variant('P1-B', 'P1'),
+            self.variant('P1-C', 'P1', size='L'),
+        ], chunk_size=2)
+        self.assertEqual(sorted(ProductVariant.objects.values_list('sku', flat=True)), ['P1-A', 'P1-C'])
+        self.assertIn('Skipping row P1-B', stderr)
+        self.assertIn('Imported 1 products and 2 variants', stdout)
+
+    def test_reimported_variant_keeps_its_option(self):
+        self.run_import([self.product('P1'), self.variant('P1-A', 'P1')])
+        _, stderr = self.run_import([{**self.variant('P1-A', 'P1'), 'price': '25.00'}])
+        self.assertEqual(stderr, '')
+        self.assertEqual(ProductVariant.objects.get(sku='P1-A').price, Decimal('25.00'))
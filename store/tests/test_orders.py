@@ -0,0 +1,128 @@
+import threading
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from store.cart import add_items
+from store.models import Cart, CartItem, Category, Order, Product, ProductVariant, Size
+from store.orders import EmptyCart, InsufficientStock, OptionRequired, place_order
+
+
+class PlaceOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.shirt = Product.objects.create(name='Shirt', price=Decimal('20.00'), category=category)
+        cls.small = ProductVariant.objects.create(
+            product=cls.shirt, size=Size.objects.create(name='S'), price=Decimal('22.50'), stock=3,
+        )
+        cls.hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=category, stock=10)
+        cls.scarf = Product.objects.create(name='Scarf', price=Decimal('8.00'), category=category)  # Untracked stock
+        cls.user = User.objects.create_user('shopper')
+
+    def setUp(self):
+        self.cart = Cart.objects.create(user=self.user)
+
+    def stock(self, obj):
+        obj.refresh_from_db()
+        return obj.stock
+
+    def test_order_snapshots_lines_and_reserves_stock(self):
+        add_items(self.cart.id, {(self.shirt.id, self.small.id): 2, (self.hat.id, None): 4, (self.scarf.id, None): 1})
+        order, created = place_order(self.user, self.cart, 'key-1')
+
+        self.assertTrue(created)
+        self.assertEqual(order.total, Decimal('73.00'))
+        self.assertEqual(
+            sorted(order.lines.values_list('product_name', 'unit_price', 'quantity')),
+            [('Hat', Decimal('5.00'), 4), ('Scarf', Decimal('8.00'), 1), ('Shirt (S)', Decimal('22.50'), 2)],
+        )
+        self.assertEqual((self.stock(self.small), self.stock(self.hat), self.stock(self.scarf)), (1, 6, None))
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_oversold_line_rolls_everything_back(self):
+        add_items(self.cart.id, {(self.shirt.id, self.small.id): 4, (self.hat.id, None): 1})
+        with self.assertRaises(InsufficientStock) as raised:
+            place_order(self.user, self.cart, 'key-1')
+
+        self.assertEqual(raised.exception.products, ['Shirt (S)'])
+        self.assertEqual((self.stock(self.small), self.stock(self.hat)), (3, 10))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+
+    def test_resubmitted_key_returns_the_placed_order(self):
+        add_items(self.cart.id, {(self.hat.id, None): 2})
+        order, created = place_order(self.user, self.cart, 'key-1')
+        # A double click arrives after the cart was refilled
+        add_items(self.cart.id, {(self.hat.id, None): 2})
+        again, created_again = place_order(self.user, self.cart, 'key-1')
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again, order)
+        self.assertEqual(self.stock(self.hat), 8)
+        self.assertEqual(Order.objects.count(), 1)
+
+        # Another key is another order
+        self.assertTrue(place_order(self.user, self.cart, 'key-2')[1])
+        self.assertEqual(self.stock(self.hat), 6)
+
+    def test_empty_cart_and_missing_option(self):
+        with self.assertRaises(EmptyCart):
+            place_order(self.user, self.cart, 'key-1')
+        # The shirt is sold in sizes; a line without one cannot be bought
+        add_items(self.cart.id, {(self.shirt.id, None): 1})
+        with self.assertRaises(OptionRequired):
+            place_order(self.user, self.cart, 'key-2')
+        self.assertFalse(Order.objects.exists())
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_stock_rows_are_locked_in_key_order(self):
+        add_items(self.cart.id, {(self.scarf.id, None): 1, (self.hat.id, None): 1})
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.user, self.cart, 'key-1')
+        locks = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT "store_product"."id" FROM "store_product"') and 'FOR UPDATE' in query['sql']
+        ]
+        self.assertEqual(len(locks), 1)
+        self.assertIn('ORDER BY "store_product"."id" ASC', locks[0])
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_last_units_are_sold_once(self):
+        category = Category.objects.create(name='Clothing')
+        hat = Product.objects.create(name='Hat', price=Decimal('5.00'), category=category, stock=3)
+        carts = []
+        for n in range(6):
+            cart = Cart.objects.create(user=User.objects.create_user(f'shopper{n}'))
+            add_items(cart.id, {(hat.id, None): 1})
+            carts.append(cart)
+        results = []
+        start = threading.Barrier(len(carts))
+
+        def checkout(cart):
+            try:
+                start.wait()
+                place_order(cart.user, cart, 'key')
+                results.append('placed')
+            except InsufficientStock:
+                results.append('short')
+            except Exception as e:
+                results.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=checkout, args=[cart]) for cart in carts]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(sorted(results, key=str), ['placed'] * 3 + ['short'] * 3)
+        hat.refresh_from_db()
+        self.assertEqual(hat.stock, 0)
+        self.assertEqual(Order.objects.count(), 3)
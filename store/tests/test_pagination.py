@@ -0,0 +1,80 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from store.models import Category, Product
+from store.pagination import SORT_ORDERS, encode_cursor, paginate
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {n}', slug=f'product-{n}', category=category,
+                # Few distinct values, so most pages break inside a run of equal keys
+                price=Decimal(10 + n % 3), rating_avg=n % 2, popularity=n % 4,
+            )
+            for n in range(23)
+        ])
+        now = timezone.now()
+        for n, product in enumerate(Product.objects.order_by('id')):
+            # Some products share a timestamp and a few have none (sorted last)
+            created_at = None if n % 7 == 0 else now - timedelta(minutes=n // 2)
+            Product.objects.filter(pk=product.pk).update(created_at=created_at)
+
+    def page(self, sort, cursor=None):
+        params = {'sort': sort, 'per_page': 5}
+        if cursor:
+            params['cursor'] = cursor
+        return paginate(Product.objects.all(), RequestFactory().get('/', params))
+
+    def expected_order(self, sort):
+        products = list(Product.objects.all())
+        for order in reversed(SORT_ORDERS[sort]):
+            name = order.lstrip('-')
+            # NULLs sort last in either direction
+            products.sort(key=lambda product: getattr(product, name) is None)
+            present = [product for product in products if getattr(product, name) is not None]
+            present.sort(key=lambda product: getattr(product, name), reverse=order.startswith('-'))
+            products = present + [product for product in products if getattr(product, name) is None]
+        return [product.id for product in products]
+
+    def test_walk_forward_and_back(self):
+        for sort in SORT_ORDERS:
+            with self.subTest(sort=sort):
+                pages = [self.page(sort)]
+                self.assertFalse(pages[0].has_previous)
+                while pages[-1].has_next:
+                    pages.append(self.page(sort, pages[-1].next_cursor))
+                forward = [[product.id for product in page] for page in pages]
+                self.assertEqual(sum(forward, []), self.expected_order(sort))
+
+                # Previous cursors lead back through exactly the same pages
+                backward = [forward[-1]]
+                page = pages[-1]
+                while page.has_previous:
+                    page = self.page(sort, page.previous_cursor)
+                    backward.append([product.id for product in page])
+                self.assertEqual(backward[::-1], forward)
+
+    def test_rows_added_while_browsing(self):
+        first = self.page('price_asc')
+        # A product sorting before the cursor neither shifts nor repeats later pages
+        Product.objects.create(name='Cheap', category=Category.objects.get(), price=Decimal('1.00'))
+        second = self.page('price_asc', first.next_cursor)
+        self.assertFalse({product.id for product in first} & {product.id for product in second})
+        self.assertEqual(
+            [product.id for product in second],
+            [pk for pk in self.expected_order('price_asc') if pk not in {product.id for product in first}][1:6],
+        )
+
+    def test_invalid_cursors_restart(self):
+        first = [product.id for product in self.page('newest')]
+        other_sort = encode_cursor('price_asc', 'next', [10, 1])
+        for cursor in ('garbage', other_sort):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([product.id for product in self.page('newest', cursor)], first)
@@ -0,0 +1,131 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from store.cart import add_items
+from store.counters import counters
+from store.instrumentation import QueryBudgetExceeded, check_query_budget
+from store.models import Brand, Cart, Category, Color, Order, Product, ProductVariant, Review, Size, Subcategory, UserProfile
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'store-tests'}}
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+@override_settings(STORE_QUERY_BUDGET_STRICT=True)
+class CheckQueryBudgetTests(TransactionTestCase):
+    @override_settings(STORE_QUERY_BUDGETS={'view': 2, 'form': {'GET': 1, 'POST': 3}})
+    def test_overruns(self):
+        check_query_budget('view', 2)
+        check_query_budget('form', 3, 'POST')
+        check_query_budget('unbudgeted', 100)
+        with self.assertRaises(QueryBudgetExceeded):
+            check_query_budget('view', 3)
+        with self.assertRaises(QueryBudgetExceeded):
+            check_query_budget('form', 2, 'GET')
+        # A POST may already have committed its writes; logged, not raised
+        with self.assertLogs('store.instrumentation', 'ERROR'):
+            check_query_budget('form', 4, 'POST')
+
+
+# Transactions commit as in production: inside TestCase's wrapping
+# transaction every atomic block would add SAVEPOINT/RELEASE queries
+@override_settings(STORE_QUERY_BUDGET_STRICT=True, CACHES=LOCMEM_CACHES)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Requests every budgeted route, cold and then warm, as a visitor and as a
+    member; a route over its STORE_QUERY_BUDGETS entry raises
+    QueryBudgetExceeded out of the test client.
+    """
+
+    def setUp(self):
+        cache.clear()
+        # Page views are counted in memory; drop them with the test database
+        self.addCleanup(counters.take)
+        self.category = Category.objects.create(name='Clothing')
+        self.subcategory = Subcategory.objects.create(name='Shirts', category=self.category)
+        brand = Brand.objects.create(name='Acme')
+        small, large = Size.objects.create(name='S'), Size.objects.create(name='L')
+        red, blue = Color.objects.create(name='Red'), Color.objects.create(name='Blue')
+        self.products = [
+            Product.objects.create(
+                name=f'Cotton shirt {n}', price=Decimal('10.00') + n, stock=50, category=self.category,
+                subcategory=self.subcategory, brand=brand, color=red if n % 2 else blue,
+            )
+            for n in range(6)
+        ]
+        self.product = self.products[0]
+        self.variant = ProductVariant.objects.create(product=self.product, size=small, color=red, stock=20)
+        ProductVariant.objects.create(product=self.product, size=large, color=blue, stock=20)
+
+        self.user = User.objects.create_user('member', password='secret')
+        profile = UserProfile.objects.create(user=self.user)
+        profile.wishlist.add(*self.products[1:4])
+        for n, product in enumerate(self.products[1:4]):
+            Review.objects.create(product=product, user=self.user, rating=n + 2, comment='Fits well')
+        for n in range(3):
+            reviewer = User.objects.create_user(f'reviewer{n}')
+            Review.objects.create(product=self.product, user=reviewer, rating=n + 3, comment='Nice')
+        cart = Cart.objects.create(user=self.user)
+        add_items(cart.id, {(self.product.id, self.variant.id): 1, (self.products[1].id, None): 2})
+
+    def assertWithinBudget(self, client, url):
+        # Cold caches first, then the steady state
+        for _ in range(2):
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+    def member(self):
+        client = self.client_class()
+        client.force_login(self.user)
+        return client
+
+    def test_catalogue(self):
+        member = self.member()
+        for client in (self.client, member):
+            for url in (
+                reverse('home'),
+                reverse('home') + '?q=cotton',
+                reverse('home') + f'?category={self.category.id}&sort=price_asc',
+                reverse('category', args=[self.category.slug]),
+                reverse('subcategory', args=[self.subcategory.slug]),
+                self.product.get_absolute_url(),
+                self.products[1].get_absolute_url(),
+                reverse('cart_count'),
+            ):
+                with self.subTest(url=url, member=client is member):
+                    self.assertWithinBudget(client, url)
+
+    def test_account(self):
+        member = self.member()
+        for url in (reverse('dashboard'), reverse('cart'), reverse('checkout')):
+            with self.subTest(url=url):
+                self.assertWithinBudget(member, url)
+
+    def test_api(self):
+        for url in (
+            reverse('api_products'),
+            reverse('api_products') + '?q=cotton',
+            reverse('api_product', args=[self.product.slug]),
+            reverse('api_product_reviews', args=[self.product.slug]),
+            reverse('api_facets'),
+        ):
+            with self.subTest(url=url):
+                self.assertWithinBudget(self.client, url)
+
+    def test_checkout(self):
+        member = self.member()
+        self.assertWithinBudget(member, reverse('cart'))
+        # POST overruns are logged rather than raised
+        with self.assertNoLogs('store.instrumentation', 'WARNING'):
+            response = member.post(reverse('checkout'), {'idempotency_key': 'a' * 32})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.get(user=self.user).lines.count(), 2)
+
+
+# Every cached read falls through to the database: the worst case
+@override_settings(CACHES=DUMMY_CACHES)
+class ColdCacheQueryBudgetTests(QueryBudgetTests):
+    pass
@@ -0,0 +1,71 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from store.models import Category, Product, Review
+from store.ratings import drifted_products
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.shirt = Product.objects.create(name='Shirt', price=Decimal('20.00'), category=category)
+        cls.jacket = Product.objects.create(name='Jacket', price=Decimal('80.00'), category=category)
+        cls.users = [User.objects.create_user(f'user{n}') for n in range(3)]
+
+    def assertRating(self, product, count, total):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum), (count, total))
+        self.assertAlmostEqual(product.rating_avg, total / count if count else 0)
+
+    def review(self, user, product, rating):
+        return Review.objects.create(user=user, product=product, rating=rating)
+
+    def test_create_edit_move_and_delete(self):
+        first = self.review(self.users[0], self.shirt, 5)
+        self.review(self.users[1], self.shirt, 2)
+        self.assertRating(self.shirt, 2, 7)
+
+        # Edited through a fresh instance, as the views and admin do
+        review = Review.objects.get(pk=first.pk)
+        review.rating = 3
+        review.save()
+        self.assertRating(self.shirt, 2, 5)
+
+        review.product = self.jacket
+        review.save()
+        self.assertRating(self.shirt, 1, 2)
+        self.assertRating(self.jacket, 1, 3)
+
+        Review.objects.get(pk=first.pk).delete()
+        self.assertRating(self.jacket, 0, 0)
+
+    def test_reconcile_drifted_aggregates(self):
+        self.review(self.users[0], self.shirt, 4)
+        # Bulk writes skip the signals that maintain the aggregates
+        Review.objects.bulk_create([
+            Review(user=self.users[1], product=self.shirt, rating=2),
+            Review(user=self.users[2], product=self.jacket, rating=5),
+        ])
+        self.assertEqual(set(drifted_products()), {self.shirt, self.jacket})
+
+        stdout = StringIO()
+        call_command('reconcile_ratings', '--dry-run', stdout=stdout)
+        self.assertIn('Found 2 products', stdout.getvalue())
+        self.assertRating(self.shirt, 1, 4)
+
+        call_command('reconcile_ratings', '--batch-size', '1', stdout=StringIO())
+        self.assertRating(self.shirt, 2, 6)
+        self.assertRating(self.jacket, 1, 5)
+        self.assertFalse(drifted_products().exists())
+
+    def test_reconcile_products_that_lost_their_reviews(self):
+        self.review(self.users[0], self.shirt, 4)
+        Review.objects.all()._raw_delete(Review.objects.db)
+        self.assertEqual(list(drifted_products()), [self.shirt])
+        call_command('reconcile_ratings', stdout=StringIO())
+        self.assertRating(self.shirt, 0, 0)
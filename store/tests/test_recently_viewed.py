@@ -0,0 +1,60 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from store.models import Category, Product, RecentlyViewed
+from store.recently_viewed import PRUNE_EVERY, RECENTLY_VIEWED_LIMIT, get_recently_viewed, prune, record_view
+
+
+class RecentlyViewedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Product {n}', slug=f'product-{n}', price=Decimal('10.00'), category=category)
+            for n in range(RECENTLY_VIEWED_LIMIT + PRUNE_EVERY)
+        ])
+        cls.user = User.objects.create_user('viewer')
+
+    def setUp(self):
+        cache.clear()
+        # A distinct timestamp per view, one second apart
+        start = timezone.now()
+        ticks = iter(range(10000))
+        patcher = mock.patch('django.utils.timezone.now', lambda: start + timedelta(seconds=next(ticks)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def viewed(self):
+        return [view.product for view in get_recently_viewed(self.user, limit=100)]
+
+    def test_repeat_views_move_the_product_to_the_front(self):
+        first, second = self.products[:2]
+        for product in (first, second, first):
+            record_view(self.user, product)
+        self.assertEqual(self.viewed(), [first, second])
+        self.assertEqual(RecentlyViewed.objects.filter(user=self.user).count(), 2)
+
+    def test_pruned_every_prune_every_views(self):
+        for product in self.products[:-1]:
+            record_view(self.user, product)
+        # Between prunes a user holds at most LIMIT + PRUNE_EVERY rows
+        self.assertEqual(len(self.viewed()), RECENTLY_VIEWED_LIMIT + PRUNE_EVERY - 1)
+
+        record_view(self.user, self.products[-1])
+        self.assertEqual(self.viewed(), self.products[::-1][:RECENTLY_VIEWED_LIMIT])
+
+    def test_prune_keeps_the_latest(self):
+        other = User.objects.create_user('other')
+        for product in self.products[:5]:
+            record_view(self.user, product)
+            record_view(other, product)
+        prune(self.user, limit=2)
+        self.assertEqual(self.viewed(), [self.products[4], self.products[3]])
+        # Other users' history is untouched
+        self.assertEqual(RecentlyViewed.objects.filter(user=other).count(), 5)
@@ -0,0 +1,71 @@
+import re
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections, router
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.counters import counters
+from store.models import Category, Product
+from store.routers import ReplicaRouter, replica_reads
+
+# A second alias mirroring the test database, standing in for a replica. It
+# must exist before the test runner checks and sets up databases, and is not
+# named replica_* so the router only sends reads to it in these tests
+REPLICA = 'standby'
+connections.settings[REPLICA] = {
+    **connections.settings['default'],
+    'TEST': {**connections.settings['default']['TEST'], 'MIRROR': 'default'},
+}
+
+CATALOGUE_READ = re.compile(r'FROM "store_(product|review|category|subcategory)"')
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        replica_router = next(r for r in router.routers if isinstance(r, ReplicaRouter))
+        patcher = mock.patch.object(replica_router, 'replicas', [REPLICA])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.addCleanup(counters.take)
+        category = Category.objects.create(name='Clothing')
+        self.product = Product.objects.create(name='Shirt', price=Decimal('10.00'), category=category)
+        self.url = reverse('product_detail', args=[self.product.slug])
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [q['sql'] for q in primary], [q['sql'] for q in replica]
+
+    def test_catalogue_reads_go_to_the_replica(self):
+        primary, replica = self.get(self.url)
+        self.assertTrue(any('FROM "store_product"' in sql for sql in replica))
+        self.assertTrue(any('FROM "store_review"' in sql for sql in replica))
+        self.assertFalse(any(CATALOGUE_READ.search(sql) for sql in primary))
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        self.client.force_login(User.objects.create_user('shopper'))
+        primary, replica = self.get(self.url)
+        # The product is read before the view is recorded, the reviews after
+        self.assertTrue(any('FROM "store_product"' in sql for sql in replica))
+        self.assertTrue(any('INSERT INTO "store_recentlyviewed"' in sql for sql in primary))
+        self.assertTrue(any('FROM "store_review"' in sql for sql in primary))
+        self.assertFalse(any('store_review' in sql or not sql.startswith('SELECT') for sql in replica))
+
+    def test_other_views_and_later_reads_use_the_primary(self):
+        self.client.force_login(User.objects.create_user('shopper'))
+        primary, replica = self.get(reverse('cart'))
+        self.assertEqual(replica, [])
+
+        self.get(self.url)
+        self.assertFalse(replica_reads.get())
+        self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertEqual(router.db_for_write(Product), 'default')
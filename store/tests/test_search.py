@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from store.models import Brand, Category, Product
+from store.search import build_match_query, search_products
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Shoes')
+        cls.nike = Brand.objects.create(name='Nike')
+        cls.sneakers = cls.create('Running sneakers', brand=cls.nike)
+        cls.boots = cls.create('Leather boots', description='Sturdy enough for running errands')
+        cls.sandals = cls.create('Beach sandals')
+
+    @classmethod
+    def create(cls, name, description='', **fields):
+        return Product.objects.create(name=name, description=description, price=Decimal('50.00'), category=cls.category, **fields)
+
+    def search(self, query, queryset=None):
+        results = search_products(Product.objects.all() if queryset is None else queryset, query)
+        return list(results.order_by('search_rank', 'id'))
+
+    def test_build_match_query(self):
+        self.assertEqual(build_match_query('Red shoe'), '("red" OR "red"*) AND ("shoe" OR "shoe"*)')
+        # Punctuation never reaches the FTS5 query syntax
+        self.assertEqual(build_match_query('"*) OR'), '("or" OR "or"*)')
+        self.assertEqual(build_match_query('!!'), '')
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('running'), [self.sneakers, self.boots])
+
+    def test_prefix_and_stemmed_terms(self):
+        self.assertEqual(self.search('snea'), [self.sneakers])
+        self.assertEqual(self.search('run'), [self.sneakers, self.boots])
+        self.assertEqual(self.search('sandal'), [self.sandals])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('nike running'), [self.sneakers])
+        self.assertEqual(self.search('nike boots'), [])
+
+    def test_blank_query_matches_nothing(self):
+        self.assertEqual(self.search('  ?! '), [])
+
+    def test_composes_with_filters(self):
+        queryset = Product.objects.exclude(pk=self.sneakers.pk)
+        self.assertEqual(self.search('running', queryset), [self.boots])
+        self.assertEqual(search_products(Product.objects.all(), 'running').count(), 2)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.sandals.name = 'Beach flip flops'
+        self.sandals.save()
+        self.assertEqual(self.search('sandals'), [])
+        self.assertEqual(self.search('flip'), [self.sandals])
+
+        self.nike.name = 'Adidas'
+        self.nike.save()
+        self.assertEqual(self.search('adidas'), [self.sneakers])
+
+        self.sneakers.delete()
+        self.assertEqual(self.search('running'), [self.boots])
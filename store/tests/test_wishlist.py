@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from store.counters import counters
+from store.models import Category, Product, UserProfile
+from store.wishlist import (
+    add_wishlist_item, is_wishlisted, remove_wishlist_item, toggle_wishlist_item, wishlist_products, wishlisted_ids,
+)
+
+
+class WishlistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Clothing')
+        cls.shirt, cls.hat, cls.scarf = [
+            Product.objects.create(name=name, price=Decimal('10.00'), category=category)
+            for name in ('Shirt', 'Hat', 'Scarf')
+        ]
+        cls.user = User.objects.create_user('shopper')
+        UserProfile.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.addCleanup(counters.take)
+
+    def test_add_and_remove(self):
+        self.assertTrue(add_wishlist_item(self.user, self.shirt.id))
+        self.assertFalse(add_wishlist_item(self.user, self.shirt.id))
+        self.assertTrue(is_wishlisted(self.user, self.shirt.id))
+        self.assertTrue(remove_wishlist_item(self.user, self.shirt.id))
+        self.assertFalse(remove_wishlist_item(self.user, self.shirt.id))
+        self.assertFalse(is_wishlisted(self.user, self.shirt.id))
+
+    def test_user_without_a_profile(self):
+        # e.g. created with createsuperuser rather than through registration
+        user = User.objects.create_user('admin')
+        self.assertFalse(is_wishlisted(user, self.shirt.id))
+        self.assertEqual(list(wishlist_products(user)), [])
+        self.assertTrue(add_wishlist_item(user, self.shirt.id))
+        self.assertTrue(UserProfile.objects.filter(user=user).exists())
+        self.assertFalse(add_wishlist_item(user, self.shirt.id))
+        self.assertEqual(list(wishlist_products(user)), [self.shirt])
+
+    def test_toggle(self):
+        self.assertTrue(toggle_wishlist_item(self.user, self.hat.id))
+        self.assertFalse(toggle_wishlist_item(self.user, self.hat.id))
+        self.assertFalse(is_wishlisted(self.user, self.hat.id))
+
+    def test_membership_of_a_listing_in_one_query(self):
+        other = User.objects.create_user('other')
+        add_wishlist_item(other, self.scarf.id)
+        add_wishlist_item(self.user, self.shirt.id)
+        add_wishlist_item(self.user, self.hat.id)
+        with self.assertNumQueries(1):
+            ids = wishlisted_ids(self.user, [self.shirt.id, self.scarf.id])
+        self.assertEqual(ids, {self.shirt.id})
+        self.assertEqual(set(wishlist_products(self.user)), {self.shirt, self.hat})
+
+    def test_toggle_view(self):
+        self.client.force_login(self.user)
+        url = reverse('toggle_wishlist', args=[self.hat.id])
+        self.assertEqual(self.client.post(url).json(), {'product_id': self.hat.id, 'wishlisted': True})
+        self.assertEqual(self.client.post(url).json(), {'product_id': self.hat.id, 'wishlisted': False})
+        self.assertEqual(self.client.post(reverse('toggle_wishlist', args=[0])).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 405)
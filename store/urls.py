@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -21,6 +21,7 @@ urlpatterns = [
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/update/<int:item_id>/', views.update_cart, name='update_cart'),
+    path('cart/update/', views.update_cart_lines, name='update_cart_lines'),
     path('cart/count/', views.cart_count, name='cart_count'),
     
     # Reviews
@@ -29,7 +30,16 @@ urlpatterns = [
     # Wishlist
     path('wishlist/add/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('wishlist/remove/<int:product_id>/', views.remove_from_wishlist, name='remove_from_wishlist'),
+    path('wishlist/toggle/<int:product_id>/', views.toggle_wishlist, name='toggle_wishlist'),
     
     # Checkout simulation
     path('checkout/', views.checkout, name='checkout'),
+
+    # Read-only JSON API
+    path('api/products/', api.product_list, name='api_products'),
+    path('api/products/<slug:slug>/', api.product_item, name='api_product'),
+    path('api/products/<slug:slug>/reviews/', api.product_reviews, name='api_product_reviews'),
+    path('api/export/products/', api.product_export, name='api_product_export'),
+    path('api/categories/', api.category_list, name='api_categories'),
+    path('api/facets/', api.facet_counts, name='api_facets'),
 ]
\ No newline at end of file
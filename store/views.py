@@ -4,162 +4,172 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Avg, Sum
 from django.http import JsonResponse
-from .models import Category, Subcategory, Product, Review, Cart, CartItem, UserProfile, RecentlyViewed
+from django.views.decorators.http import require_POST
+from .models import Category, Subcategory, Product, ProductVariant, Review, Cart, CartItem, UserProfile, Order
 from .forms import UserRegistrationForm, LoginForm, UserUpdateForm, ProfileUpdateForm, ReviewForm
+from .pagination import paginate, SORT_ORDERS, DEFAULT_SORT
+from .search import search_products, RELEVANCE_SORT
+from .filters import get_product_filters, apply_product_filters
+from .facets import get_facets
+from .attributes import attribute_names
+from .catalogue_cache import cache_anonymous_page
+from .cart import get_cart, get_cart_snapshot, get_cart_count, update_cart_count, add_items, set_quantities, remove_items, get_cart_line
+from .recently_viewed import record_view, get_recently_viewed
+from .recommendations import get_recommendations
+from .counters import record_event, count_product_view
+from .orders import place_order, InsufficientStock, EmptyCart, OptionRequired
+from .wishlist import add_wishlist_item, remove_wishlist_item, toggle_wishlist_item, is_wishlisted, wishlisted_ids, wishlist_products
 import random
+import uuid
 from django.conf import settings  # Import settings to access DEBUG
 
-def get_cart(request):
-    """Get or create cart for the current session"""
-    if request.user.is_authenticated:
-        # For authenticated users, get or create user-specific cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        return cart
-    
-    # For anonymous users, use session-based cart
-    cart_id = request.session.get('cart_id')
-    if cart_id:
-        try:
-            return Cart.objects.get(id=cart_id)
-        except Cart.DoesNotExist:
-            pass
-    
-    # Create new cart
-    cart = Cart.objects.create()
-    request.session['cart_id'] = str(cart.id)
-    return cart
-
 def cart_count(request):
     """View to get cart count for AJAX requests"""
     try:
-        cart = get_cart(request)
-        count = cart.items.aggregate(total=Sum('quantity'))['total'] or 0
-        return JsonResponse({'count': count})
+        return JsonResponse({'count': get_cart_count(request)})
     except Exception:
         return JsonResponse({'count': 0})
 
-def home(request):
-    query = request.GET.get('q', '')
-    category_id = request.GET.get('category')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    brand = request.GET.get('brand')
-    color = request.GET.get('color')
-    size = request.GET.get('size')
-
-    products = Product.objects.all().prefetch_related('reviews')
-    
-    # Initialize filter lists
-    categories = Category.objects.all()
-    brands = []
-    colors = []
-    sizes = []
-    
-    try:
-        brands = Product.objects.exclude(brand__isnull=True).exclude(brand__exact='').values_list('brand', flat=True).distinct()
-        colors = Product.objects.exclude(color__isnull=True).exclude(color__exact='').values_list('color', flat=True).distinct()
-        sizes = Product.objects.exclude(size__isnull=True).exclude(size__exact='').values_list('size', flat=True).distinct()
-    except Exception as e:
-        # Use settings.DEBUG instead of DEBUG
-        if settings.DEBUG:
-            messages.warning(request, f"Database error: {str(e)}")
+def product_listing_json(page):
+    """Serialize a page of products for the JSON variant of the listing views"""
+    names = {field: attribute_names(field) for field in ('brand', 'color', 'size')}
+    return JsonResponse({
+        'products': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'slug': product.slug,
+                'url': product.get_absolute_url(),
+                'price': str(product.price),
+                'brand': names['brand'].get(product.brand_id),
+                'color': names['color'].get(product.color_id),
+                'size': names['size'].get(product.size_id),
+                'rating': product.rating_avg,
+                'rating_count': product.rating_count,
+                'image': product.image.url if product.image else None,
+            }
+            for product in page
+        ],
+        'sort': page.sort,
+        'per_page': page.page_size,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
 
-    if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+def render_product_listing(request, products, context, sort_orders=SORT_ORDERS, default_sort=DEFAULT_SORT):
+    """Paginate products with a keyset cursor and render the listing as HTML or JSON"""
+    page = paginate(products, request, sort_orders, default_sort)
+    if request.GET.get('format') == 'json':
+        return product_listing_json(page)
 
-    if category_id:
-        products = products.filter(category_id=category_id)
+    context.update({
+        'products': page,
+        'page': page,
+        'wishlisted_ids': wishlisted_ids(request.user, [product.id for product in page]),
+        'sort': page.sort,
+        'sort_options': page.sort_options,
+    })
+    return render(request, 'store/home.html', context)
 
-    if min_price:
-        try:
-            products = products.filter(price__gte=float(min_price))
-        except ValueError:
-            pass
+@cache_anonymous_page
+def home(request):
+    query = request.GET.get('q', '')
+    filters = get_product_filters(request)
 
-    if max_price:
-        try:
-            products = products.filter(price__lte=float(max_price))
-        except ValueError:
-            pass
+    products = Product.objects.all()
+    categories = Category.objects.all()
 
-    if brand:
-        products = products.filter(brand=brand)
+    # Ranked full-text search; listing filters below compose with it in one query
+    sort_orders, default_sort = SORT_ORDERS, DEFAULT_SORT
+    if query:
+        products = search_products(products, query)
+        sort_orders, default_sort = {**RELEVANCE_SORT, **SORT_ORDERS}, 'relevance'
 
-    if color:
-        products = products.filter(color=color)
+    # Facet counts for the filter sidebar, cached per search query and filters
+    facets = get_facets(products, filters, scope=query)
+    category_facets = [
+        (category, facets['category'][category.id])
+        for category in categories if category.id in facets['category']
+    ]
 
-    if size:
-        products = products.filter(size=size)
+    products = apply_product_filters(products, filters)
 
     # For recently viewed
     recently_viewed = None
     if request.user.is_authenticated:
-        recently_viewed = RecentlyViewed.objects.filter(user=request.user).order_by('-viewed_at')[:5]
+        recently_viewed = get_recently_viewed(request.user, limit=5)
 
     context = {
-        'products': products,
         'categories': categories,
-        'brands': brands,
-        'colors': colors,
-        'sizes': sizes,
+        'facets': facets,
+        'category_facets': category_facets,
+        'brands': facets['brand'],
+        'colors': facets['color'],
+        'sizes': facets['size'],
+        'price_buckets': facets['price'],
         'query': query,
-        'min_price': min_price,
-        'max_price': max_price,
-        'selected_brand': brand,
-        'selected_color': color,
-        'selected_size': size,
+        'min_price': request.GET.get('min_price'),
+        'max_price': request.GET.get('max_price'),
+        'selected_category': filters.get('category'),
+        'selected_brand': filters.get('brand'),
+        'selected_color': filters.get('color'),
+        'selected_size': filters.get('size'),
         'recently_viewed': recently_viewed,
     }
-    return render(request, 'store/home.html', context)
+    return render_product_listing(request, products, context, sort_orders, default_sort)
 
+@count_product_view
+@cache_anonymous_page
 def product_detail(request, slug):
     try:
-        product = get_object_or_404(Product, slug=slug)
+        product = get_object_or_404(Product.objects.select_related('category', 'subcategory', 'brand', 'color', 'size'), slug=slug)
     except Product.DoesNotExist:
         messages.error(request, "Product not found")
         return redirect('home')
     
     # Add to recently viewed
     if request.user.is_authenticated:
-        # Check if already viewed recently
-        if not RecentlyViewed.objects.filter(user=request.user, product=product).exists():
-            RecentlyViewed.objects.create(user=request.user, product=product)
+        record_view(request.user, product)
     
-    # Get reviews
-    reviews = product.reviews.all().order_by('-created_at')
+    # Get reviews, with the usernames they are shown with
+    reviews = product.reviews.select_related('user').order_by('-created_at')
     average_rating = product.average_rating()
     
-    # Check if user has reviewed
+    # Check if user has reviewed; read from the primary, since a lagging
+    # replica would offer the review form again right after posting one
     user_review = None
     if request.user.is_authenticated:
-        user_review = Review.objects.filter(user=request.user, product=product).first()
+        user_review = Review.objects.using('default').filter(user=request.user, product=product).first()
     
     context = {
         'product': product,
         'reviews': reviews,
         'average_rating': average_rating,
         'user_review': user_review,
+        'in_wishlist': request.user.is_authenticated and is_wishlisted(request.user, product.id),
+        'variants': product.variants.select_related('size', 'color').order_by('size__name', 'color__name'),
+        'recommendations': get_recommendations(product.id),
     }
     return render(request, 'store/product_detail.html', context)
 
+@cache_anonymous_page
 def category_view(request, slug):
     try:
         category = get_object_or_404(Category, slug=slug)
         products = Product.objects.filter(category=category)
-        return render(request, 'store/home.html', {
-            'products': products,
+        return render_product_listing(request, products, {
             'category': category,
         })
     except Category.DoesNotExist:
         messages.error(request, "Category not found")
         return redirect('home')
 
+@cache_anonymous_page
 def subcategory_view(request, slug):
     try:
         subcategory = get_object_or_404(Subcategory, slug=slug)
         products = Product.objects.filter(subcategory=subcategory)
-        return render(request, 'store/home.html', {
-            'products': products,
+        return render_product_listing(request, products, {
             'subcategory': subcategory,
         })
     except Subcategory.DoesNotExist:
@@ -236,87 +246,150 @@ def profile(request):
 @login_required
 def dashboard(request):
     # Recently viewed
-    recently_viewed = RecentlyViewed.objects.filter(user=request.user).order_by('-viewed_at')[:10]
+    recently_viewed = get_recently_viewed(request.user, limit=10)
     
     # Wishlist
-    wishlist = request.user.userprofile.wishlist.all()
+    wishlist = wishlist_products(request.user)
     
     # Reviews
-    reviews = Review.objects.filter(user=request.user).order_by('-created_at')[:5]
+    reviews = Review.objects.filter(user=request.user).select_related('product').order_by('-created_at')[:5]
     
-    # Cart items
-    cart = get_cart(request)
+    # Cart items, their products and totals in one query
+    cart = get_cart_snapshot(request)
+
+    # Orders
+    orders = Order.objects.filter(user=request.user).order_by('-created_at')[:5]
     
     context = {
         'recently_viewed': recently_viewed,
         'wishlist': wishlist,
         'reviews': reviews,
         'cart': cart,
+        'total': cart.total,
+        'orders': orders,
     }
     return render(request, 'store/dashboard.html', context)
 
 @login_required
 def cart_view(request):
-    cart = get_cart(request)
-    cart_items = cart.items.all()
-    total = sum(item.total_price() for item in cart_items)
+    cart = get_cart_snapshot(request)
     
     context = {
-        'cart': cart,
-        'cart_items': cart_items,
-        'total': total,
+        'cart': cart.cart,
+        'cart_items': cart,
+        'total': cart.total,
     }
     return render(request, 'store/cart.html', context)
 
 @login_required
 def add_to_cart(request, product_id):
-    try:
-        product = Product.objects.get(id=product_id)
-        cart = get_cart(request)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': 1}
-        )
-        
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
-        
-        messages.success(request, f'{product.name} added to cart')
-    except Product.DoesNotExist:
+    product = Product.objects.filter(id=product_id).only('name', 'slug').first()
+    if product is None:
         messages.error(request, 'Product not found')
-    
+        return redirect('cart')
+
+    # Products sold in sizes/colors are added as one of their variants
+    variant_id = request.POST.get('variant') or None
+    variants = ProductVariant.objects.filter(product=product)
+    if variant_id is not None:
+        variant = variants.filter(id=variant_id).select_related('size', 'color').first() if variant_id.isdigit() else None
+        if variant is None:
+            messages.error(request, 'Option not found')
+            return redirect(product)
+    elif variants.exists():
+        messages.info(request, f'Choose an option of {product.name}')
+        return redirect(product)
+    else:
+        variant = None
+
+    cart = get_cart(request)
+    add_items(cart.id, {(product.id, variant and variant.id): 1})
+    update_cart_count(cart.id)
+    record_event('cart_add', product.id)
+    name = f'{product.name} ({variant.label})' if variant and variant.label else product.name
+    messages.success(request, f'{name} added to cart')
     return redirect('cart')
 
 @login_required
 def remove_from_cart(request, item_id):
-    try:
-        cart_item = CartItem.objects.get(id=item_id)
-        cart_item.delete()
+    cart = get_cart(request, create=False)
+    line = get_cart_line(cart, item_id)
+    if line and remove_items(cart.id, [line]):
+        update_cart_count(cart.id)
         messages.info(request, 'Item removed from cart')
-    except CartItem.DoesNotExist:
+    else:
         messages.error(request, 'Item not found in cart')
-    
+
     return redirect('cart')
 
 @login_required
 def update_cart(request, item_id):
+    cart = get_cart(request, create=False)
     try:
-        cart_item = CartItem.objects.get(id=item_id)
         quantity = int(request.POST.get('quantity', 1))
-        
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-            messages.info(request, 'Cart updated')
-        else:
-            cart_item.delete()
-            messages.info(request, 'Item removed from cart')
-    except (CartItem.DoesNotExist, ValueError):
+    except ValueError:
         messages.error(request, 'Invalid request')
-    
+        return redirect('cart')
+    line = get_cart_line(cart, item_id)
+    if line is None:
+        messages.error(request, 'Item not found in cart')
+        return redirect('cart')
+
+    set_quantities(cart.id, {line: quantity})
+    update_cart_count(cart.id)
+    messages.info(request, 'Cart updated' if quantity > 0 else 'Item removed from cart')
+    return redirect('cart')
+
+@login_required
+@require_POST
+def update_cart_lines(request):
+    """
+    Set several cart lines at once from quantity-<product_id> and
+    quantity-<product_id>-<variant_id> fields (0 removes a line); add=1
+    adds the quantities instead of replacing them.
+    """
+    quantities = {}
+    try:
+        for field, value in request.POST.items():
+            if field.startswith('quantity-'):
+                product_id, _, variant_id = field.removeprefix('quantity-').partition('-')
+                quantities[(int(product_id), int(variant_id) if variant_id else None)] = int(value)
+    except ValueError:
+        messages.error(request, 'Invalid request')
+        return redirect('cart')
+
+    # Drop unknown products and variants that belong to another product. A
+    # product sold in variants is only bought as one of them; a line without
+    # a variant (left from before it had any) can only be removed
+    product_ids = {product_id for product_id, _ in quantities}
+    variants = set(ProductVariant.objects.filter(product_id__in=product_ids).values_list('product_id', 'id'))
+    sold_in_variants = {product_id for product_id, _ in variants}
+    existing = variants | {
+        (product_id, None) for product_id in Product.objects.filter(id__in=product_ids).values_list('id', flat=True)
+    }
+    removing = not request.POST.get('add')
+    quantities = {
+        (product_id, variant_id): n for (product_id, variant_id), n in quantities.items()
+        if (product_id, variant_id) in existing
+        and (variant_id is not None or product_id not in sold_in_variants or (removing and n <= 0))
+    }
+
+    # Only adding lines needs a cart to exist
+    cart = get_cart(request, create=any(n > 0 for n in quantities.values()))
+    count = 0
+    if cart is not None:
+        if request.POST.get('add'):
+            add_items(cart.id, quantities)
+            for (product_id, _), n in quantities.items():
+                if n > 0:
+                    record_event('cart_add', product_id)
+        else:
+            set_quantities(cart.id, quantities)
+        count = update_cart_count(cart.id)
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'count': count})
+    messages.info(request, 'Cart updated')
     return redirect('cart')
 
 @login_required
@@ -351,52 +424,74 @@ def add_review(request, product_id):
 
 @login_required
 def add_to_wishlist(request, product_id):
-    try:
-        product = Product.objects.get(id=product_id)
-        profile = request.user.userprofile
-        
-        if product not in profile.wishlist.all():
-            profile.wishlist.add(product)
-            messages.success(request, f'{product.name} added to wishlist')
-        else:
-            messages.info(request, f'{product.name} is already in your wishlist')
-    except Product.DoesNotExist:
+    product = Product.objects.filter(id=product_id).only('name').first()
+    if product is None:
         messages.error(request, 'Product not found')
-    
+    elif add_wishlist_item(request.user, product.id):
+        record_event('wishlist_add', product.id)
+        messages.success(request, f'{product.name} added to wishlist')
+    else:
+        messages.info(request, f'{product.name} is already in your wishlist')
+
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
 @login_required
 def remove_from_wishlist(request, product_id):
-    try:
-        product = Product.objects.get(id=product_id)
-        profile = request.user.userprofile
-        
-        if product in profile.wishlist.all():
-            profile.wishlist.remove(product)
-            messages.info(request, f'{product.name} removed from wishlist')
-    except Product.DoesNotExist:
+    product = Product.objects.filter(id=product_id).only('name').first()
+    if product is None:
         messages.error(request, 'Product not found')
-    
+    elif remove_wishlist_item(request.user, product.id):
+        messages.info(request, f'{product.name} removed from wishlist')
+
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
+@login_required
+@require_POST
+def toggle_wishlist(request, product_id):
+    """AJAX endpoint: flip a product's wishlist membership and report the new state"""
+    if not Product.objects.filter(id=product_id).exists():
+        return JsonResponse({'error': 'Product not found'}, status=404)
+    wishlisted = toggle_wishlist_item(request.user, product_id)
+    if wishlisted:
+        record_event('wishlist_add', product_id)
+    return JsonResponse({'product_id': product_id, 'wishlisted': wishlisted})
+
 @login_required
 def checkout(request):
-    cart = get_cart(request)
-    cart_items = cart.items.all()
-    
-    if not cart_items:
-        messages.warning(request, 'Your cart is empty')
-        return redirect('cart')
-    
-    total = sum(item.total_price() for item in cart_items)
-    
     if request.method == 'POST':
-        # Simulate purchase
-        cart.items.all().delete()
-        messages.success(request, 'Purchase completed successfully!')
+        cart = get_cart(request, create=False)
+        key = request.POST.get('idempotency_key', '')[:64]
+        if not key:
+            messages.error(request, 'Invalid request')
+            return redirect('checkout')
+        if cart is None:
+            messages.warning(request, 'Your cart is empty')
+            return redirect('cart')
+        try:
+            order, created = place_order(request.user, cart, key)
+        except EmptyCart:
+            messages.warning(request, 'Your cart is empty')
+            return redirect('cart')
+        except InsufficientStock as e:
+            messages.error(request, f'Not enough stock left for {", ".join(e.products)}')
+            return redirect('cart')
+        except OptionRequired as e:
+            messages.error(request, f'Choose an option of {", ".join(e.products)}')
+            return redirect('cart')
+        # A placed order emptied the cart; a resubmit may have found new lines
+        update_cart_count(cart.id, 0 if created else None)
+        if created:
+            messages.success(request, f'Order #{order.pk} placed successfully!')
         return redirect('dashboard')
-    
+
+    cart = get_cart_snapshot(request)
+    if not cart:
+        messages.warning(request, 'Your cart is empty')
+        return redirect('cart')
+
     return render(request, 'store/checkout.html', {
-        'cart_items': cart_items,
-        'total': total
-    })
\ No newline at end of file
+        'cart_items': cart,
+        'total': cart.total,
+        # Resubmitting this form (double click, back button) finds the same order
+        'idempotency_key': uuid.uuid4().hex,
+    })
@@ -0,0 +1,68 @@
+from django.db import connection
+
+from .models import Product, UserProfile
+
+# UserProfile.wishlist through-table, unique on (userprofile, product)
+WishlistItem = UserProfile.wishlist.through
+
+
+def _items(user):
+    return WishlistItem.objects.filter(userprofile__user=user)
+
+
+def is_wishlisted(user, product_id):
+    """Single indexed EXISTS against the through-table"""
+    return _items(user).filter(product_id=product_id).exists()
+
+
+def wishlisted_ids(user, product_ids):
+    """Set of the given product ids that are on the user's wishlist, in one query"""
+    if not user.is_authenticated or not product_ids:
+        return set()
+    return set(_items(user).filter(product_id__in=product_ids).values_list('product_id', flat=True))
+
+
+def wishlist_products(user):
+    """The user's wishlisted products, joined through the profile in one query"""
+    return Product.objects.filter(userprofile__user=user)
+
+
+def add_wishlist_item(user, product_id):
+    """
+    Add a product with one INSERT ... SELECT ... ON CONFLICT DO NOTHING,
+    resolving the profile inside the statement. A user without a profile
+    (e.g. created outside registration) gets one and the insert is retried.
+    Returns False if it was already wishlisted.
+    """
+    if _insert_item(user, product_id):
+        return True
+    # Nothing inserted: either already wishlisted or there was no profile
+    _, created = UserProfile.objects.get_or_create(user=user)
+    return created and _insert_item(user, product_id)
+
+
+def _insert_item(user, product_id):
+    table = connection.ops.quote_name(WishlistItem._meta.db_table)
+    profiles = connection.ops.quote_name(UserProfile._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (userprofile_id, product_id) '
+            f'SELECT id, %s FROM {profiles} WHERE user_id = %s '
+            f'ON CONFLICT (userprofile_id, product_id) DO NOTHING',
+            [product_id, user.pk],
+        )
+        return cursor.rowcount > 0
+
+
+def remove_wishlist_item(user, product_id):
+    """Delete the wishlist row in one statement; returns False if there was none"""
+    deleted, _ = _items(user).filter(product_id=product_id).delete()
+    return deleted > 0
+
+
+def toggle_wishlist_item(user, product_id):
+    """Flip a product's wishlist membership; returns whether it is now wishlisted"""
+    if remove_wishlist_item(user, product_id):
+        return False
+    add_wishlist_item(user, product_id)
+    return True
@@ -17,4 +17,23 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         });
     });
-});
\ No newline at end of file
+
+    // Wishlist hearts toggle in place instead of reloading the page
+    document.querySelectorAll('form.wishlist-toggle').forEach(form => {
+        form.addEventListener('submit', function(event) {
+            event.preventDefault();
+            fetch(form.action, {
+                method: 'POST',
+                body: new FormData(form),
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+            })
+                .then(response => response.ok ? response.json() : Promise.reject(response))
+                .then(data => {
+                    const icon = form.querySelector('i');
+                    icon.classList.toggle('bi-heart-fill', data.wishlisted);
+                    icon.classList.toggle('bi-heart', !data.wishlisted);
+                })
+                .catch(() => form.submit());
+        });
+    });
+});